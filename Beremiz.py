@@ -382,13 +382,14 @@ class Beremiz(IDEFrame):
         self.Bind(wx.EVT_MENU, self.OnAboutMenu, id=wx.ID_ABOUT)
 
     def _init_coll_ConnectionStatusBar_Fields(self, parent):
-        parent.SetFieldsCount(3)
+        parent.SetFieldsCount(4)
 
         parent.SetStatusText(number=0, text='')
         parent.SetStatusText(number=1, text='')
         parent.SetStatusText(number=2, text='')
+        parent.SetStatusText(number=3, text='')
 
-        parent.SetStatusWidths([-1, 300, 200])
+        parent.SetStatusWidths([-1, 300, 200, 200])
 
     def _init_ctrls(self, prnt):
         IDEFrame._init_ctrls(self, prnt)
@@ -542,6 +543,9 @@ class Beremiz(IDEFrame):
                 self._Refresh(PROJECTTREE, POUINSTANCEVARIABLESPANEL, LIBRARYTREE)
         if self.EnableDebug:
             self.DebugVariablePanel.SetDataProducer(self.CTR)
+            self.DebugVariablePanel.SetMemoryBudget(
+                self.GetConfigEntry("DebugMemoryBudget",
+                    self.DebugVariablePanel.GetMemoryBudget()))
 
         self.Bind(wx.EVT_CLOSE, self.OnCloseFrame)
 
@@ -634,7 +638,13 @@ class Beremiz(IDEFrame):
 
     ## Function displaying an Error dialog in PLCOpenEditor.
     #  @return False if closing cancelled.
+    def WaitProjectSaved(self):
+        self.CTR.WaitProjectSaved()
+        # Project is marked as saved by an event sent by saving thread
+        wx.GetApp().ProcessPendingEvents()
+
     def CheckSaveBeforeClosing(self, title=_("Close Project")):
+        self.WaitProjectSaved()
         if self.CTR.ProjectTestModified():
             dialog = wx.MessageDialog(self,
                                       _("There are changes, do you want to save?"),
@@ -644,6 +654,10 @@ class Beremiz(IDEFrame):
             dialog.Destroy()
             if answer == wx.ID_YES:
                 self.CTR.SaveProject()
+                # Don't close project if it couldn't be saved
+                self.WaitProjectSaved()
+                if self.CTR.ProjectTestModified():
+                    return False
             elif answer == wx.ID_CANCEL:
                 return False
 
@@ -693,6 +707,7 @@ class Beremiz(IDEFrame):
         if self.CTR is None or self.CheckSaveBeforeClosing(_("Close Application")):
             if self.CTR is not None:
                 self.CTR.KillDebugThread()
+                self.WaitProjectSaved()
             self.KillLocalRuntime()
 
             self.SaveLastState()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of Beremiz, a Integrated Development Environment for
+# programming IEC 61131-3 automates supporting plcopen standard and CanFestival.
+#
+# Copyright (C) 2007: Edouard TISSERANT and Laurent BESSARD
+#
+# See COPYING file for copyrights details.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""
+Build Beremiz projects from command line, without GUI
+
+No window or wx.App is created, but wxPython still has to be installed since
+ProjectController and the editors it imports depend on it
+"""
+
+import os, sys, getopt
+import time
+import multiprocessing
+import __builtin__
+
+def usage():
+    print """
+Usage of Beremiz command line builder :\n
+%s [-b buildpath] [-j jobs] [-c cachedir] [-q] Projectpath [Projectpath...]
+           -b        - build directory, only when building one project
+                       (default:Projectpath/build)
+           -j        - number of projects built concurrently (default:1)
+           -c        - object files cache shared by all builds (default:disabled)
+           -q        - only write errors
+           -h        - print this help text and quit
+
+Exit status is 0 if every project was successfully built, 1 otherwise.
+wxPython has to be installed, although no window is opened.
+"""%sys.argv[0]
+
+beremiz_dir = os.path.dirname(os.path.realpath(__file__))
+
+def BuildProject(project_path, build_path=None, object_cache=None,
+                 prefix="", verbose=True):
+    """
+    Load project and build it, return True if build succeeded
+    """
+    from util.ConsoleLogger import ConsoleLogger
+    from ProjectController import ProjectController
+
+    logger = ConsoleLogger(prefix, verbose)
+    controller = ProjectController(None, logger)
+    controller.SetObjectCachePath(object_cache)
+    result, error = controller.LoadProject(project_path, build_path)
+    if result:
+        logger.write_error(_("Cannot load project: %s\n") % result)
+        logger.flush()
+        return False
+    success = controller.Build()
+    logger.flush()
+    return success
+
+def _BuildProjectProcess(project_path, object_cache, verbose):
+    prefix = "[%s] " % os.path.basename(os.path.normpath(project_path))
+    sys.exit(0 if BuildProject(project_path, None, object_cache,
+                               prefix, verbose) else 1)
+
+def BuildProjects(project_paths, jobs, object_cache=None, verbose=True):
+    """
+    Build each project in its own process, running at most jobs processes
+    at the same time. Return the list of projects that failed to build
+    """
+    pending = list(project_paths)
+    running = []
+    failed = []
+    while pending or running:
+        while pending and len(running) < jobs:
+            project_path = pending.pop(0)
+            process = multiprocessing.Process(
+                target=_BuildProjectProcess,
+                args=(project_path, object_cache, verbose))
+            process.start()
+            running.append((project_path, process))
+        time.sleep(0.1)
+        for project_path, process in running[:]:
+            if not process.is_alive():
+                process.join()
+                running.remove((project_path, process))
+                if process.exitcode != 0:
+                    failed.append(project_path)
+    return failed
+
+if __name__ == '__main__':
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "b:j:c:qh")
+    except getopt.GetoptError, err:
+        print str(err)
+        usage()
+        sys.exit(2)
+
+    build_path = None
+    jobs = 1
+    object_cache = None
+    verbose = True
+    for o, a in opts:
+        if o == "-h":
+            usage()
+            sys.exit()
+        elif o == "-b":
+            build_path = os.path.realpath(a)
+        elif o == "-j":
+            jobs = max(1, int(a))
+        elif o == "-c":
+            object_cache = os.path.realpath(a)
+        elif o == "-q":
+            verbose = False
+
+    if len(args) == 0 or build_path is not None and len(args) > 1:
+        usage()
+        sys.exit(2)
+
+    __builtin__.__dict__['_'] = lambda x: x
+    __builtin__.__dict__["BMZ_DBG"] = False
+    sys.path.insert(0, beremiz_dir)
+
+    project_paths = [os.path.realpath(path) for path in args]
+    if len(project_paths) == 1:
+        success = BuildProject(project_paths[0], build_path, object_cache,
+                               verbose=verbose)
+        sys.exit(0 if success else 1)
+
+    failed = BuildProjects(project_paths, jobs, object_cache, verbose)
+    print "%d project(s) built, %d failed" % (
+        len(project_paths) - len(failed), len(failed))
+    for project_path in failed:
+        print "  %s" % project_path
+    sys.exit(1 if failed else 0)
@@ -33,6 +33,7 @@ Config Tree Node base class.
 
 import os,traceback,types
 import shutil
+import time
 from lxml import etree
 
 from xmlclass import GenerateParserFromXSDstring
@@ -182,41 +183,54 @@ class ConfigTreeNode:
     def CTNMakeDir(self):
         os.mkdir(self.CTNPath())
 
+    def CTNNeedsSave(self, from_project_path=None):
+        """
+        Return True if confnode files have to be written. Confnodes not
+        modified since they were loaded or saved are skipped, unless project
+        is saved in a new folder
+        """
+        return (from_project_path is not None or
+                # confnode is being created
+                not hasattr(self, "ChangesToSave") or
+                not os.path.isdir(self.CTNPath()) or
+                self.CTNTestModified())
+    
     def CTNRequestSave(self, from_project_path=None):
         if self.GetCTRoot().CheckProjectPathPerm(False):
-            # If confnode do not have corresponding directory
-            ctnpath = self.CTNPath()
-            if not os.path.isdir(ctnpath):
-                # Create it
-                os.mkdir(ctnpath)
-    
-            # generate XML for base XML parameters controller of the confnode
-            if self.MandatoryParams:
-                BaseXMLFile = open(self.ConfNodeBaseXmlFilePath(),'w')
-                BaseXMLFile.write(etree.tostring(
-                    self.MandatoryParams[1], 
-                    pretty_print=True, 
-                    xml_declaration=True, 
-                    encoding='utf-8'))
-                BaseXMLFile.close()
-            
-            # generate XML for XML parameters controller of the confnode
-            if self.CTNParams:
-                XMLFile = open(self.ConfNodeXmlFilePath(),'w')
-                XMLFile.write(etree.tostring(
-                    self.CTNParams[1], 
-                    pretty_print=True, 
-                    xml_declaration=True, 
-                    encoding='utf-8'))
-                XMLFile.close()
-            
-            # Call the confnode specific OnCTNSave method
-            result = self.OnCTNSave(from_project_path)
-            if not result:
-                return _("Error while saving \"%s\"\n")%self.CTNPath()
-    
-            # mark confnode as saved
-            self.ChangesToSave = False
+            if self.CTNNeedsSave(from_project_path):
+                # If confnode do not have corresponding directory
+                ctnpath = self.CTNPath()
+                if not os.path.isdir(ctnpath):
+                    # Create it
+                    os.mkdir(ctnpath)
+        
+                # generate XML for base XML parameters controller of the confnode
+                if self.MandatoryParams:
+                    BaseXMLFile = open(self.ConfNodeBaseXmlFilePath(),'w')
+                    BaseXMLFile.write(etree.tostring(
+                        self.MandatoryParams[1], 
+                        pretty_print=True, 
+                        xml_declaration=True, 
+                        encoding='utf-8'))
+                    BaseXMLFile.close()
+                
+                # generate XML for XML parameters controller of the confnode
+                if self.CTNParams:
+                    XMLFile = open(self.ConfNodeXmlFilePath(),'w')
+                    XMLFile.write(etree.tostring(
+                        self.CTNParams[1], 
+                        pretty_print=True, 
+                        xml_declaration=True, 
+                        encoding='utf-8'))
+                    XMLFile.close()
+                
+                # Call the confnode specific OnCTNSave method
+                result = self.OnCTNSave(from_project_path)
+                if not result:
+                    return _("Error while saving \"%s\"\n")%self.CTNPath()
+        
+                # mark confnode as saved
+                self.ChangesToSave = False
             # go through all children and do the same
             for CTNChild in self.IterChildren():
                 CTNChildPath = None
@@ -261,7 +275,12 @@ class ConfigTreeNode:
     def _Generate_C(self, buildpath, locations):
         # Generate confnodes [(Cfiles, CFLAGS)], LDFLAGS, DoCalls, extra_files
         # extra_files = [(fname,fobject), ...]
+        start_time = time.time()
         gen_result = self.CTNGenerate_C(buildpath, locations)
+        report = self.GetCTRoot().GetBuildReport()
+        if report is not None:
+            report.AddExtensionTiming(
+                self.CTNFullName() or self.CTNName(), time.time() - start_time)
         CTNCFilesAndCFLAGS, CTNLDFLAGS, DoCalls = gen_result[:3]
         extra_files = gen_result[3:]
         # if some files have been generated put them in the list with their location
@@ -1396,9 +1396,17 @@ class IDEFrame(wx.Frame):
                     tagname = self.Controler.GetPouInstanceTagName(instance_path, self.EnableDebug)
                 self.EnsureTabVisible(self.DebugVariablePanel)
                 wx.CallAfter(self.PouInstanceVariablesPanel.SetPouType, tagname, instance_path)
+        wx.CallAfter(self.RefreshDebugViewersDataConsumers)
         wx.CallAfter(self._Refresh, FILEMENU, EDITMENU, DISPLAYMENU, EDITORTOOLBAR)
         event.Skip()
 
+    # Only debug viewers shown keep values of their elements subscribed
+    def RefreshDebugViewersDataConsumers(self):
+        for idx in xrange(self.TabsOpened.GetPageCount()):
+            editor = self.TabsOpened.GetPage(idx)
+            if isinstance(editor, Viewer) and editor.IsDebugging():
+                editor.RefreshDataConsumers()
+
     def RefreshEditor(self):
         selected = self.TabsOpened.GetSelection()
         if selected >= 0:
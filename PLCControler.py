@@ -23,15 +23,19 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 from xml.dom import minidom
+from xml.sax.saxutils import quoteattr
 from types import StringType, UnicodeType, TupleType
 from lxml import etree
 from copy import deepcopy
 import os,sys,re
-import datetime
+import hashlib, zlib
+import datetime, time
 from time import localtime
+from threading import Thread
 from collections import OrderedDict, namedtuple
 
 from plcopen import *
+from plcopen.plcopen import TestTextElement, GetSearchTexts
 from graphics.GraphicCommons import *
 from PLCGenerator import *
 
@@ -104,6 +108,25 @@ UNEDITABLE_NAMES = GetUneditableNames()
 #                 Helper object for loading library in xslt stylesheets
 #-------------------------------------------------------------------------------
 
+def GenerateLibraryDocument(lib_name, elements):
+    """
+    Serialize library elements inside a root named after library, without
+    moving or copying them out of their tree
+    """
+    return "<%s>%s</%s>" % (
+        lib_name, "".join([etree.tostring(element) for element in elements]),
+        lib_name)
+
+# Standard libraries never change, their document is generated only once
+_StdLibrariesDocument = None
+
+def GetStdLibrariesDocument():
+    global _StdLibrariesDocument
+    if _StdLibrariesDocument is None:
+        _StdLibrariesDocument = GenerateLibraryDocument(
+            "stdlib", GetStdBlckLibs().values())
+    return _StdLibrariesDocument
+
 class LibraryResolver(etree.Resolver):
 
     def __init__(self, controller, debug=False):
@@ -113,16 +136,38 @@ class LibraryResolver(etree.Resolver):
     def resolve(self, url, pubid, context):
         lib_name = os.path.basename(url)
         if lib_name in ["project", "stdlib", "extensions"]:
-            lib_el = etree.Element(lib_name)
-            if lib_name == "project":
-                lib_el.append(deepcopy(self.Controller.GetProject(self.Debug)))
-            elif lib_name == "stdlib":
-                for lib in StdBlckLibs.values():
-                    lib_el.append(deepcopy(lib))
-            else:
-                for ctn in self.Controller.ConfNodeTypes:
-                    lib_el.append(deepcopy(ctn["types"]))
-            return self.resolve_string(etree.tostring(lib_el), context)
+            return self.resolve_string(
+                self.Controller.GetLibraryDocument(lib_name, self.Debug),
+                context)
+
+#-------------------------------------------------------------------------------
+#                 Helper object for caching compiled xslt stylesheets
+#-------------------------------------------------------------------------------
+
+class XSLTQuery:
+    """
+    Stylesheet compiled once, with extension functions bound to the methods
+    of a factory object that is reset and reused by each query. Libraries
+    are loaded by stylesheet each time it is applied, so it stays valid
+    when project is modified
+    """
+
+    def __init__(self, controller, xslt_name, namespace, factory, names,
+                 debug=False):
+        self.Factory = factory
+
+        parser = etree.XMLParser()
+        parser.resolvers.add(LibraryResolver(controller, debug))
+
+        self.Transform = etree.XSLT(
+            etree.parse(
+                os.path.join(ScriptDirectory, "plcopen", xslt_name),
+                parser),
+            extensions = {(namespace, name): getattr(factory, name)
+                          for name in names})
+
+    def __call__(self, root, **kwargs):
+        return self.Transform(root, **kwargs)
 
 #-------------------------------------------------------------------------------
 #           Helpers functions for translating list of arguments
@@ -152,8 +197,11 @@ class _VariableInfos(object):
 
 class VariablesInfosFactory:
 
-    def __init__(self, variables):
-        self.Variables = variables
+    def __init__(self, variables=None):
+        self.Reset(variables)
+
+    def Reset(self, variables=None):
+        self.Variables = variables if variables is not None else []
         self.TreeStack = []
         self.Type = None
         self.Dimensions = None
@@ -221,6 +269,9 @@ class _VariablesTreeItemInfos(object):
 class VariablesTreeInfosFactory:
 
     def __init__(self):
+        self.Reset()
+
+    def Reset(self):
         self.Root = None
 
     def GetRoot(self):
@@ -245,12 +296,111 @@ class VariablesTreeInfosFactory:
 
 class InstancesPathFactory:
 
-    def __init__(self, instances):
-        self.Instances = instances
+    def __init__(self, instances=None):
+        self.Reset(instances)
+
+    def Reset(self, instances=None):
+        self.Instances = instances if instances is not None else []
 
     def AddInstance(self, context, *args):
         self.Instances.append(args[0][0])
 
+#-------------------------------------------------------------------------------
+#                 Helpers object for indexing types usage
+#-------------------------------------------------------------------------------
+
+# Name under which references made by configurations and resources are indexed
+CONFIGURATIONS_USAGE = None
+
+def _AddTypeReferences(type_content, references):
+    type_content_type = type_content.getLocalTag()
+    if type_content_type == "derived":
+        references.add(type_content.getname())
+    elif type_content_type == "array":
+        _AddTypeReferences(type_content.baseType.getcontent(), references)
+    elif type_content_type == "struct":
+        for element in type_content.getvariable():
+            _AddTypeReferences(element.type.getcontent(), references)
+    return references
+
+def _AddVariablesReferences(varlists, references):
+    for varlist in varlists:
+        for var in varlist.getvariable():
+            _AddTypeReferences(var.type.getcontent(), references)
+    return references
+
+class TypesUsageIndex:
+    """
+    Index of the types directly referenced by each project data type, pou and
+    by configurations, with reverse index giving the types using a type.
+    Libraries are not indexed since they can't reference project types
+    """
+
+    def __init__(self, project):
+        self.References = {}
+        self.Users = {}
+        # Types using a type directly or not, computed on demand
+        self.TransitiveUsers = {}
+        for datatype in project.getdataTypes():
+            self.UpdateDataType(datatype)
+        for pou in project.getpous():
+            self.UpdatePou(pou)
+        self.UpdateConfigurations(project)
+
+    def SetReferences(self, name, references):
+        for reference in self.References.pop(name, []):
+            users = self.Users[reference]
+            users.discard(name)
+            if len(users) == 0:
+                self.Users.pop(reference)
+        if references is not None:
+            self.References[name] = references
+            for reference in references:
+                self.Users.setdefault(reference, set()).add(name)
+        self.TransitiveUsers = {}
+
+    def UpdateDataType(self, datatype):
+        self.SetReferences(datatype.getname(),
+            _AddTypeReferences(datatype.baseType.getcontent(), set()))
+
+    def UpdatePou(self, pou):
+        references = set()
+        if pou.interface is not None:
+            _AddVariablesReferences(pou.interface.getcontent(), references)
+        self.SetReferences(pou.getname(), references)
+
+    def UpdateConfigurations(self, project):
+        references = set()
+        for configuration in project.getconfigurations():
+            _AddVariablesReferences(configuration.getglobalVars(), references)
+            for resource in configuration.getresource():
+                _AddVariablesReferences(resource.getglobalVars(), references)
+                for instance in resource.getpouInstance():
+                    references.add(instance.gettypeName())
+                for task in resource.gettask():
+                    for instance in task.getpouInstance():
+                        references.add(instance.gettypeName())
+        self.SetReferences(CONFIGURATIONS_USAGE, references)
+
+    def RemoveType(self, name):
+        self.SetReferences(name, None)
+
+    def GetTransitiveUsers(self, name):
+        users = self.TransitiveUsers.get(name)
+        if users is None:
+            users = set()
+            to_visit = [name]
+            while len(to_visit) > 0:
+                for user in self.Users.get(to_visit.pop(), []):
+                    if user not in users:
+                        users.add(user)
+                        to_visit.append(user)
+            self.TransitiveUsers[name] = users
+        return users
+
+    def IsUsedBy(self, name, reference):
+        return reference in self.GetTransitiveUsers(name)
+
 #-------------------------------------------------------------------------------
 #            Helpers object for generating instance tagname
 #-------------------------------------------------------------------------------
@@ -259,6 +409,9 @@ class InstanceTagName:
 
     def __init__(self, controller):
         self.Controller = controller
+        self.Reset()
+
+    def Reset(self):
         self.TagName = None
 
     def GetTagName(self):
@@ -358,11 +511,24 @@ class _ActionInfos(object):
             setattr(self, attr, value if value is not None else "")
     def copy(self):
         return _ActionInfos(*[getattr(self, attr) for attr in self.__slots__])
+    def __eq__(self, other):
+        return (isinstance(other, _ActionInfos) and
+                all([getattr(self, attr) == getattr(other, attr)
+                     for attr in self.__slots__]))
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+# Instances infos of an edited element, with interface of block types used
+_ElementInstancesState = namedtuple("ElementInstancesState",
+    ["instances", "blocktypes"])
 
 class BlockInstanceFactory:
 
-    def __init__(self, block_instances):
-        self.BlockInstances = block_instances
+    def __init__(self, block_instances=None):
+        self.Reset(block_instances)
+
+    def Reset(self, block_instances=None):
+        self.BlockInstances = block_instances if block_instances is not None else OrderedDict()
         self.CurrentInstance = None
         self.SpecificValues = None
         self.CurrentConnection = None
@@ -424,56 +590,321 @@ class BlockInstanceFactory:
         translated_args = _translate_args([_StringValue] * 5, args)
         self.SpecificValues[0][0].append(_ActionInfos(*translated_args))
 
-pou_block_instances_xslt = etree.parse(
-    os.path.join(ScriptDirectory, "plcopen", "pou_block_instances.xslt"))
-
 #-------------------------------------------------------------------------------
 #                         Undo Buffer for PLCOpenEditor
 #-------------------------------------------------------------------------------
 
 # Length of the buffer
 UNDO_BUFFER_LENGTH = 20
+# Maximum memory size in bytes of states kept in the buffer, the current state
+# being always kept
+UNDO_BUFFER_MAXSIZE = 32 * 1024 * 1024
+
+# Project elements whose children are stored separately in project states, so
+# that a state only stores the children that changed since previous state
+PROJECT_STATE_CONTAINERS = [PLCOpenParser.DefaultNamespaceFormat % tag
+    for tag in ["project", "types", "dataTypes", "pous",
+                "instances", "configurations"]]
+
+# Namespace declarations at the beginning of an element serialization
+ELEMENT_NAMESPACES_MODEL = re.compile("^(<[^\s>/]+)(?: xmlns(?::[\w.-]+)?=\"[^\"]*\")*")
+
+def _GetNamespacesDeclarations(nsmap):
+    # Prefixes of default namespace are not declared, so that elements parsed
+    # use default namespace
+    return "".join([" xmlns%s=%s" % (":" + prefix if prefix else "", quoteattr(uri))
+                    for prefix, uri in nsmap.iteritems()
+                    if prefix is None or uri != nsmap.get(None)])
+
+def _RemoveNamespacesDeclarations(xml_string):
+    return ELEMENT_NAMESPACES_MODEL.sub("\\1", xml_string, 1)
+
+# Tagname types of project elements stored as chunks in project states
+PROJECT_STATE_TAGNAME_TYPES = {"pou": "P", "dataType": "D", "configuration": "C"}
+
+def _GetProjectStateKey(element):
+    """
+    Return key identifying a project element stored as a chunk, tagname of
+    POUs, data types and configurations, tag of other elements
+    """
+    tag = etree.QName(element.tag).localname
+    tagname_type = PROJECT_STATE_TAGNAME_TYPES.get(tag)
+    if tagname_type is not None:
+        return "%s::%s" % (tagname_type, element.get("name"))
+    return tag
+
+"""
+Class storing the compressed serialization of a project element
+"""
+class ProjectStateChunk:
+
+    def __init__(self, tag, xml_string, digest):
+        self.Tag = tag
+        self.Data = zlib.compress(xml_string)
+        self.Digest = digest
+
+    def GetSize(self):
+        return len(self.Data)
+
+    def GetXMLString(self):
+        return zlib.decompress(self.Data)
+
+"""
+Class storing the state of a project as a tree of element chunks. Chunks of
+elements unchanged since previous state are shared with it. When the keys of
+the elements modified since previous state are given, other elements reuse
+the chunks of previous state without being serialized
+"""
+class ProjectState:
+
+    def __init__(self, project, previous=None, modified=None):
+        chunks = {}
+        previous_elements = {}
+        if previous is not None:
+            for chunk in previous.GetChunks():
+                chunks[chunk.Digest] = chunk
+            # All elements are serialized if modified ones are unknown
+            if modified is not None:
+                previous_elements = previous.Elements
+        self.NSMap = project.nsmap
+        # Chunk of each element by key, None for keys of several elements
+        self.Elements = {}
+        self.Root = self.ComputeElementState(project, chunks,
+            previous_elements, modified or set())
+
+    def ComputeElementState(self, element, chunks, previous_elements, modified):
+        if element.tag in PROJECT_STATE_CONTAINERS:
+            return (element.tag, element.attrib.items(),
+                    [self.ComputeElementState(child, chunks,
+                        previous_elements, modified)
+                     for child in element])
+        key = _GetProjectStateKey(element)
+        chunk = None
+        if key not in self.Elements and key not in modified:
+            chunk = previous_elements.get(key)
+        if chunk is None:
+            xml_string = PLCOpenParser.Dumps(element)
+            digest = hashlib.md5(xml_string).digest()
+            chunk = chunks.get(digest)
+            if chunk is None:
+                chunk = chunks[digest] = ProjectStateChunk(
+                    element.tag, xml_string, digest)
+        self.Elements[key] = chunk if key not in self.Elements else None
+        return chunk
+
+    def GetChunks(self, element_state=None):
+        if element_state is None:
+            element_state = self.Root
+        if isinstance(element_state, ProjectStateChunk):
+            return [element_state]
+        chunks = []
+        for child_state in element_state[2]:
+            chunks.extend(self.GetChunks(child_state))
+        return chunks
+
+    def GetXMLString(self, element_state=None):
+        """
+        Return serialization of the project in this state
+        """
+        if element_state is None:
+            return self.GetXMLString(self.Root).replace(">",
+                _GetNamespacesDeclarations(self.NSMap) + ">", 1)
+        if isinstance(element_state, ProjectStateChunk):
+            return _RemoveNamespacesDeclarations(element_state.GetXMLString())
+        tag, attrib, children_state = element_state
+        tag = etree.QName(tag).localname
+        return "<%s%s>%s</%s>" % (tag,
+            "".join([" %s=%s" % (self.GetAttributeName(name), quoteattr(value))
+                     for name, value in attrib]),
+            "".join(map(self.GetXMLString, children_state)), tag)
+
+    def GetAttributeName(self, name):
+        name = etree.QName(name)
+        if name.namespace is None:
+            return name.localname
+        for prefix, uri in self.NSMap.iteritems():
+            if prefix is not None and uri == name.namespace:
+                return "%s:%s" % (prefix, name.localname)
+        return name.localname
+
+    def Load(self):
+        """
+        Return a new project in this state
+        """
+        return PLCOpenParser.Loads(self.GetXMLString())
+
+    def LoadElement(self, xml_string, path, nsmap):
+        """
+        Parse element serialization, wrapped in its ancestors so that
+        element classes are the same as in project
+        """
+        wrapper = ["<%s%s>" % (etree.QName(path[0]).localname,
+                               _GetNamespacesDeclarations(nsmap))]
+        wrapper.extend(["<%s>" % etree.QName(tag).localname
+                        for tag in path[1:]])
+        # Namespaces declared by element are removed, so that element
+        # inserted in project uses the ones declared by project
+        wrapper.append(_RemoveNamespacesDeclarations(xml_string))
+        wrapper.extend(["</%s>" % etree.QName(tag).localname
+                        for tag in reversed(path)])
+        element = PLCOpenParser.Loads("".join(wrapper))
+        for tag in path:
+            element = element[0]
+        return element
+
+    def RestoreElement(self, element, element_state, path):
+        tag, attrib, children_state = element_state
+        self.UpdateAttributes(element, attrib)
+        path = path + [tag]
+
+        # Identify current children by serialization digest or by tag
+        current_children = []
+        for child in element:
+            if child.tag in PROJECT_STATE_CONTAINERS:
+                current_children.append((child.tag, child))
+            else:
+                current_children.append((
+                    hashlib.md5(PLCOpenParser.Dumps(child)).digest(), child))
+
+        # Keep current children found in state, in the same order, since
+        # moving an element can change the namespace prefixes it uses
+        matches = []
+        next_index = 0
+        for child_state in children_state:
+            if isinstance(child_state, ProjectStateChunk):
+                key = child_state.Digest
+            else:
+                key = child_state[0]
+            match = None
+            for index in xrange(next_index, len(current_children)):
+                if current_children[index][0] == key:
+                    match = index
+                    next_index = index + 1
+                    break
+            matches.append(match)
+
+        # Other children are loaded from state. Current children with the
+        # same tag between kept children are updated instead of replaced, for
+        # the same reason
+        children = []
+        used = set()
+        gap_start = 0
+        for state_index, child_state in enumerate(children_state):
+            match = matches[state_index]
+            if match is not None:
+                child = current_children[match][1]
+                used.add(match)
+                gap_start = match + 1
+                if not isinstance(child_state, ProjectStateChunk):
+                    self.RestoreElement(child, child_state, path)
+                children.append(child)
+                continue
+
+            next_matches = [next_match for next_match in matches[state_index:]
+                            if next_match is not None]
+            if len(next_matches) > 0:
+                gap_end = next_matches[0]
+            else:
+                gap_end = len(current_children)
+            if isinstance(child_state, ProjectStateChunk):
+                tag = child_state.Tag
+                xml_string = child_state.GetXMLString()
+            else:
+                tag = child_state[0]
+                xml_string = etree.tostring(etree.Element(tag))
+            loaded = self.LoadElement(xml_string, path, element.nsmap)
+            child = None
+            for index in xrange(gap_start, gap_end):
+                if (index not in used and
+                    current_children[index][1].tag == tag):
+                    child = current_children[index][1]
+                    used.add(index)
+                    gap_start = index + 1
+                    self.UpdateElement(child, loaded)
+                    break
+            if child is None:
+                child = loaded
+            if not isinstance(child_state, ProjectStateChunk):
+                self.RestoreElement(child, child_state, path)
+            children.append(child)
+
+        for index, (key, child) in enumerate(current_children):
+            if index not in used:
+                element.remove(child)
+        for index, child in enumerate(children):
+            if index >= len(element) or element[index] is not child:
+                element.insert(index, child)
+
+    def UpdateAttributes(self, element, attrib):
+        if element.attrib.items() != attrib:
+            element.attrib.clear()
+            for name, value in attrib:
+                element.attrib[name] = value
+
+    def UpdateElement(self, element, loaded):
+        """
+        Replace element attributes and content by the ones of loaded element
+        """
+        self.UpdateAttributes(element, loaded.attrib.items())
+        if element.text != loaded.text:
+            etree.ElementBase.__setattr__(element, "text", loaded.text)
+        for child in list(element):
+            element.remove(child)
+        for child in list(loaded):
+            element.append(child)
+
+    def Restore(self, project):
+        """
+        Restore project to this state, only changed elements being replaced
+        """
+        self.RestoreElement(project, self.Root, [])
 
 """
-Class implementing a buffer of changes made on the current editing model
+Class implementing a buffer of changes made on the current editing model.
+States are either serialized models or project states
 """
 class UndoBuffer:
 
     # Constructor initialising buffer
-    def __init__(self, currentstate, issaved = False):
-        self.Buffer = []
-        self.CurrentIndex = -1
-        self.MinIndex = -1
-        self.MaxIndex = -1
-        # if current state is defined
-        if currentstate:
-            self.CurrentIndex = 0
-            self.MinIndex = 0
-            self.MaxIndex = 0
-        # Initialising buffer with currentstate at the first place
-        for i in xrange(UNDO_BUFFER_LENGTH):
-            if i == 0:
-                self.Buffer.append(currentstate)
-            else:
-                self.Buffer.append(None)
+    def __init__(self, currentstate, issaved = False, maxsize = UNDO_BUFFER_MAXSIZE):
+        self.Buffer = [currentstate]
+        self.CurrentIndex = 0
+        self.MaxSize = maxsize
         # Initialising index of state saved
         if issaved:
             self.LastSave = 0
         else:
-            self.LastSave = -1
+            self.LastSave = None
+
+    # Return memory size of states in buffer, chunks shared by project states
+    # being counted once
+    def GetSize(self):
+        sizes = {}
+        for state in self.Buffer:
+            if isinstance(state, ProjectState):
+                for chunk in state.GetChunks():
+                    sizes[id(chunk)] = chunk.GetSize()
+            else:
+                sizes[id(state)] = len(state)
+        return sum(sizes.itervalues())
 
     # Add a new state in buffer
     def Buffering(self, currentstate):
-        self.CurrentIndex = (self.CurrentIndex + 1) % UNDO_BUFFER_LENGTH
-        self.Buffer[self.CurrentIndex] = currentstate
-        # Actualising buffer limits
-        self.MaxIndex = self.CurrentIndex
-        if self.MinIndex == self.CurrentIndex:
+        # States following current one can't be restored anymore
+        del self.Buffer[self.CurrentIndex + 1:]
+        if self.LastSave is not None and self.LastSave > self.CurrentIndex:
+            self.LastSave = None
+        self.Buffer.append(currentstate)
+        self.CurrentIndex += 1
+        # Remove oldest states while buffer is too long or too big
+        while (len(self.Buffer) > 1 and
+               (len(self.Buffer) > UNDO_BUFFER_LENGTH or
+                self.GetSize() > self.MaxSize)):
+            self.Buffer.pop(0)
+            self.CurrentIndex -= 1
             # If the removed state was the state saved, there is no state saved in the buffer
-            if self.LastSave == self.MinIndex:
-                self.LastSave = -1
-            self.MinIndex = (self.MinIndex + 1) % UNDO_BUFFER_LENGTH
-        self.MinIndex = max(self.MinIndex, 0)
+            if self.LastSave is not None:
+                self.LastSave = self.LastSave - 1 if self.LastSave > 0 else None
 
     # Return current state of buffer
     def Current(self):
@@ -481,35 +912,156 @@ class UndoBuffer:
 
     # Change current state to previous in buffer and return new current state
     def Previous(self):
-        if self.CurrentIndex != self.MinIndex:
-            self.CurrentIndex = (self.CurrentIndex - 1) % UNDO_BUFFER_LENGTH
+        if self.CurrentIndex > 0:
+            self.CurrentIndex -= 1
             return self.Buffer[self.CurrentIndex]
         return None
 
     # Change current state to next in buffer and return new current state
     def Next(self):
-        if self.CurrentIndex != self.MaxIndex:
-            self.CurrentIndex = (self.CurrentIndex + 1) % UNDO_BUFFER_LENGTH
+        if self.CurrentIndex < len(self.Buffer) - 1:
+            self.CurrentIndex += 1
             return self.Buffer[self.CurrentIndex]
         return None
 
     # Return True if current state is the first in buffer
     def IsFirst(self):
-        return self.CurrentIndex == self.MinIndex
+        return self.CurrentIndex == 0
 
     # Return True if current state is the last in buffer
     def IsLast(self):
-        return self.CurrentIndex == self.MaxIndex
+        return self.CurrentIndex == len(self.Buffer) - 1
 
     # Note that current state is saved
     def CurrentSaved(self):
         self.LastSave = self.CurrentIndex
 
+    # Note that a state is saved, no state in buffer being saved if it has
+    # been removed from buffer since
+    def StateSaved(self, state):
+        self.LastSave = None
+        for index, buffered_state in enumerate(self.Buffer):
+            if buffered_state is state:
+                self.LastSave = index
+
     # Return True if current state is saved
     def IsCurrentSaved(self):
         return self.LastSave == self.CurrentIndex
 
 
+#-------------------------------------------------------------------------------
+#                             Project Search Index
+#-------------------------------------------------------------------------------
+
+# Length of the substrings of texts used as keys of search index
+SEARCH_INDEX_NGRAM_LENGTH = 3
+
+def _GetSearchNGrams(text):
+    text = text.lower()
+    return set([text[i:i + SEARCH_INDEX_NGRAM_LENGTH]
+                for i in xrange(len(text) - SEARCH_INDEX_NGRAM_LENGTH + 1)])
+
+"""
+Class storing the texts tested when searching in a project element, with an
+inverted index of their substrings
+"""
+class SearchIndexEntry:
+
+    def __init__(self, category, texts):
+        # Pou type, "datatype" or "configuration", tested against search filter
+        self.Category = category
+        self.Texts = texts
+        self.NGrams = {}
+        for idx, (infos, text) in enumerate(texts):
+            for ngram in _GetSearchNGrams(text):
+                self.NGrams.setdefault(ngram, []).append(idx)
+
+    def GetCandidateTexts(self, criteria):
+        """
+        Return texts that can match criteria, in the order they are searched
+        """
+        find_pattern = criteria["find_pattern"]
+        if (criteria["regular_expression"] or
+            len(find_pattern) < SEARCH_INDEX_NGRAM_LENGTH):
+            return self.Texts
+        candidates = None
+        for ngram in _GetSearchNGrams(find_pattern):
+            indexes = self.NGrams.get(ngram)
+            if indexes is None:
+                return []
+            if candidates is None:
+                candidates = set(indexes)
+            else:
+                candidates.intersection_update(indexes)
+        return [self.Texts[idx] for idx in sorted(candidates)]
+
+    def Search(self, criteria):
+        filter = criteria["filter"]
+        if filter != "all" and self.Category not in filter:
+            return []
+        search_result = []
+        for infos, text in self.GetCandidateTexts(criteria):
+            search_result.extend([(infos,) + result
+                                  for result in TestTextElement(text, criteria)])
+        return search_result
+
+# Return the tagname of the project element indexed for an edited element,
+# actions and transitions being indexed with their POU and resources with their
+# configuration
+def _GetProjectElementTagName(tagname):
+    words = tagname.split("::")
+    if words[0] in ["P", "T", "A"]:
+        return "P::%s" % words[1]
+    elif words[0] in ["C", "R"]:
+        return "C::%s" % words[1]
+    return tagname
+
+"""
+Class indexing the texts of project data types, POUs and configurations.
+Elements are indexed on first search, and indexed again on next search once
+editing functions have reported them modified
+"""
+class ProjectSearchIndex:
+
+    def __init__(self):
+        self.Reset()
+
+    def Reset(self):
+        # Entries of elements indexed, by tagname
+        self.Entries = {}
+
+    def SetElementModified(self, tagname):
+        self.Entries.pop(_GetProjectElementTagName(tagname), None)
+
+    def GetElementEntry(self, tagname, element, category):
+        entry = self.Entries.get(tagname)
+        if entry is None or entry.Category != category:
+            entry = self.Entries[tagname] = SearchIndexEntry(
+                category, GetSearchTexts(element))
+        return entry
+
+    def Search(self, project, criteria):
+        search_result = []
+        for datatype in project.types.dataTypes.getdataType():
+            search_result.extend(self.GetElementEntry(
+                "D::%s" % datatype.getname(), datatype,
+                "datatype").Search(criteria))
+        for pou in project.types.pous.getpou():
+            search_result.extend(self.GetElementEntry(
+                "P::%s" % pou.getname(), pou,
+                pou.getpouType()).Search(criteria))
+        for configuration in \
+            project.instances.configurations.getconfiguration():
+            search_result.extend(self.GetElementEntry(
+                "C::%s" % configuration.getname(), configuration,
+                "configuration").Search(criteria))
+        return search_result
+
+    def SearchInElement(self, tagname, element, category, criteria):
+        return self.GetElementEntry(
+            _GetProjectElementTagName(tagname), element, category).Search(criteria)
+
+
 #-------------------------------------------------------------------------------
 #                           Controler for PLCOpenEditor
 #-------------------------------------------------------------------------------
@@ -522,6 +1074,14 @@ class PLCControler:
     # Create a new PLCControler
     def __init__(self):
         self.LastNewIndex = 0
+        # Compiled xslt stylesheets, by stylesheet name and debug mode
+        self.XSLTQueries = {}
+        # Library documents loaded by stylesheets, with elements they were
+        # generated from
+        self.LibraryDocuments = {}
+        # Thread writing project saved in background
+        self.SavingThread = None
+        self.SearchIndex = ProjectSearchIndex()
         self.Reset()
 
     # Reset PLCControler internal variables
@@ -530,13 +1090,28 @@ class PLCControler:
         self.ProjectBufferEnabled = True
         self.ProjectBuffer = None
         self.ProjectSaved = True
+        self.ProjectChangesCount = 0
+        # Keys of project elements modified since current state of undo
+        # buffer, None if unknown
+        self.ProjectStateModified = None
         self.Buffering = False
         self.FilePath = ""
         self.FileName = ""
         self.ProgramChunks = []
         self.ProgramOffset = 0
+        # Snapshots of project when generated and when transferred to target
         self.NextCompiledProject = None
         self.CurrentCompiledProject = None
+        self.CompiledProject = None
+        # Types usage indexes, with project they were built from
+        self.TypesUsageIndexes = []
+        # Ancestor types of each type already tested, with project they were
+        # computed from
+        self.TypesAncestors = []
+        # Local ids of instances modified by editing functions, by edited
+        # element tagname
+        self.EditedElementsModifiedInstances = {}
+        self.SearchIndex.Reset()
         self.ConfNodeTypes = []
         self.TotalTypesDict = StdBlckDct.copy()
         self.TotalTypes = StdBlckLst[:]
@@ -547,10 +1122,54 @@ class PLCControler:
 
     def GetProject(self, debug = False):
         if debug and self.CurrentCompiledProject is not None:
-            return self.CurrentCompiledProject
+            return self.GetCompiledProject()
         else:
             return self.Project
 
+    # Return project in the state it was transferred, loaded on first use
+    def GetCompiledProject(self):
+        if self.CompiledProject is None:
+            self.CompiledProject = self.CurrentCompiledProject.Load()
+        return self.CompiledProject
+
+    # Return a snapshot of the project, sharing unchanged elements with
+    # project undo buffer
+    def GetProjectSnapshot(self):
+        if self.ProjectBuffer is not None:
+            return ProjectState(self.Project, self.ProjectBuffer.Current(),
+                                self.ProjectStateModified)
+        return ProjectState(self.Project)
+
+    def GetLibraryDocument(self, lib_name, debug = False):
+        """
+        Return serialized library loaded by xslt stylesheets
+        @param lib_name: "project", "stdlib" or "extensions"
+        """
+        if lib_name == "stdlib":
+            return GetStdLibrariesDocument()
+        cache_name = lib_name
+        if lib_name == "project":
+            project = self.GetProject(debug)
+            elements = [project] if project is not None else []
+            # compiled project is never modified, edited project document is
+            # dropped by functions modifying project
+            if project is not None and project is self.CompiledProject:
+                cache_name = "compiled_project"
+        else:
+            # confnodes types library is replaced when modified
+            elements = [ctn["types"] for ctn in self.ConfNodeTypes]
+        cached_elements, document = self.LibraryDocuments.get(
+            cache_name, ([], None))
+        if document is None or len(elements) != len(cached_elements) or \
+           any([element is not cached_element for element, cached_element
+                in zip(elements, cached_elements)]):
+            document = GenerateLibraryDocument(lib_name, elements)
+            self.LibraryDocuments[cache_name] = (elements, document)
+        return document
+
+    def ResetProjectLibraryDocument(self):
+        self.LibraryDocuments.pop("project", None)
+
 #-------------------------------------------------------------------------------
 #                         Project management functions
 #-------------------------------------------------------------------------------
@@ -572,9 +1191,11 @@ class PLCControler:
         self.CreateProjectBuffer(False)
         self.ProgramChunks = []
         self.ProgramOffset = 0
-        self.NextCompiledProject = self.Copy(self.Project)
+        self.NextCompiledProject = self.GetProjectSnapshot()
         self.CurrentCompiledProject = None
+        self.CompiledProject = None
         self.Buffering = False
+        self.SearchIndex.Reset()
 
     # Return project data type names
     def GetProjectDataTypeNames(self, debug = False):
@@ -645,6 +1266,9 @@ class PLCControler:
             if properties is not None:
                 self.Project.setfileHeader(properties)
                 self.Project.setcontentHeader(properties)
+                self.SetProjectStateModified("fileHeader")
+                self.SetProjectStateModified("contentHeader")
+            self.ResetProjectLibraryDocument()
             if buffer and (name is not None or properties is not None):
                 self.BufferProject()
 
@@ -717,21 +1341,25 @@ class PLCControler:
             return infos
         return None
 
+    def GetXSLTQuery(self, xslt_name, namespace, factory, names, debug=False):
+        """
+        Return compiled stylesheet, compiling it on first call
+        @param factory: callable returning factory object for this stylesheet
+        """
+        query = self.XSLTQueries.get((xslt_name, debug))
+        if query is None:
+            query = XSLTQuery(self, xslt_name, namespace, factory(), names,
+                              debug)
+            self.XSLTQueries[(xslt_name, debug)] = query
+        return query
+
     def GetPouVariables(self, tagname, debug = False):
         pou_type = None
         project = self.GetProject(debug)
         if project is not None:
-            factory = VariablesTreeInfosFactory()
-
-            parser = etree.XMLParser()
-            parser.resolvers.add(LibraryResolver(self, debug))
-
-            pou_variable_xslt_tree = etree.XSLT(
-                etree.parse(
-                    os.path.join(ScriptDirectory, "plcopen", "pou_variables.xslt"),
-                    parser),
-                extensions = {("pou_vars_ns", name): getattr(factory, name)
-                              for name in ["SetRoot", "AddVariable"]})
+            pou_variable_xslt_tree = self.GetXSLTQuery(
+                "pou_variables.xslt", "pou_vars_ns",
+                VariablesTreeInfosFactory, ["SetRoot", "AddVariable"], debug)
 
             obj = None
             words = tagname.split("::")
@@ -740,6 +1368,8 @@ class PLCControler:
             elif words[0] != "D":
                 obj = self.GetEditedElement(tagname, debug)
             if obj is not None:
+                factory = pou_variable_xslt_tree.Factory
+                factory.Reset()
                 pou_variable_xslt_tree(obj)
                 return factory.GetRoot()
 
@@ -749,18 +1379,11 @@ class PLCControler:
         instances = []
         project = self.GetProject(debug)
         if project is not None:
-            factory = InstancesPathFactory(instances)
-
-            parser = etree.XMLParser()
-            parser.resolvers.add(LibraryResolver(self, debug))
-
-            instances_path_xslt_tree = etree.XSLT(
-                etree.parse(
-                    os.path.join(ScriptDirectory, "plcopen", "instances_path.xslt"),
-                    parser),
-                extensions = {
-                    ("instances_ns", "AddInstance"): factory.AddInstance})
+            instances_path_xslt_tree = self.GetXSLTQuery(
+                "instances_path.xslt", "instances_ns",
+                InstancesPathFactory, ["AddInstance"], debug)
 
+            instances_path_xslt_tree.Factory.Reset(instances)
             instances_path_xslt_tree(root,
                 instance_type=etree.XSLT.strparam(name))
 
@@ -784,20 +1407,15 @@ class PLCControler:
 
     def GetPouInstanceTagName(self, instance_path, debug = False):
         project = self.GetProject(debug)
-        factory = InstanceTagName(self)
 
-        parser = etree.XMLParser()
-        parser.resolvers.add(LibraryResolver(self, debug))
-
-        instance_tagname_xslt_tree = etree.XSLT(
-            etree.parse(
-                os.path.join(ScriptDirectory, "plcopen", "instance_tagname.xslt"),
-                parser),
-            extensions = {("instance_tagname_ns", name): getattr(factory, name)
-                          for name in ["ConfigTagName", "ResourceTagName",
-                                       "PouTagName", "ActionTagName",
-                                       "TransitionTagName"]})
+        instance_tagname_xslt_tree = self.GetXSLTQuery(
+            "instance_tagname.xslt", "instance_tagname_ns",
+            lambda: InstanceTagName(self),
+            ["ConfigTagName", "ResourceTagName", "PouTagName",
+             "ActionTagName", "TransitionTagName"], debug)
 
+        factory = instance_tagname_xslt_tree.Factory
+        factory.Reset()
         instance_tagname_xslt_tree(project,
             instance_path=etree.XSLT.strparam(instance_path))
 
@@ -821,32 +1439,107 @@ class PLCControler:
 
     # Return if data type given by name is used by another data type or pou
     def DataTypeIsUsed(self, name, debug = False):
-        project = self.GetProject(debug)
-        if project is not None:
-            return len(self.GetInstanceList(project, name, debug)) > 0
+        index = self.GetTypesUsageIndex(debug)
+        if index is not None:
+            return index.IsUsedBy(name, CONFIGURATIONS_USAGE)
         return False
 
     # Return if pou given by name is used by another pou
     def PouIsUsed(self, name, debug = False):
-        project = self.GetProject(debug)
-        if project is not None:
-            return len(self.GetInstanceList(project, name, debug)) > 0
+        index = self.GetTypesUsageIndex(debug)
+        if index is not None:
+            return index.IsUsedBy(name, CONFIGURATIONS_USAGE)
         return False
 
     # Return if pou given by name is directly or undirectly used by the reference pou
     def PouIsUsedBy(self, name, reference, debug = False):
-        pou_infos = self.GetPou(reference, debug)
-        if pou_infos is not None:
-            return len(self.GetInstanceList(pou_infos, name, debug)) > 0
+        index = self.GetTypesUsageIndex(debug)
+        if index is not None:
+            return index.IsUsedBy(name, reference)
         return False
 
-    def GenerateProgram(self, filepath=None):
+    # Return types usage index of project, building it if needed
+    def GetTypesUsageIndex(self, debug = False):
+        project = self.GetProject(debug)
+        if project is None:
+            return None
+        for indexed_project, index in self.TypesUsageIndexes:
+            if indexed_project is project:
+                return index
+        index = TypesUsageIndex(project)
+        # only keep indexes of edited and compiled projects
+        self.TypesUsageIndexes = [
+            (indexed_project, indexed_project_index)
+            for indexed_project, indexed_project_index in self.TypesUsageIndexes
+            if indexed_project is self.Project or
+               indexed_project is self.CompiledProject]
+        self.TypesUsageIndexes.append((project, index))
+        return index
+
+    # Return types usage index of edited project if already built, so that it
+    # is kept up to date when project is modified
+    def GetEditedTypesUsageIndex(self):
+        for indexed_project, index in self.TypesUsageIndexes:
+            if indexed_project is self.Project:
+                return index
+        return None
+
+    def UpdateDataTypeUsageIndex(self, name):
+        self.ResetTypesAncestors(self.Project)
+        index = self.GetEditedTypesUsageIndex()
+        if index is not None:
+            datatype = self.Project.getdataType(name)
+            if datatype is not None:
+                index.UpdateDataType(datatype)
+            else:
+                index.RemoveType(name)
+
+    def UpdatePouUsageIndex(self, name):
+        index = self.GetEditedTypesUsageIndex()
+        if index is not None:
+            pou = self.Project.getpou(name)
+            if pou is not None:
+                index.UpdatePou(pou)
+            else:
+                index.RemoveType(name)
+
+    def UpdateConfigurationsUsageIndex(self):
+        index = self.GetEditedTypesUsageIndex()
+        if index is not None:
+            index.UpdateConfigurations(self.Project)
+
+    # Drop search index entry and xslt document of edited project when one of
+    # its elements is modified, computed again on next query, and note that
+    # element has to be serialized in next undo buffer state
+    def SetProjectElementModified(self, tagname):
+        self.SearchIndex.SetElementModified(tagname)
+        self.ResetProjectLibraryDocument()
+        self.SetProjectStateModified(_GetProjectElementTagName(tagname))
+
+    # Drop all data computed from edited project when many of its elements
+    # are modified
+    def SetProjectModified(self):
+        self.ResetTypesUsageIndex()
+        self.SearchIndex.Reset()
+        self.SetProjectStateModified(None)
+
+    # Drop types usage index and xslt document of edited project, rebuilt on
+    # next query
+    def ResetTypesUsageIndex(self):
+        self.TypesUsageIndexes = [
+            (indexed_project, index)
+            for indexed_project, index in self.TypesUsageIndexes
+            if indexed_project is not self.Project]
+        self.ResetTypesAncestors(self.Project)
+        self.ResetProjectLibraryDocument()
+
+    def GenerateProgram(self, filepath=None, jobs=1):
         errors = []
         warnings = []
         if self.Project is not None:
             try:
-                self.ProgramChunks = GenerateCurrentProgram(self, self.Project, errors, warnings)
-                self.NextCompiledProject = self.Copy(self.Project)
+                self.ProgramChunks = GenerateCurrentProgram(self, self.Project, errors, warnings, jobs)
+                self.NextCompiledProject = self.GetProjectSnapshot()
                 program_text = "".join([item[0] for item in self.ProgramChunks])
                 if filepath is not None:
                     programfile = open(filepath, "w")
@@ -864,10 +1557,11 @@ class PLCControler:
         return self.CurrentCompiledProject is not None
 
     def ProgramTransferred(self):
-        if self.NextCompiledProject is None:
+        if self.NextCompiledProject is not None:
             self.CurrentCompiledProject = self.NextCompiledProject
         else:
-            self.CurrentCompiledProject = self.Copy(self.Project)
+            self.CurrentCompiledProject = self.GetProjectSnapshot()
+        self.CompiledProject = None
 
     def GetChunkInfos(self, from_location, to_location):
         row = self.ProgramOffset + 1
@@ -899,6 +1593,8 @@ class PLCControler:
                 datatype_name = self.GenerateNewName(None, None, "datatype%d")
             # Add the datatype to project
             self.Project.appenddataType(datatype_name)
+            self.UpdateDataTypeUsageIndex(datatype_name)
+            self.SetProjectElementModified(self.ComputeDataTypeName(datatype_name))
             self.BufferProject()
             return self.ComputeDataTypeName(datatype_name)
         return None
@@ -907,6 +1603,8 @@ class PLCControler:
     def ProjectRemoveDataType(self, datatype_name):
         if self.Project is not None:
             self.Project.removedataType(datatype_name)
+            self.UpdateDataTypeUsageIndex(datatype_name)
+            self.SetProjectElementModified(self.ComputeDataTypeName(datatype_name))
             self.BufferProject()
 
     # Add a Pou to Project
@@ -916,6 +1614,8 @@ class PLCControler:
             self.Project.appendpou(pou_name, pou_type, body_type)
             if pou_type == "function":
                 self.SetPouInterfaceReturnType(pou_name, "BOOL")
+            self.UpdatePouUsageIndex(pou_name)
+            self.SetProjectElementModified(self.ComputePouName(pou_name))
             self.BufferProject()
             return self.ComputePouName(pou_name)
         return None
@@ -925,6 +1625,7 @@ class PLCControler:
             pou = self.Project.getpou(name)
             if pou is not None:
                 pou.setpouType(pou_type)
+                self.SetProjectElementModified(self.ComputePouName(name))
                 self.BufferProject()
 
     def GetPouXml(self, pou_name):
@@ -973,6 +1674,8 @@ class PLCControler:
             new_pou.setpouType(pou_type)
 
         self.Project.insertpou(0, new_pou)
+        self.UpdatePouUsageIndex(new_name)
+        self.SetProjectElementModified(self.ComputePouName(new_name))
         self.BufferProject()
 
         return self.ComputePouName(new_name),
@@ -981,6 +1684,8 @@ class PLCControler:
     def ProjectRemovePou(self, pou_name):
         if self.Project is not None:
             self.Project.removepou(pou_name)
+            self.UpdatePouUsageIndex(pou_name)
+            self.SetProjectElementModified(self.ComputePouName(pou_name))
             self.BufferProject()
 
     # Return the name of the configuration if only one exist
@@ -998,6 +1703,7 @@ class PLCControler:
             if config_name is None:
                 config_name = self.GenerateNewName(None, None, "configuration%d")
             self.Project.addconfiguration(config_name)
+            self.SetProjectElementModified(self.ComputeConfigurationName(config_name))
             self.BufferProject()
             return self.ComputeConfigurationName(config_name)
         return None
@@ -1006,6 +1712,8 @@ class PLCControler:
     def ProjectRemoveConfiguration(self, config_name):
         if self.Project is not None:
             self.Project.removeconfiguration(config_name)
+            self.UpdateConfigurationsUsageIndex()
+            self.SetProjectElementModified(self.ComputeConfigurationName(config_name))
             self.BufferProject()
 
     # Add a resource to a configuration of the Project
@@ -1014,6 +1722,7 @@ class PLCControler:
             if resource_name is None:
                 resource_name = self.GenerateNewName(None, None, "resource%d")
             self.Project.addconfigurationResource(config_name, resource_name)
+            self.SetProjectElementModified(self.ComputeConfigurationName(config_name))
             self.BufferProject()
             return self.ComputeConfigurationResourceName(config_name, resource_name)
         return None
@@ -1022,6 +1731,8 @@ class PLCControler:
     def ProjectRemoveConfigurationResource(self, config_name, resource_name):
         if self.Project is not None:
             self.Project.removeconfigurationResource(config_name, resource_name)
+            self.UpdateConfigurationsUsageIndex()
+            self.SetProjectElementModified(self.ComputeConfigurationName(config_name))
             self.BufferProject()
 
     # Add a Transition to a Project Pou
@@ -1030,6 +1741,7 @@ class PLCControler:
             pou = self.Project.getpou(pou_name)
             if pou is not None:
                 pou.addtransition(transition_name, transition_type)
+                self.SetProjectElementModified(self.ComputePouName(pou_name))
                 self.BufferProject()
                 return self.ComputePouTransitionName(pou_name, transition_name)
         return None
@@ -1041,6 +1753,7 @@ class PLCControler:
             pou = self.Project.getpou(pou_name)
             if pou is not None:
                 pou.removetransition(transition_name)
+                self.SetProjectElementModified(self.ComputePouName(pou_name))
                 self.BufferProject()
 
     # Add an Action to a Project Pou
@@ -1049,6 +1762,7 @@ class PLCControler:
             pou = self.Project.getpou(pou_name)
             if pou is not None:
                 pou.addaction(action_name, action_type)
+                self.SetProjectElementModified(self.ComputePouName(pou_name))
                 self.BufferProject()
                 return self.ComputePouActionName(pou_name, action_name)
         return None
@@ -1060,6 +1774,7 @@ class PLCControler:
             pou = self.Project.getpou(pou_name)
             if pou is not None:
                 pou.removeaction(action_name)
+                self.SetProjectElementModified(self.ComputePouName(pou_name))
                 self.BufferProject()
 
     # Change the name of a pou
@@ -1070,6 +1785,7 @@ class PLCControler:
             if datatype is not None:
                 datatype.setname(new_name)
                 self.Project.updateElementName(old_name, new_name)
+                self.SetProjectModified()
                 self.BufferProject()
 
     # Change the name of a pou
@@ -1080,6 +1796,7 @@ class PLCControler:
             if pou is not None:
                 pou.setname(new_name)
                 self.Project.updateElementName(old_name, new_name)
+                self.SetProjectModified()
                 self.BufferProject()
 
     # Change the name of a pou transition
@@ -1092,6 +1809,7 @@ class PLCControler:
                 if transition is not None:
                     transition.setname(new_name)
                     pou.updateElementName(old_name, new_name)
+                    self.SetProjectElementModified(self.ComputePouName(pou_name))
                     self.BufferProject()
 
     # Change the name of a pou action
@@ -1104,6 +1822,7 @@ class PLCControler:
                 if action is not None:
                     action.setname(new_name)
                     pou.updateElementName(old_name, new_name)
+                    self.SetProjectElementModified(self.ComputePouName(pou_name))
                     self.BufferProject()
 
     # Change the name of a pou variable
@@ -1116,6 +1835,7 @@ class PLCControler:
                     for var in varlist.getvariable():
                         if var.getname() == old_name:
                             var.setname(new_name)
+                self.SetProjectElementModified(self.ComputePouName(pou_name))
                 self.BufferProject()
 
     # Change the name of a configuration
@@ -1125,6 +1845,7 @@ class PLCControler:
             configuration = self.Project.getconfiguration(old_name)
             if configuration is not None:
                 configuration.setname(new_name)
+                self.SetProjectElementModified(self.ComputeConfigurationName(old_name))
                 self.BufferProject()
 
     # Change the name of a configuration resource
@@ -1134,6 +1855,7 @@ class PLCControler:
             resource = self.Project.getconfigurationResource(config_name, old_name)
             if resource is not None:
                 resource.setname(new_name)
+                self.SetProjectElementModified(self.ComputeConfigurationName(config_name))
                 self.BufferProject()
 
     # Return the description of the pou given by its name
@@ -1154,6 +1876,7 @@ class PLCControler:
             pou = project.getpou(name)
             if pou is not None:
                 pou.setdescription(description)
+                self.SetProjectElementModified(self.ComputePouName(name))
                 self.BufferProject()
 
     # Return the type of the pou given by its name
@@ -1321,23 +2044,20 @@ class PLCControler:
 
     def GetVariableDictionary(self, object_with_vars, tree=False, debug=False):
         variables = []
-        factory = VariablesInfosFactory(variables)
 
-        parser = etree.XMLParser()
-        parser.resolvers.add(LibraryResolver(self, debug))
-
-        variables_infos_xslt_tree = etree.XSLT(
-            etree.parse(
-                os.path.join(ScriptDirectory, "plcopen", "variables_infos.xslt"),
-                parser),
-            extensions = {("var_infos_ns", name): getattr(factory, name)
-                for name in ["SetType", "AddDimension", "AddTree",
-                             "AddVarToTree", "AddVariable"]})
+        variables_infos_xslt_tree = self.GetVariablesInfosXSLTQuery(debug)
+        variables_infos_xslt_tree.Factory.Reset(variables)
         variables_infos_xslt_tree(object_with_vars,
             tree=etree.XSLT.strparam(str(tree)))
 
         return variables
 
+    def GetVariablesInfosXSLTQuery(self, debug=False):
+        return self.GetXSLTQuery(
+            "variables_infos.xslt", "var_infos_ns", VariablesInfosFactory,
+            ["SetType", "AddDimension", "AddTree", "AddVarToTree",
+             "AddVariable"], debug)
+
     # Add a global var to configuration to configuration
     def AddConfigurationGlobalVar(self, config_name, var_type, var_name,
                                            location="", description=""):
@@ -1349,6 +2069,8 @@ class PLCControler:
                 configuration.addglobalVar(
                     self.GetVarTypeObject(var_type),
                     var_name, location, description)
+                self.UpdateConfigurationsUsageIndex()
+                self.SetProjectElementModified(self.ComputeConfigurationName(config_name))
 
     # Replace the configuration globalvars by those given
     def SetConfigurationGlobalVars(self, name, vars):
@@ -1360,6 +2082,8 @@ class PLCControler:
                 configuration.setglobalVars([
                     varlist for vartype, varlist
                     in self.ExtractVarLists(vars)])
+                self.UpdateConfigurationsUsageIndex()
+                self.SetProjectElementModified(self.ComputeConfigurationName(name))
 
     # Return the configuration globalvars
     def GetConfigurationGlobalVars(self, name, debug = False):
@@ -1397,6 +2121,8 @@ class PLCControler:
                 resource.setglobalVars([
                     varlist for vartype, varlist
                     in self.ExtractVarLists(vars)])
+                self.UpdateConfigurationsUsageIndex()
+                self.SetProjectElementModified(self.ComputeConfigurationName(config_name))
 
     # Return the resource globalvars
     def GetConfigurationResourceGlobalVars(self, config_name, name, debug = False):
@@ -1446,6 +2172,8 @@ class PLCControler:
                     pou.interface = PLCOpenParser.CreateElement("interface", "pou")
                 # Set Pou interface
                 pou.setvars([varlist for varlist_type, varlist in self.ExtractVarLists(vars)])
+                self.UpdatePouUsageIndex(name)
+                self.SetProjectElementModified(self.ComputePouName(name))
 
     # Replace the return type of the pou given by its name (only for functions)
     def SetPouInterfaceReturnType(self, name, return_type):
@@ -1469,15 +2197,18 @@ class PLCControler:
                     derived_type = PLCOpenParser.CreateElement("derived", "dataType")
                     derived_type.setname(return_type)
                     return_type_obj.setcontent(derived_type)
+                self.SetProjectElementModified(self.ComputePouName(name))
 
     def UpdateProjectUsedPous(self, old_name, new_name):
         if self.Project is not None:
             self.Project.updateElementName(old_name, new_name)
+            self.SetProjectModified()
 
     def UpdateEditedElementUsedVariable(self, tagname, old_name, new_name):
         pou = self.GetEditedElement(tagname)
         if pou is not None:
             pou.updateElementName(old_name, new_name)
+            self.SetProjectElementModified(tagname)
 
     # Return the return type of the given pou
     def GetPouInterfaceReturnType(self, pou, tree=False, debug=False):
@@ -1486,18 +2217,9 @@ class PLCControler:
             # Return the return type if there is one
             return_type = pou.interface.getreturnType()
             if return_type is not None:
-                factory = VariablesInfosFactory([])
-
-                parser = etree.XMLParser()
-                parser.resolvers.add(LibraryResolver(self))
-
-                return_type_infos_xslt_tree = etree.XSLT(
-                    etree.parse(
-                        os.path.join(ScriptDirectory, "plcopen", "variables_infos.xslt"),
-                        parser),
-                    extensions = {("var_infos_ns", name): getattr(factory, name)
-                                  for name in ["SetType", "AddDimension",
-                                               "AddTree", "AddVarToTree"]})
+                return_type_infos_xslt_tree = self.GetVariablesInfosXSLTQuery()
+                factory = return_type_infos_xslt_tree.Factory
+                factory.Reset()
                 return_type_infos_xslt_tree(return_type,
                     tree=etree.XSLT.strparam(str(tree)))
                 if tree:
@@ -1511,6 +2233,7 @@ class PLCControler:
     # Function that add a new confnode to the confnode list
     def AddConfNodeTypesList(self, typeslist):
         self.ConfNodeTypes.extend(typeslist)
+        self.ResetTypesAncestors()
         addedcat = [{"name": _("%s POUs") % confnodetypes["name"],
                      "list": [pou.getblockInfos()
                               for pou in confnodetypes["types"].getpous()]}
@@ -1524,6 +2247,7 @@ class PLCControler:
     # Function that clear the confnode list
     def ClearConfNodeTypes(self):
         self.ConfNodeTypes = []
+        self.ResetTypesAncestors()
         self.TotalTypesDict = StdBlckDct.copy()
         self.TotalTypes = StdBlckLst[:]
 
@@ -1567,39 +2291,20 @@ class PLCControler:
             global_vars.append(tempvar)
         return global_vars
 
-    # Function that returns the block definition associated to the block type given
-    def GetBlockType(self, typename, inputs = None, debug = False):
-        result_blocktype = None
-        for sectioname, blocktype in self.TotalTypesDict.get(typename,[]):
-            if inputs is not None and inputs != "undefined":
-                block_inputs = tuple([var_type for name, var_type, modifier in blocktype["inputs"]])
-                if reduce(lambda x, y: x and y, map(lambda x: x[0] == "ANY" or self.IsOfType(*x), zip(inputs, block_inputs)), True):
-                    return blocktype
-            else:
-                if result_blocktype is not None:
-                    if inputs == "undefined":
-                        return None
-                    else:
-                        result_blocktype["inputs"] = [(i[0], "ANY", i[2]) for i in result_blocktype["inputs"]]
-                        result_blocktype["outputs"] = [(o[0], "ANY", o[2]) for o in result_blocktype["outputs"]]
-                        return result_blocktype
-                result_blocktype = blocktype.copy()
-        if result_blocktype is not None:
-            return result_blocktype
+    # Function that returns the block definition of the pou given by its name
+    def GetPouBlockInfos(self, name, debug = False):
         project = self.GetProject(debug)
         if project is not None:
-            blocktype = project.getpou(typename)
-            if blocktype is not None:
-                blocktype_infos = blocktype.getblockInfos()
-                if inputs in [None, "undefined"]:
-                    return blocktype_infos
-
-                if inputs == tuple([var_type
-                    for name, var_type, modifier in blocktype_infos["inputs"]]):
-                    return blocktype_infos
-
+            pou = project.getpou(name)
+            if pou is not None:
+                return pou.getblockInfos()
         return None
 
+    # Function that returns the block definition associated to the block type given
+    def GetBlockType(self, typename, inputs = None, debug = False):
+        return FindBlockType(typename, inputs, self.TotalTypesDict,
+            lambda name: self.GetPouBlockInfos(name, debug), self.IsOfType)
+
     # Return Block types checking for recursion
     def GetBlockTypes(self, tagname = "", debug = False):
         typename = None
@@ -1619,11 +2324,12 @@ class PLCControler:
                  "list": [block for block in category["list"]
                           if block["type"] in filter]}
                 for category in self.TotalTypes]
+            index = self.GetTypesUsageIndex(debug)
             blocktypes.append({"name" : USER_DEFINED_POUS,
                 "list": [pou.getblockInfos()
                          for pou in project.getpous(name, filter)
                          if (name is None or
-                             len(self.GetInstanceList(pou, name, debug)) == 0)]})
+                             not index.IsUsedBy(name, pou.getname()))]})
             return blocktypes
         return self.TotalTypes
 
@@ -1690,7 +2396,7 @@ class PLCControler:
             result = project.getpou(typename)
             if result is not None:
                 return result
-        for standardlibrary in StdBlckLibs.values():
+        for standardlibrary in GetStdBlckLibs().values():
             result = standardlibrary.getpou(typename)
             if result is not None:
                 return result
@@ -1752,18 +2458,54 @@ class PLCControler:
     def IsOfType(self, typename, reference, debug = False):
         if reference is None or typename == reference:
             return True
+        return reference in self.GetTypeAncestors(typename, debug)
 
-        basetype = TypeHierarchy.get(typename)
-        if basetype is not None:
-            return self.IsOfType(basetype, reference)
-
-        datatype = self.GetDataType(typename, debug)
-        if datatype is not None:
-            basetype = self.GetDataTypeBaseType(datatype)
+    # Return the set of types and meta-types given type is one of, itself
+    # included, computed once until data types change
+    def GetTypeAncestors(self, typename, debug = False):
+        project = self.GetProject(debug)
+        types_ancestors = None
+        for computed_project, computed_ancestors in self.TypesAncestors:
+            if computed_project is project:
+                types_ancestors = computed_ancestors
+                break
+        if types_ancestors is None:
+            types_ancestors = {}
+            # only keep ancestors of edited and compiled projects
+            self.TypesAncestors = [
+                (computed_project, computed_ancestors)
+                for computed_project, computed_ancestors in self.TypesAncestors
+                if computed_project is self.Project or
+                   computed_project is self.CompiledProject]
+            self.TypesAncestors.append((project, types_ancestors))
+
+        ancestors = types_ancestors.get(typename)
+        if ancestors is None:
+            ancestors = set([typename])
+            basetype = typename
+            while basetype is not None and not TypeHierarchy.has_key(basetype):
+                datatype = self.GetDataType(basetype, debug)
+                basetype = (self.GetDataTypeBaseType(datatype)
+                            if datatype is not None else None)
+                # derived types referencing each other have no elementary type
+                if basetype in ancestors:
+                    basetype = None
+                elif basetype is not None:
+                    ancestors.add(basetype)
             if basetype is not None:
-                return self.IsOfType(basetype, reference, debug)
-
-        return False
+                ancestors.update(TypeAncestors[basetype])
+            ancestors = types_ancestors[typename] = frozenset(ancestors)
+        return ancestors
+
+    # Drop ancestor types computed for project, or for all projects
+    def ResetTypesAncestors(self, project = None):
+        if project is None:
+            self.TypesAncestors = []
+        else:
+            self.TypesAncestors = [
+                (computed_project, computed_ancestors)
+                for computed_project, computed_ancestors in self.TypesAncestors
+                if computed_project is not project]
 
     def IsEndType(self, typename):
         if typename is not None:
@@ -2108,6 +2850,8 @@ class PLCControler:
                 datatype.initialValue.setvalue(infos["initial"])
             else:
                 datatype.initialValue = None
+            self.UpdateDataTypeUsageIndex(words[1])
+            self.SetProjectElementModified(tagname)
             self.BufferProject()
 
 #-------------------------------------------------------------------------------
@@ -2193,6 +2937,7 @@ class PLCControler:
             element = self.GetEditedElement(tagname)
             if element is not None:
                 element.settext(text)
+                self.SetProjectElementModified(tagname)
 
     # Return the edited element text
     def GetEditedElementText(self, tagname, debug = False):
@@ -2305,6 +3050,7 @@ class PLCControler:
         element_name, element_type = self.GetEditedElementType(tagname, debug)
         if element is not None:
             bodytype = element.getbodyType()
+            self.SetProjectElementModified(tagname)
 
             # Get edited element type scaling
             scaling = None
@@ -2402,28 +3148,69 @@ class PLCControler:
         element_instances = OrderedDict()
         element = self.GetEditedElement(tagname, debug)
         if element is not None:
-            factory = BlockInstanceFactory(element_instances)
-
-            pou_block_instances_xslt_tree = etree.XSLT(
-                pou_block_instances_xslt,
-                extensions = {
-                    ("pou_block_instances_ns", name): getattr(factory, name)
-                    for name in ["AddBlockInstance", "SetSpecificValues",
-                                 "AddInstanceConnection", "AddConnectionLink",
-                                 "AddLinkPoint", "AddAction"]})
-
+            pou_block_instances_xslt_tree = self.GetXSLTQuery(
+                "pou_block_instances.xslt", "pou_block_instances_ns",
+                BlockInstanceFactory,
+                ["AddBlockInstance", "SetSpecificValues",
+                 "AddInstanceConnection", "AddConnectionLink",
+                 "AddLinkPoint", "AddAction"])
+
+            pou_block_instances_xslt_tree.Factory.Reset(element_instances)
             pou_block_instances_xslt_tree(element)
         return element_instances
 
+    # Return instances infos of edited element in a state, with local ids of
+    # instances added or changed and local ids of instances removed since state
+    # given. Instances modified by editing functions since last call are always
+    # reported as changed, and every instance is if no state is given.
+    def GetEditedElementInstancesChanges(self, tagname, state = None, debug = False):
+        instances = self.GetEditedElementInstancesInfos(tagname, debug)
+        # Block instances also depend on their block type interface
+        blocktypes = {}
+        for instance in instances.itervalues():
+            if (instance.type not in _SpecificValuesTuples and
+                not blocktypes.has_key(instance.type)):
+                blocktype_infos = self.GetBlockType(instance.type, debug = debug)
+                if blocktype_infos is not None:
+                    blocktypes[instance.type] = (blocktype_infos["type"],
+                                                 blocktype_infos["inputs"],
+                                                 blocktype_infos["outputs"])
+                else:
+                    blocktypes[instance.type] = None
+        if debug:
+            modified = set()
+        else:
+            modified = self.EditedElementsModifiedInstances.pop(tagname, set())
+        if state is None:
+            changed = instances.keys()
+            removed = []
+        else:
+            changed = [id for id, instance in instances.iteritems()
+                       if (id in modified or
+                           state.instances.get(id) != instance or
+                           blocktypes.has_key(instance.type) and
+                           state.blocktypes.get(instance.type) != blocktypes[instance.type])]
+            removed = [id for id in state.instances if not instances.has_key(id)]
+            removed.extend([id for id in modified
+                            if not (instances.has_key(id) or state.instances.has_key(id))])
+        return _ElementInstancesState(instances, blocktypes), changed, removed
+
+    # Record that instance with given local id was modified in edited element
+    def SetEditedElementInstanceModified(self, tagname, id):
+        self.EditedElementsModifiedInstances.setdefault(tagname, set()).add(id)
+        self.SetProjectElementModified(tagname)
+
     def ClearEditedElementExecutionOrder(self, tagname):
         element = self.GetEditedElement(tagname)
         if element is not None:
             element.resetexecutionOrder()
+            self.SetProjectElementModified(tagname)
 
     def ResetEditedElementExecutionOrder(self, tagname):
         element = self.GetEditedElement(tagname)
         if element is not None:
             element.compileexecutionOrder()
+            self.SetProjectElementModified(tagname)
 
     def SetConnectionWires(self, connection, connector):
         wires = connector.GetWires()
@@ -2468,6 +3255,8 @@ class PLCControler:
                     pou.addpouLocalVar(
                         self.GetVarTypeObject(var_type),
                         name, **args)
+                    self.UpdatePouUsageIndex(words[1])
+                    self.SetProjectElementModified(tagname)
 
     def AddEditedElementPouExternalVar(self, tagname, var_type, name):
         if self.Project is not None:
@@ -2477,6 +3266,8 @@ class PLCControler:
                 if pou is not None:
                     pou.addpouExternalVar(
                         self.GetVarTypeObject(var_type), name)
+                    self.UpdatePouUsageIndex(words[1])
+                    self.SetProjectElementModified(tagname)
 
     def ChangeEditedElementPouVar(self, tagname, old_type, old_name, new_type, new_name):
         if self.Project is not None:
@@ -2485,6 +3276,8 @@ class PLCControler:
                 pou = self.Project.getpou(words[1])
                 if pou is not None:
                     pou.changepouVar(old_type, old_name, new_type, new_name)
+                    self.UpdatePouUsageIndex(words[1])
+                    self.SetProjectElementModified(tagname)
 
     def RemoveEditedElementPouVar(self, tagname, type, name):
         if self.Project is not None:
@@ -2493,10 +3286,13 @@ class PLCControler:
                 pou = self.Project.getpou(words[1])
                 if pou is not None:
                     pou.removepouVar(type, name)
+                    self.UpdatePouUsageIndex(words[1])
+                    self.SetProjectElementModified(tagname)
 
     def AddEditedElementBlock(self, tagname, id, blocktype, blockname = None):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             block = PLCOpenParser.CreateElement("block", "fbdObjects")
             block.setlocalId(id)
             block.settypeName(blocktype)
@@ -2509,6 +3305,7 @@ class PLCControler:
     def SetEditedElementBlockInfos(self, tagname, id, infos):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             block = element.getinstance(id)
             if block is None:
                 return
@@ -2578,6 +3375,7 @@ class PLCControler:
     def AddEditedElementVariable(self, tagname, id, var_type):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             variable = PLCOpenParser.CreateElement(
                 {INPUT: "inVariable",
                  OUTPUT: "outVariable",
@@ -2588,6 +3386,7 @@ class PLCControler:
     def SetEditedElementVariableInfos(self, tagname, id, infos):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             variable = element.getinstance(id)
             if variable is None:
                 return
@@ -2632,6 +3431,7 @@ class PLCControler:
     def AddEditedElementConnection(self, tagname, id, connection_type):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             connection = PLCOpenParser.CreateElement(
                 {CONNECTOR: "connector",
                  CONTINUATION: "continuation"}[connection_type], "commonObjects")
@@ -2641,6 +3441,7 @@ class PLCControler:
     def SetEditedElementConnectionInfos(self, tagname, id, infos):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             connection = element.getinstance(id)
             if connection is None:
                 return
@@ -2668,6 +3469,7 @@ class PLCControler:
     def AddEditedElementComment(self, tagname, id):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             comment = PLCOpenParser.CreateElement("comment", "commonObjects")
             comment.setlocalId(id)
             element.addinstance(comment)
@@ -2675,6 +3477,7 @@ class PLCControler:
     def SetEditedElementCommentInfos(self, tagname, id, infos):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             comment = element.getinstance(id)
             for param, value in infos.items():
                 if param == "content":
@@ -2691,6 +3494,7 @@ class PLCControler:
     def AddEditedElementPowerRail(self, tagname, id, powerrail_type):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             powerrail = PLCOpenParser.CreateElement(
                 {LEFTRAIL: "leftPowerRail",
                  RIGHTRAIL: "rightPowerRail"}[powerrail_type], "ldObjects")
@@ -2700,6 +3504,7 @@ class PLCControler:
     def SetEditedElementPowerRailInfos(self, tagname, id, infos):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             powerrail = element.getinstance(id)
             if powerrail is None:
                 return
@@ -2732,6 +3537,7 @@ class PLCControler:
     def AddEditedElementContact(self, tagname, id):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             contact = PLCOpenParser.CreateElement("contact", "ldObjects")
             contact.setlocalId(id)
             element.addinstance(contact)
@@ -2739,6 +3545,7 @@ class PLCControler:
     def SetEditedElementContactInfos(self, tagname, id, infos):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             contact = element.getinstance(id)
             if contact is None:
                 return
@@ -2775,6 +3582,7 @@ class PLCControler:
     def AddEditedElementCoil(self, tagname, id):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             coil = PLCOpenParser.CreateElement("coil", "ldObjects")
             coil.setlocalId(id)
             element.addinstance(coil)
@@ -2782,6 +3590,7 @@ class PLCControler:
     def SetEditedElementCoilInfos(self, tagname, id, infos):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             coil = element.getinstance(id)
             if coil is None:
                 return
@@ -2821,6 +3630,7 @@ class PLCControler:
     def AddEditedElementStep(self, tagname, id):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             step = PLCOpenParser.CreateElement("step", "sfcObjects")
             step.setlocalId(id)
             element.addinstance(step)
@@ -2828,6 +3638,7 @@ class PLCControler:
     def SetEditedElementStepInfos(self, tagname, id, infos):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             step = element.getinstance(id)
             if step is None:
                 return
@@ -2871,6 +3682,7 @@ class PLCControler:
     def AddEditedElementTransition(self, tagname, id):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             transition = PLCOpenParser.CreateElement("transition", "sfcObjects")
             transition.setlocalId(id)
             element.addinstance(transition)
@@ -2878,6 +3690,7 @@ class PLCControler:
     def SetEditedElementTransitionInfos(self, tagname, id, infos):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             transition = element.getinstance(id)
             if transition is None:
                 return
@@ -2914,6 +3727,7 @@ class PLCControler:
     def AddEditedElementDivergence(self, tagname, id, divergence_type):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             divergence = PLCOpenParser.CreateElement(
                 {SELECTION_DIVERGENCE: "selectionDivergence",
                  SELECTION_CONVERGENCE: "selectionConvergence",
@@ -2938,6 +3752,7 @@ class PLCControler:
     def SetEditedElementDivergenceInfos(self, tagname, id, infos):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             divergence = element.getinstance(id)
             if divergence is None:
                 return
@@ -2982,6 +3797,7 @@ class PLCControler:
     def AddEditedElementJump(self, tagname, id):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             jump = PLCOpenParser.CreateElement("jumpStep", "sfcObjects")
             jump.setlocalId(id)
             element.addinstance(jump)
@@ -2989,6 +3805,7 @@ class PLCControler:
     def SetEditedElementJumpInfos(self, tagname, id, infos):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             jump = element.getinstance(id)
             if jump is None:
                 return
@@ -3012,6 +3829,7 @@ class PLCControler:
     def AddEditedElementActionBlock(self, tagname, id):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             actionBlock = PLCOpenParser.CreateElement("actionBlock", "commonObjects")
             actionBlock.setlocalId(id)
             element.addinstance(actionBlock)
@@ -3019,6 +3837,7 @@ class PLCControler:
     def SetEditedElementActionBlockInfos(self, tagname, id, infos):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             actionBlock = element.getinstance(id)
             if actionBlock is None:
                 return
@@ -3042,6 +3861,7 @@ class PLCControler:
     def RemoveEditedElementInstance(self, tagname, id):
         element = self.GetEditedElement(tagname)
         if element is not None:
+            self.SetEditedElementInstanceModified(tagname, id)
             instance = element.getinstance(id)
             if isinstance(instance, PLCOpenParser.GetElementClass("block", "fbdObjects")):
                 self.RemoveEditedElementPouVar(tagname, instance.gettypeName(), instance.getinstanceName())
@@ -3096,6 +3916,8 @@ class PLCControler:
                     resource.appendpouInstance(new_instance)
                 new_instance.setname(instance["Name"])
                 new_instance.settypeName(instance["Type"])
+            self.UpdateConfigurationsUsageIndex()
+            self.SetProjectElementModified(tagname)
 
     def GetEditedResourceInfos(self, tagname, debug = False):
         resource = self.GetEditedElement(tagname, debug)
@@ -3152,52 +3974,95 @@ class PLCControler:
                 instances_data.append(new_instance)
             return tasks_data, instances_data
 
-    def OpenXMLFile(self, filepath):
-        self.Project, error = LoadProject(filepath)
+    def OpenXMLFile(self, filepath, validation_callback=None):
+        self.Project, error = LoadProject(filepath, validation_callback)
         if self.Project is None:
             return _("Project file syntax error:\n\n") + error
         self.SetFilePath(filepath)
         self.CreateProjectBuffer(True)
         self.ProgramChunks = []
         self.ProgramOffset = 0
-        self.NextCompiledProject = self.Copy(self.Project)
+        self.NextCompiledProject = self.GetProjectSnapshot()
         self.CurrentCompiledProject = None
+        self.CompiledProject = None
         self.Buffering = False
         self.CurrentElementEditing = None
+        self.SearchIndex.Reset()
         return error
 
-    def SaveXMLFile(self, filepath = None):
+    def SaveXMLFile(self, filepath = None, callback = None):
+        """
+        Save project in file. If callback is given, a copy of project is
+        written by a thread that calls callback with error message, or None,
+        duration of save and state of project written once done. Project is
+        only marked as saved when this state is given to MarkProjectAsSaved
+        """
         if not filepath and self.FilePath == "":
             return False
         else:
             contentheader = {"modificationDateTime": datetime.datetime(*localtime()[:6])}
             self.Project.setcontentHeader(contentheader)
-
-            if filepath:
-                SaveProject(self.Project, filepath)
+            self.SetProjectStateModified("contentHeader")
+
+            if callback is not None:
+                # Saves are written in the order they were requested
+                self.WaitProjectSaved()
+                self.SavingThread = Thread(
+                    target=self.SaveProjectCopy,
+                    args=(deepcopy(self.Project), 
+                          filepath or self.FilePath, 
+                          self.GetProjectState(), callback))
+                self.SavingThread.start()
             else:
-                SaveProject(self.Project, self.FilePath)
+                if filepath:
+                    SaveProject(self.Project, filepath)
+                else:
+                    SaveProject(self.Project, self.FilePath)
+                self.MarkProjectAsSaved()
 
-            self.MarkProjectAsSaved()
             if filepath:
                 self.SetFilePath(filepath)
             return True
 
+    def SaveProjectCopy(self, project, filepath, state, callback):
+        start_time = time.time()
+        try:
+            SaveProject(project, filepath)
+            error = None
+        except Exception, e:
+            error = str(e) or e.__class__.__name__
+        callback(error, time.time() - start_time, state)
+
+    def WaitProjectSaved(self):
+        if self.SavingThread is not None:
+            self.SavingThread.join()
+            self.SavingThread = None
+
 #-------------------------------------------------------------------------------
 #                       Search in Current Project Functions
 #-------------------------------------------------------------------------------
 
     def SearchInProject(self, criteria):
-        return self.Project.Search(criteria)
+        return self.SearchIndex.Search(self.Project, criteria)
+
+    def SearchInIndexedPou(self, tagname, pou, criteria, debug=False):
+        # Index only stores POUs of edited project
+        if debug:
+            return pou.Search(criteria)
+        return self.SearchIndex.SearchInElement(
+            tagname, pou, pou.getpouType(), criteria)
 
     def SearchInPou(self, tagname, criteria, debug=False):
         pou = self.GetEditedElement(tagname, debug)
         if pou is not None:
+            if tagname.split("::")[0] == 'P':
+                return self.SearchInIndexedPou(tagname, pou, criteria, debug)
             search_results = pou.Search(criteria, [tagname])
             if tagname.split("::")[0] in ['A', 'T']:
                 parent_pou_tagname = "P::%s" % (tagname.split("::")[-2])
                 parent_pou = self.GetEditedElement(parent_pou_tagname, debug)
-                for infos, start, end, text in parent_pou.Search(criteria):
+                for infos, start, end, text in self.SearchInIndexedPou(
+                        parent_pou_tagname, parent_pou, criteria, debug):
                     if infos[1] in ["var_local", "var_input", "var_output", "var_inout"]:
                         search_results.append((infos, start, end, text))
             return search_results
@@ -3214,8 +4079,9 @@ class PLCControler:
         return deepcopy(model)
 
     def CreateProjectBuffer(self, saved):
+        self.ProjectStateModified = set()
         if self.ProjectBufferEnabled:
-            self.ProjectBuffer = UndoBuffer(PLCOpenParser.Dumps(self.Project), saved)
+            self.ProjectBuffer = UndoBuffer(ProjectState(self.Project), saved)
         else:
             self.ProjectBuffer = None
             self.ProjectSaved = saved
@@ -3232,28 +4098,60 @@ class PLCControler:
                 current_saved = self.ProjectBuffer.IsCurrentSaved()
             self.CreateProjectBuffer(current_saved)
 
+    # Note that a project element, given by its key in project states, is
+    # modified since current state of undo buffer, all elements being
+    # serialized in next state if key is None
+    def SetProjectStateModified(self, key):
+        if self.ProjectStateModified is not None:
+            if key is None:
+                self.ProjectStateModified = None
+            else:
+                self.ProjectStateModified.add(key)
+
+    def BufferCurrentProjectState(self):
+        self.ProjectBuffer.Buffering(
+            ProjectState(self.Project, self.ProjectBuffer.Current(),
+                         self.ProjectStateModified))
+        self.ProjectStateModified = set()
+
     def BufferProject(self):
         if self.ProjectBuffer is not None:
-            self.ProjectBuffer.Buffering(PLCOpenParser.Dumps(self.Project))
+            self.BufferCurrentProjectState()
         else:
             self.ProjectSaved = False
+            self.ProjectChangesCount += 1
 
     def StartBuffering(self):
         if self.ProjectBuffer is not None:
             self.Buffering = True
         else:
             self.ProjectSaved = False
+            self.ProjectChangesCount += 1
 
     def EndBuffering(self):
         if self.ProjectBuffer is not None and self.Buffering:
-            self.ProjectBuffer.Buffering(PLCOpenParser.Dumps(self.Project))
+            self.BufferCurrentProjectState()
             self.Buffering = False
 
-    def MarkProjectAsSaved(self):
+    # Return object identifying current state of project
+    def GetProjectState(self):
         self.EndBuffering()
         if self.ProjectBuffer is not None:
-            self.ProjectBuffer.CurrentSaved()
-        else:
+            return self.ProjectBuffer.Current()
+        return self.ProjectChangesCount
+
+    def MarkProjectAsSaved(self, state=None):
+        """
+        Mark project as saved. If state is given, project is only saved if
+        it didn't change since state was returned by GetProjectState
+        """
+        self.EndBuffering()
+        if self.ProjectBuffer is not None:
+            if state is None:
+                self.ProjectBuffer.CurrentSaved()
+            else:
+                self.ProjectBuffer.StateSaved(state)
+        elif state is None or state == self.ProjectChangesCount:
             self.ProjectSaved = True
 
     # Return if project is saved
@@ -3263,14 +4161,21 @@ class PLCControler:
         else:
             return self.ProjectSaved
 
+    def RestoreProjectState(self, state):
+        if state is not None:
+            state.Restore(self.Project)
+            self.ResetTypesUsageIndex()
+            self.SearchIndex.Reset()
+            self.ProjectStateModified = set()
+
     def LoadPrevious(self):
         self.EndBuffering()
         if self.ProjectBuffer is not None:
-            self.Project = PLCOpenParser.Loads(self.ProjectBuffer.Previous())
+            self.RestoreProjectState(self.ProjectBuffer.Previous())
 
     def LoadNext(self):
         if self.ProjectBuffer is not None:
-            self.Project = PLCOpenParser.Loads(self.ProjectBuffer.Next())
+            self.RestoreProjectState(self.ProjectBuffer.Next())
 
     def GetBufferState(self):
         if self.ProjectBuffer is not None:
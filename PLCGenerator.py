@@ -22,10 +22,16 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
-from plcopen import PLCOpenParser
+from plcopen import PLCOpenParser, LoadPou
 from plcopen.structures import *
 from types import *
 import re
+import multiprocessing
+import threading
+
+# Maximum duration in seconds of POU bodies generation in worker processes,
+# POU bodies being generated in main process once exceeded
+POU_GENERATION_TIMEOUT = 300
 
 # Dictionary associating PLCOpen variable categories to the corresponding
 # IEC 61131-3 variable categories
@@ -99,7 +105,7 @@ class PLCGenException(Exception):
 class ProgramGenerator:
 
     # Create a new PCL program generator
-    def __init__(self, controler, project, errors, warnings):
+    def __init__(self, controler, project, errors, warnings, jobs=1):
         # Keep reference of the controler and project
         self.Controler = controler
         self.Project = project
@@ -109,6 +115,10 @@ class ProgramGenerator:
         self.PouComputed = {}
         self.Errors = errors
         self.Warnings = warnings
+        # Number of processes used to generate POU bodies (0 for one per CPU)
+        self.Jobs = jobs
+        # Events recorded by worker processes for each POU generated
+        self.PouProgramEvents = {}
 
     # Compute value according to type given
     def ComputeValue(self, value, var_type):
@@ -241,6 +251,12 @@ class ProgramGenerator:
             # If not mark POU as computed
             self.PouComputed[pou_name] = True
 
+            # POU already generated by a worker process
+            events = self.PouProgramEvents.get(pou_name)
+            if events is not None:
+                self.ReplayPouProgramEvents(events)
+                return
+
             # Getting POU model from project
             pou = self.Project.getpou(pou_name)
             pou_type = pou.getpouType()
@@ -253,6 +269,66 @@ class ProgramGenerator:
             else:
                 raise PLCGenException, _("Undefined pou type \"%s\"")%pou_type
 
+    # Replay, in their original order, the POU generations requested, the
+    # messages emitted and the program generated by a worker process
+    def ReplayPouProgramEvents(self, events):
+        for event, value in events:
+            if event == "pou":
+                self.GeneratePouProgram(value)
+            elif event == "warning":
+                self.Warnings.append(value)
+            elif event == "error":
+                self.Errors.append(value)
+            elif event == "exception":
+                raise PLCGenException, value
+            elif event == "program":
+                self.Program += value
+
+    # Generate the POU bodies in a pool of worker processes
+    def GeneratePouProgramsInPool(self):
+        # Workers are forked, and a fork made while other threads are running
+        # can copy locks held by those threads and deadlock workers. POU bodies
+        # are then all generated in this process
+        threads = [thread.getName() for thread in threading.enumerate()
+                   if thread is not threading.currentThread()]
+        if len(threads) > 0:
+            self.Warnings.append(
+                _("POU bodies generated in a single process, since other threads are running: %s") %
+                ", ".join(threads))
+            return
+        pous = self.Project.getpous()
+        pou_names = [pou.getname() for pou in pous]
+        try:
+            pool = multiprocessing.Pool(
+                self.Jobs if self.Jobs > 0 else None,
+                _InitPouProgramWorker,
+                (TypeSignatureTable(self.Controler, self.Project), pou_names))
+        except OSError, e:
+            self.Warnings.append(
+                _("POU bodies generated in a single process, since worker processes can't be started: %s") % 
+                str(e))
+            return
+        try:
+            results = pool.map_async(_GeneratePouProgramWorker,
+                [(pou.getname(), pou.tostring()) for pou in pous]).get(
+                POU_GENERATION_TIMEOUT)
+        except Exception, e:
+            # A worker hung, died or failed, POU bodies are all generated in
+            # this process
+            pool.terminate()
+            pool.join()
+            self.Warnings.append(
+                _("POU bodies generated in a single process, since worker processes failed: %s") % 
+                (str(e) or e.__class__.__name__))
+            return
+        pool.close()
+        pool.join()
+        # POUs that failed in worker are generated again in this process
+        self.PouProgramEvents = dict(
+            [(pou_name, events)
+             for pou_name, events in zip(pou_names, results)
+             if events is not None])
+
     # Generate a POU defined and used in text
     def GeneratePouProgramInText(self, text):
         for pou_name in self.PouComputed.keys():
@@ -466,6 +542,8 @@ class ProgramGenerator:
                 self.GenerateDataType(datatype_name)
             self.Program += [("END_TYPE\n\n", ())]
         # Generate every POUs defined
+        if self.Jobs != 1 and len(self.PouComputed) > 1:
+            self.GeneratePouProgramsInPool()
         for pou_name in self.PouComputed.keys():
             self.GeneratePouProgram(pou_name)
         # Generate every configurations defined
@@ -517,6 +595,11 @@ class PouProgramGenerator:
         self.ComputedConnectors = {}
         self.ConnectionTypes = {}
         self.RelatedConnections = []
+        # Graphical bodies instances by local id and connectors by name,
+        # computed once by body, and connection points linked by each link
+        self.BodiesInstances = {}
+        self.BodiesConnectors = {}
+        self.LinkedConnectors = {}
         self.SFCNetworks = {"Steps":{}, "Transitions":{}, "Actions":{}}
         self.SFCComputedBlocks = []
         self.ActionNumber = 0
@@ -579,6 +662,23 @@ class PouProgramGenerator:
                                 break
         return current_type
 
+    # Return instance of graphical body with given local id
+    def GetBodyInstance(self, body, local_id):
+        instances = self.BodiesInstances.get(body)
+        if instances is None:
+            instances = self.BodiesInstances[body] = body.getcontentInstancesById()
+        return instances.get(local_id)
+
+    # Return connectors of graphical body with given name
+    def GetBodyConnectors(self, body, name):
+        connectors = self.BodiesConnectors.get(body)
+        if connectors is None:
+            connectors = self.BodiesConnectors[body] = {}
+            for instance in body.getcontentInstances():
+                if isinstance(instance, ConnectorClass):
+                    connectors.setdefault(instance.getname(), []).append(instance)
+        return connectors.get(name, [])
+
     # Return connectors linked by a connection to the given connector
     def GetConnectedConnector(self, connector, body):
         links = connector.getconnections()
@@ -587,8 +687,13 @@ class PouProgramGenerator:
         return None
 
     def GetLinkedConnector(self, link, body):
+        if not self.LinkedConnectors.has_key(link):
+            self.LinkedConnectors[link] = self.ComputeLinkedConnector(link, body)
+        return self.LinkedConnectors[link]
+
+    def ComputeLinkedConnector(self, link, body):
         parameter = link.getformalParameter()
-        instance = body.getcontentInstance(link.getrefLocalId())
+        instance = self.GetBodyInstance(body, link.getrefLocalId())
         if isinstance(instance, (InVariableClass, InOutVariableClass,
              ContinuationClass, ContactClass, CoilClass)):
             return instance.connectionPointOut
@@ -780,12 +885,12 @@ class PouProgramGenerator:
                     name = instance.getname()
                     connector = None
                     var_type = "ANY"
-                    for element in body.getcontentInstances():
-                        if isinstance(element, ConnectorClass) and element.getname() == name:
-                            if connector is not None:
-                                msg = _("More than one connector found corresponding to \"{a1}\" continuation in \"{a2}\" POU").format(a1 = name, a2 = self.Name)
-                                raise PLCGenException, msg
-                            connector = element
+                    connectors = self.GetBodyConnectors(body, name)
+                    if len(connectors) > 1:
+                        msg = _("More than one connector found corresponding to \"{a1}\" continuation in \"{a2}\" POU").format(a1 = name, a2 = self.Name)
+                        raise PLCGenException, msg
+                    elif len(connectors) == 1:
+                        connector = connectors[0]
                     if connector is not None:
                         undefined = [instance.connectionPointOut, connector.connectionPointIn]
                         connected = self.GetConnectedConnector(connector.connectionPointIn, body)
@@ -1199,7 +1304,7 @@ class PouProgramGenerator:
         paths = []
         for connection in connections:
             localId = connection.getrefLocalId()
-            next = body.getcontentInstance(localId)
+            next = self.GetBodyInstance(body, localId)
             if isinstance(next, LeftPowerRailClass):
                 paths.append(None)
             elif isinstance(next, (InVariableClass, InOutVariableClass)):
@@ -1224,12 +1329,12 @@ class PouProgramGenerator:
                     paths.append(str(computed_value))
                 else:
                     connector = None
-                    for instance in body.getcontentInstances():
-                        if isinstance(instance, ConnectorClass) and instance.getname() == name:
-                            if connector is not None:
-                                msg = _("More than one connector found corresponding to \"{a1}\" continuation in \"{a2}\" POU").format(a1 = name, a2 = self.Name)
-                                raise PLCGenException, msg
-                            connector = instance
+                    connectors = self.GetBodyConnectors(body, name)
+                    if len(connectors) > 1:
+                        msg = _("More than one connector found corresponding to \"{a1}\" continuation in \"{a2}\" POU").format(a1 = name, a2 = self.Name)
+                        raise PLCGenException, msg
+                    elif len(connectors) == 1:
+                        connector = connectors[0]
                     if connector is not None:
                         connections = connector.connectionPointIn.getconnections()
                         if connections is not None:
@@ -1334,7 +1439,7 @@ class PouProgramGenerator:
                 body = pou.getbody()
                 if isinstance(body, ListType):
                     body = body[0]
-                return body.getcontentInstance(instanceLocalId)
+                return self.GetBodyInstance(body, instanceLocalId)
         return None
 
     def ExtractConvergenceInputs(self, convergence, pou):
@@ -1346,12 +1451,12 @@ class PouProgramGenerator:
                 body = pou.getbody()
                 if isinstance(body, ListType):
                     body = body[0]
-                instances.append(body.getcontentInstance(instanceLocalId))
+                instances.append(self.GetBodyInstance(body, instanceLocalId))
         return instances
 
     def GenerateSFCStep(self, step, pou):
         step_name = step.getname()
-        if step_name not in self.SFCNetworks["Steps"].keys():
+        if step_name not in self.SFCNetworks["Steps"]:
             if step.getinitialStep():
                 self.InitialSteps.append(step_name)
             step_infos = {"id" : step.getlocalId(),
@@ -1367,7 +1472,7 @@ class PouProgramGenerator:
                     body = pou.getbody()
                     if isinstance(body, ListType):
                         body = body[0]
-                    instance = body.getcontentInstance(instanceLocalId)
+                    instance = self.GetBodyInstance(body, instanceLocalId)
                     if isinstance(instance, TransitionClass):
                         instances.append(instance)
                     elif isinstance(instance, SelectionConvergenceClass):
@@ -1381,7 +1486,7 @@ class PouProgramGenerator:
                                 instances.extend(self.ExtractConvergenceInputs(transition, pou))
                 for instance in instances:
                     self.GenerateSFCTransition(instance, pou)
-                    if instance in self.SFCNetworks["Transitions"].keys():
+                    if instance in self.SFCNetworks["Transitions"]:
                         target_info = (self.TagName, "transition", instance.getlocalId(), "to", step_infos["id"])
                         self.SFCNetworks["Transitions"][instance]["to"].append([(step_name, target_info)])
 
@@ -1399,7 +1504,7 @@ class PouProgramGenerator:
                 body = pou.getbody()
                 if isinstance(body, ListType):
                     body = body[0]
-                instance = body.getcontentInstance(instanceLocalId)
+                instance = self.GetBodyInstance(body, instanceLocalId)
                 if isinstance(instance, TransitionClass):
                     instances.append(instance)
                 elif isinstance(instance, SelectionConvergenceClass):
@@ -1413,7 +1518,7 @@ class PouProgramGenerator:
                             instances.extend(self.ExtractConvergenceInputs(transition, pou))
             for instance in instances:
                 self.GenerateSFCTransition(instance, pou)
-                if instance in self.SFCNetworks["Transitions"].keys():
+                if instance in self.SFCNetworks["Transitions"]:
                     target_info = (self.TagName, "jump", jump.getlocalId(), "target")
                     self.SFCNetworks["Transitions"][instance]["to"].append([(jump_target, target_info)])
 
@@ -1424,10 +1529,10 @@ class PouProgramGenerator:
             body = pou.getbody()
             if isinstance(body, ListType):
                 body = body[0]
-            step = body.getcontentInstance(stepLocalId)
+            step = self.GetBodyInstance(body, stepLocalId)
             self.GenerateSFCStep(step, pou)
             step_name = step.getname()
-            if step_name in self.SFCNetworks["Steps"].keys():
+            if step_name in self.SFCNetworks["Steps"]:
                 actions = actionBlock.getactions()
                 for i, action in enumerate(actions):
                     action_infos = {"id" : actionBlock.getlocalId(),
@@ -1449,7 +1554,7 @@ class PouProgramGenerator:
                     self.SFCNetworks["Steps"][step_name]["actions"].append(action_infos)
 
     def GenerateSFCAction(self, action_name, pou):
-        if action_name not in self.SFCNetworks["Actions"].keys():
+        if action_name not in self.SFCNetworks["Actions"]:
             actionContent = pou.getaction(action_name)
             if actionContent is not None:
                 previous_tagname = self.TagName
@@ -1460,7 +1565,7 @@ class PouProgramGenerator:
                 self.TagName = previous_tagname
 
     def GenerateSFCTransition(self, transition, pou):
-        if transition not in self.SFCNetworks["Transitions"].keys():
+        if transition not in self.SFCNetworks["Transitions"]:
             steps = []
             connections = transition.connectionPointIn.getconnections()
             if connections is not None and len(connections) == 1:
@@ -1468,7 +1573,7 @@ class PouProgramGenerator:
                 body = pou.getbody()
                 if isinstance(body, ListType):
                     body = body[0]
-                instance = body.getcontentInstance(instanceLocalId)
+                instance = self.GetBodyInstance(body, instanceLocalId)
                 if isinstance(instance, StepClass):
                     steps.append(instance)
                 elif isinstance(instance, SelectionDivergenceClass):
@@ -1531,12 +1636,12 @@ class PouProgramGenerator:
             for step in steps:
                 self.GenerateSFCStep(step, pou)
                 step_name = step.getname()
-                if step_name in self.SFCNetworks["Steps"].keys():
+                if step_name in self.SFCNetworks["Steps"]:
                     transition_infos["from"].append([(step_name, (self.TagName, "transition", transition.getlocalId(), "from", step.getlocalId()))])
                     self.SFCNetworks["Steps"][step_name]["transitions"].append(transition)
 
     def ComputeSFCStep(self, step_name):
-        if step_name in self.SFCNetworks["Steps"].keys():
+        if step_name in self.SFCNetworks["Steps"]:
             step_infos = self.SFCNetworks["Steps"].pop(step_name)
             self.Program += [(self.CurrentIndent, ())]
             if step_infos["initial"]:
@@ -1571,7 +1676,7 @@ class PouProgramGenerator:
                 self.ComputeSFCTransition(transition)
 
     def ComputeSFCAction(self, action_name):
-        if action_name in self.SFCNetworks["Actions"].keys():
+        if action_name in self.SFCNetworks["Actions"]:
             action_content, action_info = self.SFCNetworks["Actions"].pop(action_name)
             self.Program += [("%sACTION "%self.CurrentIndent, ()),
                              (action_name, action_info),
@@ -1580,7 +1685,7 @@ class PouProgramGenerator:
             self.Program += [("%sEND_ACTION\n\n"%self.CurrentIndent, ())]
 
     def ComputeSFCTransition(self, transition):
-        if transition in self.SFCNetworks["Transitions"].keys():
+        if transition in self.SFCNetworks["Transitions"]:
             transition_infos = self.SFCNetworks["Transitions"].pop(transition)
             self.Program += [("%sTRANSITION"%self.CurrentIndent, ())]
             if transition_infos["priority"] != None:
@@ -1658,8 +1763,165 @@ class PouProgramGenerator:
         program += [("END_%s\n\n"%self.Type, ())]
         return program
 
-def GenerateCurrentProgram(controler, project, errors, warnings):
-    generator = ProgramGenerator(controler, project, errors, warnings)
+def GenerateCurrentProgram(controler, project, errors, warnings, jobs=1):
+    generator = ProgramGenerator(controler, project, errors, warnings, jobs)
     generator.GenerateProgram()
     return generator.GetGeneratedProgram()
 
+#-------------------------------------------------------------------------------
+#                 Generation of POU programs in worker processes
+#-------------------------------------------------------------------------------
+
+"""
+Class giving to POU program generators running in worker processes the type
+informations they request to the controler. It only contains picklable values
+"""
+class TypeSignatureTable:
+
+    def __init__(self, controler, project):
+        # Block types defined in standard library and confnodes
+        self.BlockTypes = dict(controler.TotalTypesDict)
+        # Block types defined by project POUs
+        self.PouBlockTypes = dict([(pou.getname(), pou.getblockInfos())
+                                   for pou in project.getpous()])
+        # Direct base type of data types, project ones overriding confnode ones
+        self.DataTypeBaseTypes = {}
+        datatypes = []
+        for confnodetypes in reversed(controler.ConfNodeTypes):
+            datatypes.extend(confnodetypes["types"].getdataTypes())
+        datatypes.extend(project.getdataTypes())
+        for datatype in datatypes:
+            self.DataTypeBaseTypes[datatype.getname()] = \
+                controler.GetDataTypeBaseType(datatype)
+        # Types and meta-types each type already tested is one of
+        self.TypesAncestors = {}
+        # Informations of project data types
+        self.DataTypeInfos = dict([
+            (datatype.getname(), controler.GetDataTypeInfos(
+                controler.ComputeDataTypeName(datatype.getname())))
+            for datatype in project.getdataTypes()])
+
+    def GetBlockType(self, typename, inputs = None):
+        return FindBlockType(typename, inputs, self.BlockTypes,
+            self.PouBlockTypes.get, self.IsOfType)
+
+    def GetBaseType(self, typename):
+        if TypeHierarchy.has_key(typename):
+            return typename
+
+        if self.DataTypeBaseTypes.has_key(typename):
+            basetype = self.DataTypeBaseTypes[typename]
+            if basetype is not None:
+                return self.GetBaseType(basetype)
+            return typename
+
+        return None
+
+    def IsOfType(self, typename, reference):
+        if reference is None or typename == reference:
+            return True
+        return reference in self.GetTypeAncestors(typename)
+
+    def GetTypeAncestors(self, typename):
+        ancestors = self.TypesAncestors.get(typename)
+        if ancestors is None:
+            ancestors = set([typename])
+            basetype = typename
+            while basetype is not None and not TypeHierarchy.has_key(basetype):
+                basetype = self.DataTypeBaseTypes.get(basetype)
+                # derived types referencing each other have no elementary type
+                if basetype in ancestors:
+                    basetype = None
+                elif basetype is not None:
+                    ancestors.add(basetype)
+            if basetype is not None:
+                ancestors.update(TypeAncestors[basetype])
+            ancestors = self.TypesAncestors[typename] = frozenset(ancestors)
+        return ancestors
+
+    def GetDataTypeInfos(self, tagname):
+        words = tagname.split("::")
+        if words[0] == "D":
+            return self.DataTypeInfos.get(words[1])
+        return None
+
+    def ComputeDataTypeName(self, datatype):
+        return "D::%s" % datatype
+
+    def ComputePouName(self, pou):
+        return "P::%s" % pou
+
+    def ComputePouTransitionName(self, pou, transition):
+        return "T::%s::%s" % (pou, transition)
+
+    def ComputePouActionName(self, pou, action):
+        return "A::%s::%s" % (pou, action)
+
+"""
+List recording the values appended by a POU program generator as events
+"""
+class _PouProgramEventList(list):
+
+    def __init__(self, events, event):
+        list.__init__(self)
+        self.Events = events
+        self.Event = event
+
+    def append(self, value):
+        self.Events.append((self.Event, value))
+
+"""
+Program generator used in worker processes. Generation of the POUs a POU
+depends on is only recorded, to be replayed in the same order by the
+program generator of the main process
+"""
+class PouProgramRecorder(ProgramGenerator):
+
+    def __init__(self, signatures, pou_names, events):
+        ProgramGenerator.__init__(self, signatures, None,
+            _PouProgramEventList(events, "error"),
+            _PouProgramEventList(events, "warning"))
+        self.Events = events
+        for pou_name in pou_names:
+            self.PouComputed[pou_name] = False
+
+    # Data types are all generated before POUs by main process
+    def GenerateDataType(self, datatype_name):
+        pass
+
+    def GeneratePouProgram(self, pou_name):
+        if self.PouComputed.has_key(pou_name):
+            self.Events.append(("pou", pou_name))
+
+    def RecordPouProgram(self, pou):
+        pou_name = pou.getname()
+        self.PouComputed[pou_name] = True
+        pou_type = pou.getpouType()
+        try:
+            if not pouTypeNames.has_key(pou_type):
+                raise PLCGenException, _("Undefined pou type \"%s\"")%pou_type
+            pou_program = PouProgramGenerator(self, pou_name, pouTypeNames[pou_type], self.Errors, self.Warnings)
+            self.Events.append(("program", pou_program.GenerateProgram(pou)))
+        except PLCGenException, e:
+            self.Events.append(("exception", e.message))
+
+_PouProgramWorkerInfos = None
+
+def _InitPouProgramWorker(signatures, pou_names):
+    global _PouProgramWorkerInfos
+    _PouProgramWorkerInfos = (signatures, pou_names)
+
+def _GeneratePouProgramWorker(args):
+    pou_name, pou_xml = args
+    signatures, pou_names = _PouProgramWorkerInfos
+    try:
+        pou, error = LoadPou(pou_xml)
+        if pou is None:
+            return None
+        events = []
+        PouProgramRecorder(signatures, pou_names, events).RecordPouProgram(pou)
+        return events
+    except Exception:
+        # Let main process generate POU and report unexpected errors
+        return None
+
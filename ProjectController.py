@@ -44,6 +44,7 @@ import connectors
 from util.misc import CheckPathPerm, GetClassImporter
 from util.MiniTextControler import MiniTextControler
 from util.ProcessLogger import ProcessLogger
+from util.BuildReport import BuildReport
 from util.BitmapLibrary import GetBitmap
 from editors.FileManagementPanel import FileManagementPanel
 from editors.ProjectNodeEditor import ProjectNodeEditor
@@ -176,6 +177,13 @@ class ProjectController(ConfigTreeNode, PLCControler):
           </xsd:sequence>
           <xsd:attribute name="URI_location" type="xsd:string" use="optional" default=""/>
           <xsd:attribute name="Disable_Extensions" type="xsd:boolean" use="optional" default="false"/>
+          <xsd:attribute name="Generation_Jobs" use="optional" default="1">
+            <xsd:simpleType>
+                <xsd:restriction base="xsd:integer">
+                    <xsd:minInclusive value="0"/>
+                </xsd:restriction>
+            </xsd:simpleType>
+          </xsd:attribute>
         </xsd:complexType>
       </xsd:element>
     </xsd:schema>
@@ -200,6 +208,12 @@ class ProjectController(ConfigTreeNode, PLCControler):
         self.DebugTimer=None
         self.ResetIECProgramsAndVariables()
 
+        # Timing report of the build in progress
+        self._BuildReport = None
+
+        # Directory of object files shared between builds, disabled if None
+        self._ObjectCachePath = None
+
         # In both new or load scenario, no need to save
         self.ChangesToSave = False
         # root have no parent
@@ -407,11 +421,10 @@ class ProjectController(ConfigTreeNode, PLCControler):
         if not os.path.isfile(plc_file):
             return _("Chosen folder doesn't contain a program. It's not a valid project!"), True
         # Load PLCOpen file
-        error = self.OpenXMLFile(plc_file)
+        error = self.OpenXMLFile(plc_file, self.ProjectValidated)
         if error is not None:
             if self.Project is not None:
-                (fname_err, lnum, src) = (("PLC",) + error)
-                self.logger.write_warning(XSDSchemaErrorMessage.format(a1 = fname_err, a2 = lnum, a3 = src))
+                self.ProjectValidated(error)
             else:
                 return error, False
         if len(self.GetProjectConfigNames()) == 0:
@@ -434,6 +447,15 @@ class ProjectController(ConfigTreeNode, PLCControler):
         self.UpdateButtons()
         return None, False
 
+    def ProjectValidated(self, error):
+        """
+        Report result of PLCOpen file XSD validation, that can be called from
+        the thread validating file in background
+        """
+        if error is not None:
+            (fname_err, lnum, src) = (("PLC",) + error)
+            self.logger.write_warning(XSDSchemaErrorMessage.format(a1 = fname_err, a2 = lnum, a3 = src))
+
     def RecursiveConfNodeInfos(self, confnode):
         values = []
         for CTNChild in confnode.IECSortedChildren():
@@ -487,10 +509,39 @@ class ProjectController(ConfigTreeNode, PLCControler):
                 if os.path.isdir(old_projectfiles_path):
                     shutil.copytree(old_projectfiles_path,
                                     self._getProjectFilesPath(self.ProjectPath))
-            self.SaveXMLFile(os.path.join(self.ProjectPath, 'plc.xml'))
+            start_time = time.time()
             result = self.CTNRequestSave(from_project_path)
             if result:
                 self.logger.write_error(result)
+            confnodes_duration = time.time() - start_time
+            # PLC program is written in background, project is marked as
+            # saved and timing is logged once done
+            self.SaveXMLFile(os.path.join(self.ProjectPath, 'plc.xml'),
+                lambda error, duration, state: 
+                    self.PLCProgramSaved(error, duration, state, 
+                                         confnodes_duration))
+
+    def PLCProgramSaved(self, error, duration, state, confnodes_duration):
+        if self.AppFrame is not None:
+            wx.CallAfter(self._PLCProgramSaved, 
+                error, duration, state, confnodes_duration)
+        else:
+            self._PLCProgramSaved(error, duration, state, confnodes_duration)
+
+    def _PLCProgramSaved(self, error, duration, state, confnodes_duration):
+        if error is not None:
+            self.logger.write_error(
+                _("Error while saving PLC program: %s\n") % error)
+        else:
+            self.MarkProjectAsSaved(state)
+            self.logger.write(
+                _("Project saved (PLC program: %.3fs, extensions: %.3fs)\n") %
+                (duration, confnodes_duration))
+        if self.AppFrame is not None:
+            self.AppFrame.RefreshTitle()
+            self.AppFrame.RefreshFileMenu()
+            self.AppFrame.RefreshEditMenu()
+            self.AppFrame.RefreshPageTitles()
 
     def SaveProjectAs(self):
         # Ask user to choose a path with write permissions
@@ -526,7 +577,11 @@ class ProjectController(ConfigTreeNode, PLCControler):
         LocatedCCodeAndFlags=[]
         Extras=[]
         for lib in self.Libraries:
+            start_time = time.time()
             res=lib.Generate_C(buildpath,self._VariablesList,LibIECCflags)
+            if self._BuildReport is not None:
+                self._BuildReport.AddExtensionTiming(
+                    "%s Library" % lib.GetName(), time.time() - start_time)
             LocatedCCodeAndFlags.append(res[:2])
             if len(res)>2:
                 Extras.extend(res[2:])
@@ -544,6 +599,7 @@ class ProjectController(ConfigTreeNode, PLCControler):
     # Update a PLCOpenEditor Pou variable location
     def UpdateProjectVariableLocation(self, old_leading, new_leading):
         self.Project.updateElementAddress(old_leading, new_leading)
+        self.SetProjectModified()
         self.BufferProject()
         if self.AppFrame is not None:
             self.AppFrame.RefreshTitle()
@@ -645,10 +701,21 @@ class ProjectController(ConfigTreeNode, PLCControler):
     def GetConfNodeGlobalInstances(self):
         return self._GlobalInstances()
 
+    def GetBuildReport(self):
+        return self._BuildReport
+
+    def GetObjectCachePath(self):
+        return self._ObjectCachePath
+
+    def SetObjectCachePath(self, path):
+        self._ObjectCachePath = path
+
     def _Generate_SoftPLC(self):
-        if self._Generate_PLC_ST():
+        with self._BuildReport.Phase("Generate_PLC_ST"):
+            if not self._Generate_PLC_ST():
+                return False
+        with self._BuildReport.Phase("Compile_ST_to_SoftPLC"):
             return self._Compile_ST_to_SoftPLC()
-        return False
 
     def _Generate_PLC_ST(self):
         """
@@ -661,7 +728,10 @@ class ProjectController(ConfigTreeNode, PLCControler):
 
         self.logger.write(_("Generating SoftPLC IEC-61131 ST/IL/SFC code...\n"))
         # ask PLCOpenEditor controller to write ST/IL/SFC code file
-        program, errors, warnings = self.GenerateProgram(self._getIECgeneratedcodepath())
+        # POU bodies are generated by Generation_Jobs processes (0 for one per CPU)
+        program, errors, warnings = self.GenerateProgram(
+            self._getIECgeneratedcodepath(),
+            self.BeremizRoot.getGeneration_Jobs())
         if len(warnings) > 0:
             self.logger.write_warning(_("Warnings in ST/IL/SFC code generator :\n"))
             for warning in warnings:
@@ -987,6 +1057,13 @@ class ProjectController(ConfigTreeNode, PLCControler):
         return plc_main_code
 
 
+    def Build(self):
+        """
+        Method called by command line tools to build SoftPLC and confnode
+        tree without application frame. Returns True if build succeeded
+        """
+        return self._Build()
+
     def _Build(self):
         """
         Method called by user to (re)build SoftPLC and confnode tree
@@ -1004,6 +1081,21 @@ class ProjectController(ConfigTreeNode, PLCControler):
         self.logger.flush()
         self.logger.write(_("Start build in %s\n") % buildpath)
 
+        self._BuildReport = BuildReport(self.GetProjectName())
+        success = False
+        try:
+            success = self._BuildPhases()
+        finally:
+            self._BuildReport.Finish(success)
+            self.logger.write(self._BuildReport.GetSummary())
+            try:
+                self._BuildReport.Save(buildpath)
+            except Exception, exc:
+                self.logger.write_warning(_("Cannot write build report: %s\n") % str(exc))
+            self._BuildReport = None
+        return success
+
+    def _BuildPhases(self):
         # Generate SoftPLC IEC code
         IECGenRes = self._Generate_SoftPLC()
         self.UpdateButtons()
@@ -1020,8 +1112,9 @@ class ProjectController(ConfigTreeNode, PLCControler):
 
         # Collect platform specific C code
         # Code and other files from extension
-        if not self._Generate_runtime():
-            return False
+        with self._BuildReport.Phase("Generate_runtime"):
+            if not self._Generate_runtime():
+                return False
 
         # Get current or fresh builder
         builder = self.GetBuilder()
@@ -1032,9 +1125,10 @@ class ProjectController(ConfigTreeNode, PLCControler):
 
         # Build
         try:
-            if not builder.build() :
-                self.logger.write_error(_("C Build failed.\n"))
-                return False
+            with self._BuildReport.Phase("Build_C"):
+                if not builder.build() :
+                    self.logger.write_error(_("C Build failed.\n"))
+                    return False
         except Exception, exc:
             self.logger.write_error(_("C Build crashed !\n"))
             self.logger.write_error(traceback.format_exc())
@@ -1266,7 +1360,10 @@ class ProjectController(ConfigTreeNode, PLCControler):
             self.AppFrame.RefreshStatusToolBar()
         
     def UpdateButtons(self):
-        wx.CallAfter(self._UpdateButtons)
+        if self.AppFrame is not None:
+            wx.CallAfter(self._UpdateButtons)
+        else:
+            self._UpdateButtons()
 
         
     def UpdatePLCLog(self, log_count):
@@ -1308,6 +1405,7 @@ class ProjectController(ConfigTreeNode, PLCControler):
                 if status == "Disconnected":
                     self.AppFrame.ConnectionStatusBar.SetStatusText(self.GetTextStatus(status), 1)
                     self.AppFrame.ConnectionStatusBar.SetStatusText('', 2)
+                    self.AppFrame.ConnectionStatusBar.SetStatusText('', 3)
                 else:
                     self.AppFrame.ConnectionStatusBar.SetStatusText(
                         _("Connected to URI: %s") % self.BeremizRoot.getURI_location().strip(), 1)
@@ -1383,6 +1481,16 @@ class ProjectController(ConfigTreeNode, PLCControler):
                 self._connector.SetTraceVariablesList([])
             self.SnapshotAndResetDebugValuesBuffers()
             self.IECdebug_lock.release()
+        self.RefreshDebugStatus()
+
+    # Show number of variables traced in status bar
+    def RefreshDebugStatus(self):
+        if self.AppFrame is not None:
+            if self._connector is not None:
+                text = _("Debug: %d variables traced") % len(self.TracedIECPath)
+            else:
+                text = ''
+            self.AppFrame.ConnectionStatusBar.SetStatusText(text, 3)
 
     def IsPLCStarted(self):
         return self.previous_plcstate == "Started"
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of Beremiz, a Integrated Development Environment for
+# programming IEC 61131-3 automates supporting plcopen standard and CanFestival.
+#
+# Copyright (C) 2012: Edouard TISSERANT and Laurent BESSARD
+#
+# See COPYING file for copyrights details.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import numpy
+
+# Number of rows allocated when buffer is created or reset
+BUFFER_INITIAL_CAPACITY = 1024
+
+#-------------------------------------------------------------------------------
+#                             Helper Functions
+#-------------------------------------------------------------------------------
+
+def GetNearestTickIndex(ticks, tick, adjust=0):
+    """
+    Return index of nearest tick from tick given in sorted ticks
+    @param ticks: numpy.array of ticks sorted in ascending order
+    @param tick: Tick where find nearest tick
+    @param adjust: Constraint for tick position from tick given
+                   -1: older than tick
+                   1:  newer than tick
+                   0:  doesn't matter
+    @return: Index of nearest tick (None if ticks is empty)
+    """
+    length = len(ticks)
+    if length == 0:
+        return None
+    
+    # Nearest tick is one of the two ticks surrounding tick given, the oldest
+    # is preferred if both are at the same distance
+    idx = numpy.searchsorted(ticks, tick)
+    if idx == length or idx > 0 and tick - ticks[idx - 1] <= ticks[idx] - tick:
+        idx -= 1
+    
+    # Adjust tick index according to constraint
+    if (adjust < 0 and ticks[idx] > tick and idx > 0 or
+        adjust > 0 and ticks[idx] < tick and idx < length):
+        idx += adjust
+    
+    return idx
+
+#-------------------------------------------------------------------------------
+#                          Debug Data Buffer Class
+#-------------------------------------------------------------------------------
+
+"""
+Class that implements a growable table storing debug data. Rows are appended
+at the end and discarded at the beginning in amortized constant time. Data
+returned are views on table, never modified by later appends or discards
+"""
+
+class DebugDataBuffer:
+
+    def __init__(self, columns=None, dtype=float):
+        """
+        Constructor
+        @param columns: Number of columns of table (default None, table is a
+        one dimension array)
+        @param dtype: Type of data stored in table (default float)
+        """
+        self.Columns = columns
+        self.DataType = dtype
+
+        self.Reset()
+
+    def __len__(self):
+        """
+        Return number of rows stored
+        @return: Number of rows
+        """
+        return self.End - self.Start
+
+    def Reset(self):
+        """
+        Discard all rows stored and release memory allocated
+        """
+        self.Buffer = self.AllocateBuffer(BUFFER_INITIAL_CAPACITY)
+        self.Start = 0
+        self.End = 0
+
+    def AllocateBuffer(self, capacity):
+        """
+        Return a new table able to store a number of rows
+        @param capacity: Number of rows
+        @return: numpy.array of given capacity
+        """
+        shape = ((capacity,)
+                 if self.Columns is None
+                 else (capacity, self.Columns))
+        return numpy.empty(shape, dtype=self.DataType)
+
+    def Append(self, rows):
+        """
+        Add rows at the end of table
+        @param rows: List of rows to add
+        """
+        rows = numpy.asarray(rows, dtype=self.DataType)
+        if self.Columns is not None:
+            rows = rows.reshape(-1, self.Columns)
+        count = len(rows)
+
+        # Rows are copied into a new table when remaining capacity isn't
+        # sufficient, table capacity is doubled until all rows can be stored.
+        # Views previously returned keep referencing old table
+        if self.End + count > len(self.Buffer):
+            length = len(self)
+            capacity = max(BUFFER_INITIAL_CAPACITY, len(self.Buffer))
+            while length + count > capacity / 2:
+                capacity *= 2
+            buffer = self.AllocateBuffer(capacity)
+            buffer[:length] = self.Buffer[self.Start:self.End]
+            self.Buffer = buffer
+            self.Start = 0
+            self.End = length
+
+        self.Buffer[self.End:self.End + count] = rows
+        self.End += count
+
+    def Discard(self, count):
+        """
+        Remove rows at the beginning of table
+        @param count: Number of rows to remove
+        """
+        self.Start = min(self.End, self.Start + max(0, count))
+
+        # Remaining rows are copied into a smaller table when more than half
+        # of table is unused
+        length = len(self)
+        if self.Start > len(self.Buffer) / 2:
+            capacity = BUFFER_INITIAL_CAPACITY
+            while length > capacity / 2:
+                capacity *= 2
+            buffer = self.AllocateBuffer(capacity)
+            buffer[:length] = self.Buffer[self.Start:self.End]
+            self.Buffer = buffer
+            self.Start = 0
+            self.End = length
+
+    def GetData(self):
+        """
+        Return rows stored
+        @return: View on table as numpy.array
+        """
+        return self.Buffer[self.Start:self.End]
+
+    def GetMemorySize(self):
+        """
+        Return memory allocated by table
+        @return: Size in bytes
+        """
+        return self.Buffer.nbytes
@@ -37,6 +37,7 @@ from mpl_toolkits.mplot3d import Axes3D
 
 from editors.DebugViewer import REFRESH_PERIOD
 
+from DebugDataBuffer import GetNearestTickIndex
 from DebugVariableItem import DebugVariableItem
 from DebugVariableViewer import *
 from GraphButton import GraphButton
@@ -63,6 +64,10 @@ COLOR_CYCLE = ['r', 'b', 'g', 'm', 'y', 'k']
 # Color for graph cursor
 CURSOR_COLOR = '#800080'
 
+# Number of points drawn for each horizontal pixel of canvas above which curves
+# are downsampled
+DOWNSAMPLING_POINTS_PER_PIXEL = 2
+
 #-------------------------------------------------------------------------------
 #                      Debug Variable Graphic Viewer Helpers
 #-------------------------------------------------------------------------------
@@ -103,6 +108,46 @@ def merge_ranges(ranges):
     # Return range expended from 10 %
     return center - range_size * 0.55, center + range_size * 0.55
 
+def downsample_indexes(ticks, columns, start_tick, end_tick, buckets):
+    """
+    Return indexes of data to draw so that curves keep about 2 points for each
+    bucket of tick range. In each bucket, points having minimal and maximal
+    value for every column are kept so that curve peaks are preserved
+    @param ticks: numpy.array of data ticks sorted in ascending order
+    @param columns: List of numpy.array of data values
+    @param start_tick: Start tick of range displayed
+    @param end_tick: End tick of range displayed
+    @param buckets: Number of buckets, usually canvas width in pixel
+    @return: numpy.array of indexes sorted in ascending order (None if no
+    downsampling is needed)
+    """
+    length = len(ticks)
+    buckets = max(1, int(buckets))
+    if length <= DOWNSAMPLING_POINTS_PER_PIXEL * buckets:
+        return None
+    
+    # Get bucket of each data, first and last data can be outside range
+    tick_range = max(end_tick - start_tick, 1)
+    buckets_idx = numpy.clip(
+        ((ticks - start_tick) * buckets / tick_range).astype(int),
+        0, buckets - 1)
+    
+    # Ticks being sorted, data of a bucket are contiguous
+    starts = numpy.concatenate(
+        ([0], numpy.flatnonzero(numpy.diff(buckets_idx)) + 1))
+    ends = numpy.concatenate((starts[1:], [length])) - 1
+    
+    # First and last data are always kept to draw curves up to range limits
+    indexes = [numpy.array([0, length - 1])]
+    for values in columns:
+        # Sort data by bucket then by value, data of a bucket keeping the
+        # same positions
+        order = numpy.lexsort((values, buckets_idx))
+        indexes.append(order[starts])
+        indexes.append(order[ends])
+    
+    return numpy.unique(numpy.concatenate(indexes))
+
 #-------------------------------------------------------------------------------
 #                   Debug Variable Graphic Viewer Drop Target
 #-------------------------------------------------------------------------------
@@ -568,37 +613,34 @@ class DebugVariableGraphicViewer(DebugVariableViewer, FigureCanvas):
         Update Cursor position according to mouse position and graph type
         @param event: Mouse event
         """
-        start_tick, end_tick = self.ParentWindow.GetRange()
         cursor_tick = None
         items = self.ItemsDict.values()
         
         # Graph is orthogonal
         if self.GraphType == GRAPH_ORTHOGONAL:
-            # Extract items data displayed in canvas figure
-            start_tick = max(start_tick, self.GetItemsMinCommonTick())
-            end_tick = max(end_tick, start_tick)
-            x_data = items[0].GetData(start_tick, end_tick)
-            y_data = items[1].GetData(start_tick, end_tick)
-            
-            # Search for the nearest point from mouse position
-            if len(x_data) > 0 and len(y_data) > 0:
-                length = min(len(x_data), len(y_data)) 
-                d = numpy.sqrt((x_data[:length,1]-event.xdata) ** 2 + \
-                               (y_data[:length,1]-event.ydata) ** 2)
+            # Search for the nearest point from mouse position in points
+            # displayed in canvas figure
+            if (self.CursorData is not None and 
+                len(self.CursorData[0]) > 0):
+                ticks, x_values, y_values = self.CursorData
+                d = numpy.sqrt((x_values - event.xdata) ** 2 + \
+                               (y_values - event.ydata) ** 2)
                 
                 # Set cursor tick to the tick of this point
-                cursor_tick = x_data[numpy.argmin(d), 0]
+                cursor_tick = ticks[numpy.argmin(d)]
         
         # Graph is parallel
         else:
+            start_tick, end_tick = self.ParentWindow.GetRange()
+            
             # Extract items tick
             data = items[0].GetData(start_tick, end_tick)
             
             # Search for point that tick is the nearest from mouse X position
             # and set cursor tick to the tick of this point
             if len(data) > 0:
-                cursor_tick = data[numpy.argmin(
-                        numpy.abs(data[:,0] - event.xdata)), 0]
+                cursor_tick = data[GetNearestTickIndex(
+                        data[:, 0], event.xdata), 0]
         
         # Update cursor tick
         if cursor_tick is not None:
@@ -1024,6 +1066,7 @@ class DebugVariableGraphicViewer(DebugVariableViewer, FigureCanvas):
         self.Plots = []      # List of curves
         self.VLine = None    # Vertical line for cursor
         self.HLine = None    # Horizontal line for cursor (only orthogonal 2D)
+        self.CursorData = None # Points displayed for cursor (only orthogonal)
         self.AxesLabels = [] # List of items variable path text label
         self.Labels = []     # List of items text label
         
@@ -1128,6 +1171,23 @@ class DebugVariableGraphicViewer(DebugVariableViewer, FigureCanvas):
         # Update subplots
         self.Figure.subplots_adjust()
     
+    def GetDownsampledData(self, ticks, columns, start_tick, end_tick):
+        """
+        Return data reduced to the number of points that can be distinguished
+        in canvas width
+        @param ticks: numpy.array of data ticks sorted in ascending order
+        @param columns: List of numpy.array of data values
+        @param start_tick: Start tick of range displayed
+        @param end_tick: End tick of range displayed
+        @return: (ticks, [values,...]) downsampled
+        """
+        width, height = self.GetSize()
+        indexes = downsample_indexes(ticks, columns, 
+                                     start_tick, end_tick, width)
+        if indexes is None:
+            return ticks, columns
+        return ticks[indexes], [values[indexes] for values in columns]
+    
     def RefreshViewer(self, refresh_graphics=True):
         """
         Function called to refresh displayed by matplotlib canvas
@@ -1154,14 +1214,18 @@ class DebugVariableGraphicViewer(DebugVariableViewer, FigureCanvas):
                         # Add variable range to list of variable data range
                         ranges.append((min_value, max_value))
                         
+                        # Downsample data to canvas resolution
+                        ticks, (values,) = self.GetDownsampledData(
+                                data[:, 0], [data[:, 1]], start_tick, end_tick)
+                        
                         # Add plot to canvas if not yet created
                         if len(self.Plots) <= idx:
                             self.Plots.append(
-                                self.Axes.plot(data[:, 0], data[:, 1])[0])
+                                self.Axes.plot(ticks, values)[0])
                         
                         # Set data to already created plot in canvas
                         else:
-                            self.Plots[idx].set_data(data[:, 0], data[:, 1])
+                            self.Plots[idx].set_data(ticks, values)
                 
                 # Get X and Y axis ranges
                 x_min, x_max = start_tick, end_tick
@@ -1195,6 +1259,9 @@ class DebugVariableGraphicViewer(DebugVariableViewer, FigureCanvas):
                 end_tick = max(end_tick, start_tick)
                 items = self.ItemsDict.values()
                 
+                # Reset points displayed for cursor
+                self.CursorData = None
+                
                 # Get data and range for first variable (X coordinate)
                 x_data, x_min, x_max = items[0].GetDataAndValueRange(
                                         start_tick, end_tick, not self.ZoomFit)
@@ -1225,17 +1292,21 @@ class DebugVariableGraphicViewer(DebugVariableViewer, FigureCanvas):
                     # Check that x and y data are not empty
                     if x_data is not None and y_data is not None:
                         
+                        # Downsample data to canvas resolution
+                        ticks, (x_values, y_values) = self.GetDownsampledData(
+                                x_data[:, 0][:length], 
+                                [x_data[:, 1][:length], y_data[:, 1][:length]],
+                                start_tick, end_tick)
+                        self.CursorData = (ticks, x_values, y_values)
+                        
                         # Add plot to canvas if not yet created
                         if len(self.Plots) == 0:
                             self.Plots.append(
-                                self.Axes.plot(x_data[:, 1][:length], 
-                                               y_data[:, 1][:length])[0])
+                                self.Axes.plot(x_values, y_values)[0])
                         
                         # Set data to already created plot in canvas
                         else:
-                            self.Plots[0].set_data(
-                                x_data[:, 1][:length], 
-                                y_data[:, 1][:length])
+                            self.Plots[0].set_data(x_values, y_values)
                     
                     # Display cursor in canvas if a cursor tick is defined and it is
                     # include in values tick range
@@ -1293,10 +1364,17 @@ class DebugVariableGraphicViewer(DebugVariableViewer, FigureCanvas):
                         # and z coordinate
                         length = min(length, len(z_data))
                         
+                        # Downsample data to canvas resolution
+                        ticks, (x_values, y_values, z_values) = \
+                            self.GetDownsampledData(
+                                x_data[:, 0][:length],
+                                [x_data[:, 1][:length], y_data[:, 1][:length],
+                                 z_data[:, 1][:length]],
+                                start_tick, end_tick)
+                        self.CursorData = (ticks, x_values, y_values)
+                        
                         # Add plot to canvas
-                        self.Axes.plot(x_data[:, 1][:length],
-                                       y_data[:, 1][:length],
-                                       zs = z_data[:, 1][:length])
+                        self.Axes.plot(x_values, y_values, zs = z_values)
                     
                     # Display cursor in canvas if a cursor tick is defined and
                     # it is include in values tick range
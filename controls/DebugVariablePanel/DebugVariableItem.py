@@ -27,6 +27,8 @@ import binascii
 
 from graphics.DebugDataConsumer import DebugDataConsumer, TYPE_TRANSLATOR
 
+from DebugDataBuffer import DebugDataBuffer, GetNearestTickIndex
+
 #-------------------------------------------------------------------------------
 #                 Constant for calculate CRC for string variables
 #-------------------------------------------------------------------------------
@@ -160,9 +162,11 @@ class DebugVariableItem(DebugDataConsumer):
         @param index: Variable value index
         @return: Variable data type
         """
-        if (self.VariableType in ["STRING", "WSTRING"] and
-            index < len(self.RawData)):
-            return self.RawData[index][0]
+        if self.VariableType in ["STRING", "WSTRING"]:
+            # Raw values older than first data stored have been discarded
+            index -= self.RawDataOffset
+            if 0 <= index < len(self.RawData):
+                return self.RawData[index][0]
         return ""
     
     def GetValueRange(self):
@@ -206,23 +210,69 @@ class DebugVariableItem(DebugDataConsumer):
         """
         if self.StoreData and self.IsNumVariable():
             # Init table storing data
-            self.Data = numpy.array([]).reshape(0, 3)
+            self.DataBuffer = DebugDataBuffer(3)
+            self.Data = self.DataBuffer.GetData()
             
             # Init table storing raw data if variable is strin
             self.RawData = ([]
                             if self.VariableType in ["STRING", "WSTRING"]
                             else None)
+            self.RawDataOffset = 0
                 
             # Init Value range variables
             self.MinValue = None
             self.MaxValue = None
         
         else:
+            self.DataBuffer = None
             self.Data = None
         
         # Init variable value
         self.Value = ""
     
+    def DiscardData(self, tick):
+        """
+        Discard data stored older than tick given
+        @param tick: Tick of oldest data to keep
+        """
+        if self.Data is None or len(self.Data) == 0:
+            return
+        
+        # Data are stored in tick order
+        count = numpy.searchsorted(self.Data[:, 0], tick)
+        if count == 0:
+            return
+        self.DataBuffer.Discard(count)
+        self.Data = self.DataBuffer.GetData()
+        
+        if len(self.Data) > 0:
+            # Discard raw values not referenced anymore by data stored
+            if self.VariableType in ["STRING", "WSTRING"]:
+                raw_data_offset = int(self.Data[0, 2])
+                del self.RawData[:raw_data_offset - self.RawDataOffset]
+                self.RawDataOffset = raw_data_offset
+            
+            # Update variable range values
+            values = self.Data[:, 1]
+            self.MinValue = values.min()
+            self.MaxValue = values.max()
+        
+        else:
+            if self.RawData is not None:
+                self.RawDataOffset += len(self.RawData)
+                self.RawData = []
+            self.MinValue = None
+            self.MaxValue = None
+    
+    def GetMemorySize(self):
+        """
+        Return memory allocated for storing data
+        @return: Size in bytes
+        """
+        if self.DataBuffer is None:
+            return 0
+        return self.DataBuffer.GetMemorySize()
+    
     def IsNumVariable(self):
         """
         Return if variable data type is numeric. String variables are
@@ -246,7 +296,7 @@ class DebugVariableItem(DebugDataConsumer):
             if self.VariableType in ["STRING", "WSTRING"]:
                 last_raw_data = (self.RawData[-1]
                                  if len(self.RawData) > 0 else None)
-                last_raw_data_idx = len(self.RawData) - 1
+                last_raw_data_idx = self.RawDataOffset + len(self.RawData) - 1
             
             data_values = []
             for tick, (value, forced) in zip(ticks, values):
@@ -286,7 +336,8 @@ class DebugVariableItem(DebugDataConsumer):
                     [float(tick), num_value, extra_value])
             
             # Add New data to stored data table
-            self.Data = numpy.append(self.Data, data_values, axis=0)
+            self.DataBuffer.Append(data_values)
+            self.Data = self.DataBuffer.GetData()
             
             # Signal to debug variable panel to refresh
             self.Parent.HasNewData = True
@@ -338,7 +389,8 @@ class DebugVariableItem(DebugDataConsumer):
             idx = self.GetNearestData(tick, 0)
             
             # Get value and forced flag at given index
-            value, forced = self.RawData[int(self.Data[idx, 2])] \
+            value, forced = self.RawData[
+                                int(self.Data[idx, 2]) - self.RawDataOffset] \
                             if self.VariableType in ["STRING", "WSTRING"] \
                             else self.Data[idx, 1:3]
             
@@ -369,15 +421,5 @@ class DebugVariableItem(DebugDataConsumer):
         if self.Data is None:
             return None
         
-        # Extract data ticks
-        ticks = self.Data[:, 0]
-        
-        # Get nearest data from tick
-        idx = numpy.argmin(abs(ticks - tick))
-        
-        # Adjust data index according to constraint
-        if (adjust < 0 and ticks[idx] > tick and idx > 0 or
-            adjust > 0 and ticks[idx] < tick and idx < len(ticks)):
-            idx += adjust
-        
-        return idx
+        # Data are stored in tick order
+        return GetNearestTickIndex(self.Data[:, 0], tick, adjust)
@@ -24,7 +24,6 @@
 
 from types import TupleType
 import math
-import numpy
 
 import wx
 import wx.lib.buttons
@@ -37,6 +36,7 @@ from matplotlib.backends.backend_wxagg import _convert_agg_to_wx_bitmap
 from editors.DebugViewer import DebugViewer
 from util.BitmapLibrary import GetBitmap
 
+from DebugDataBuffer import DebugDataBuffer, GetNearestTickIndex
 from DebugVariableItem import DebugVariableItem
 from DebugVariableTextViewer import DebugVariableTextViewer
 from DebugVariableGraphicViewer import *
@@ -58,6 +58,16 @@ RANGE_VALUES = \
 # Scrollbar increment in pixel
 SCROLLBAR_UNIT = 10
 
+# Default memory budget in bytes for data stored by panel
+DATA_MEMORY_BUDGET = 128 * 1024 * 1024
+
+# Ratio of memory budget kept when oldest data are discarded
+DATA_MEMORY_RETENTION_RATIO = 0.75
+
+# Size in bytes of a tick and of an item data row stored
+TICK_DATA_SIZE = 8
+ITEM_DATA_SIZE = 3 * 8
+
 def compute_mask(x, y):
     return [(xp if xp == yp else "*")
             for xp, yp in zip(x, y)]
@@ -205,7 +215,9 @@ class DebugVariablePanel(wx.Panel, DebugViewer):
         
         main_sizer = wx.BoxSizer(wx.VERTICAL)
         
-        self.Ticks = numpy.array([]) # List of tick received
+        self.TicksBuffer = DebugDataBuffer() # Table of tick received
+        self.Ticks = self.TicksBuffer.GetData() # List of tick received
+        self.MemoryBudget = DATA_MEMORY_BUDGET # Memory budget for data stored
         self.StartTick = 0           # Tick starting range of data displayed
         self.Fixed = False           # Flag that range of data is fixed
         self.CursorTick = None       # Tick of cursor for displaying values
@@ -348,7 +360,11 @@ class DebugVariablePanel(wx.Panel, DebugViewer):
                 self.StartTick = ticks[0]
             
             # Add tick to list of ticks received
-            self.Ticks = numpy.append(self.Ticks, ticks)
+            self.TicksBuffer.Append(ticks)
+            self.Ticks = self.TicksBuffer.GetData()
+            
+            # Discard oldest data if memory budget is exceeded
+            self.RefreshMemoryBudget()
             
             # Update start tick for range if range follow ticks received
             if not self.Fixed or tick < self.StartTick + self.CurrentRange:
@@ -366,6 +382,48 @@ class DebugVariablePanel(wx.Panel, DebugViewer):
         else:
             DebugViewer.NewDataAvailable(self, ticks)
     
+    def SetMemoryBudget(self, budget):
+        """
+        Set memory budget for data stored by panel
+        @param budget: Memory budget in bytes
+        """
+        self.MemoryBudget = budget
+        self.RefreshMemoryBudget()
+    
+    def GetMemoryBudget(self):
+        """
+        Return memory budget for data stored by panel
+        @return: Memory budget in bytes
+        """
+        return self.MemoryBudget
+    
+    def RefreshMemoryBudget(self):
+        """
+        Discard oldest ticks and items data if data stored exceed memory budget
+        """
+        items_number = sum([len(panel.GetItems())
+                            for panel in self.GraphicPanels])
+        max_ticks = self.MemoryBudget / (
+            TICK_DATA_SIZE + ITEM_DATA_SIZE * items_number)
+        if len(self.Ticks) <= max_ticks:
+            return
+        
+        # Discard more than necessary to not discard data on every tick
+        self.TicksBuffer.Discard(len(self.Ticks) - 
+            int(max_ticks * DATA_MEMORY_RETENTION_RATIO))
+        self.Ticks = self.TicksBuffer.GetData()
+        if len(self.Ticks) == 0:
+            return
+        
+        first_tick = self.Ticks[0]
+        for panel in self.GraphicPanels:
+            panel.DiscardItemsData(first_tick)
+        
+        self.StartTick = max(self.StartTick, first_tick)
+        if self.CursorTick is not None and self.CursorTick < first_tick:
+            self.CursorTick = first_tick
+            self.UpdateCursorTick()
+    
     def ForceRefresh(self):
         """
         Called to force refresh of graphs
@@ -388,19 +446,26 @@ class DebugVariablePanel(wx.Panel, DebugViewer):
             cursor_tick = max(self.Ticks[0], 
                           min(self.CursorTick + move, 
                               self.Ticks[-1]))
-            cursor_tick_idx = numpy.argmin(numpy.abs(self.Ticks - cursor_tick))
+            cursor_tick_idx = GetNearestTickIndex(self.Ticks, cursor_tick)
             if self.Ticks[cursor_tick_idx] == self.CursorTick:
                 cursor_tick_idx = max(0, 
                                   min(cursor_tick_idx + abs(move) / move, 
                                       len(self.Ticks) - 1))
             self.CursorTick = self.Ticks[cursor_tick_idx]
-            self.StartTick = max(self.Ticks[
-                                numpy.argmin(numpy.abs(self.Ticks - 
-                                        self.CursorTick + self.CurrentRange))],
+            self.StartTick = max(self.GetNearestTick(
+                                        self.CursorTick - self.CurrentRange),
                              min(self.StartTick, self.CursorTick))
             self.RefreshCanvasPosition()
             self.UpdateCursorTick() 
             
+    def GetNearestTick(self, tick):
+        """
+        Return nearest tick received from tick given
+        @param tick: Tick where find nearest tick received
+        @return: Nearest tick received
+        """
+        return self.Ticks[GetNearestTickIndex(self.Ticks, tick)]
+    
     def ResetCursorTick(self):
         self.CursorTick = None
         self.Fixed = False
@@ -615,7 +680,7 @@ class DebugVariablePanel(wx.Panel, DebugViewer):
     
     def SetCanvasPosition(self, tick):
         tick = max(self.Ticks[0], min(tick, self.Ticks[-1] - self.CurrentRange))
-        self.StartTick = self.Ticks[numpy.argmin(numpy.abs(self.Ticks - tick))]
+        self.StartTick = self.GetNearestTick(tick)
         self.Fixed = True
         self.RefreshCanvasPosition()
         self.ForceRefresh()
@@ -641,7 +706,7 @@ class DebugVariablePanel(wx.Panel, DebugViewer):
                     tick = self.StartTick + self.CurrentRange / 2.
                 new_start_tick = min(tick - (tick - self.StartTick) * self.CurrentRange / current_range,
                                      self.Ticks[-1] - self.CurrentRange)
-                self.StartTick = self.Ticks[numpy.argmin(numpy.abs(self.Ticks - new_start_tick))]
+                self.StartTick = self.GetNearestTick(new_start_tick)
                 self.Fixed = new_start_tick < self.Ticks[-1] - self.CurrentRange
             self.ForceRefresh()
     
@@ -918,7 +983,8 @@ class DebugVariablePanel(wx.Panel, DebugViewer):
         self.ForceRefresh()
     
     def ResetGraphicsValues(self):
-        self.Ticks = numpy.array([])
+        self.TicksBuffer.Reset()
+        self.Ticks = self.TicksBuffer.GetData()
         self.StartTick = 0
         for panel in self.GraphicPanels:
             panel.ResetItemsData()
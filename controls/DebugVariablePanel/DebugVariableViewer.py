@@ -159,6 +159,14 @@ class DebugVariableViewer:
         for item in self.Items:
             item.ResetData()
     
+    def DiscardItemsData(self, tick):
+        """
+        Discard data older than tick given in every items displayed in Viewer
+        @param tick: Tick of oldest data to keep
+        """
+        for item in self.Items:
+            item.DiscardData(tick)
+    
     def GetItemsMinCommonTick(self):
         """
         Return the minimum tick common to all iems displayed in Viewer
@@ -195,6 +195,11 @@ class LD_Viewer(Viewer):
                 else:
                     self.RungComments.insert(i, None)
         
+    # Rungs are only computed when whole view is refreshed
+    def CanRefreshElements(self):
+        return (self.GetDrawingMode() == FREEDRAWING_MODE and
+                Viewer.CanRefreshElements(self))
+
     def loadInstance(self, instance, ids, selection):
         Viewer.loadInstance(self, instance, ids, selection)
         if self.GetDrawingMode() != FREEDRAWING_MODE:
@@ -269,7 +274,7 @@ class LD_Viewer(Viewer):
             if self.SelectedElement.HitTest(pos, connectors) or self.SelectedElement.TestHandle(pos) != (0, 0):
                 return self.SelectedElement
         elements = []
-        for element in self.GetElements(sort_wires=True):
+        for element in self.GetElementsAtPosition(pos, sort_wires=True):
             if element.HitTest(pos, connectors) or element.TestHandle(event) != (0, 0):
                 elements.append(element)
         if len(elements) == 1:
@@ -288,8 +293,8 @@ class LD_Viewer(Viewer):
             return Viewer.SearchElements(self, bbox)
         
         elements = []
-        for element in self.Blocks.values() + self.Comments.values():
-            if element.IsInSelection(bbox):
+        for element in self.GetElementsInRect(bbox):
+            if not self.IsWire(element) and element.IsInSelection(bbox):
                 elements.append(element)
         return elements
 
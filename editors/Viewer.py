@@ -27,6 +27,7 @@ import math
 from time import time as gettime
 from types import TupleType
 from threading import Lock
+from collections import OrderedDict
 
 import wx
 
@@ -42,6 +43,14 @@ SCROLLBAR_UNIT = 10
 WINDOW_BORDER = 10
 SCROLL_ZONE = 10
 
+# Maximum ratio of instances changed since last refresh for which view is
+# refreshed by updating only the elements of these instances
+INCREMENTAL_REFRESH_MAX_RATIO = 0.5
+
+# Part of visible view size added on each side of visible part of view, in
+# which values of elements are subscribed in debug mode
+DEBUG_SUBSCRIPTION_MARGIN = 0.5
+
 CURSORS = None
 SFC_Objects = (SFC_Step, SFC_ActionBlock, SFC_Transition, SFC_Divergence, SFC_Jump)
 
@@ -845,13 +854,16 @@ class Viewer(EditorPanel, DebugViewer):
 
     def AddBlock(self, block):
         self.Blocks[block.GetId()] = block
+        self.ElementsGrid.AddElement(block)
 
     def AddWire(self, wire):
         self.wire_id += 1
         self.Wires[wire] = self.wire_id
+        self.ElementsGrid.AddElement(wire)
 
     def AddComment(self, comment):
         self.Comments[comment.GetId()] = comment
+        self.ElementsGrid.AddElement(comment)
 
     def IsBlock(self, block):
         if block is not None:
@@ -868,12 +880,86 @@ class Viewer(EditorPanel, DebugViewer):
 
     def RemoveBlock(self, block):
         self.Blocks.pop(block.GetId())
+        self.ElementsGrid.RemoveElement(block)
+        self.VisibleElements.discard(block)
 
     def RemoveWire(self, wire):
         self.Wires.pop(wire)
+        self.ElementsGrid.RemoveElement(wire)
+        self.VisibleElements.discard(wire)
 
     def RemoveComment(self, comment):
         self.Comments.pop(comment.GetId())
+        self.ElementsGrid.RemoveElement(comment)
+        self.VisibleElements.discard(comment)
+
+    # Called by elements when their bounding box changed
+    def RefreshElementBoundingBox(self, element):
+        self.ElementsGrid.RefreshElement(element)
+
+    # Removes element and wires connected to it from view, leaving model and
+    # elements connected unchanged
+    def RemoveElementFromView(self, element):
+        if self.IsComment(element):
+            self.RemoveComment(element)
+            return
+        connectors = element.GetConnectors()
+        element_connectors = connectors["inputs"] + connectors["outputs"]
+        if isinstance(element, SFC_Transition):
+            element_connectors.append(element.GetConditionConnector())
+        for connector in element_connectors:
+            if connector is None:
+                continue
+            for wire, handle in connector.GetWires():
+                if self.IsWire(wire):
+                    connected = wire.GetOtherConnected(connector)
+                    if connected is not None:
+                        connected.UnConnect(wire, unconnect=False, delete=True)
+                    self.RemoveWire(wire)
+        element.Flush()
+        self.RemoveBlock(element)
+
+    # Splits elements given in blocks, wires and comments
+    def SplitElements(self, elements):
+        blocks, wires, comments = [], [], []
+        for element in elements:
+            if self.IsWire(element):
+                wires.append(element)
+            elif self.Comments.get(element.GetId()) is element:
+                comments.append(element)
+            else:
+                blocks.append(element)
+        return blocks, wires, comments
+
+    # Returns the elements among those given, in the order of GetElements
+    def SortElements(self, elements, sort_blocks=False, sort_wires=False, sort_comments=False):
+        blocks, wires, comments = self.SplitElements(elements)
+        if sort_blocks:
+            blocks.sort(lambda x, y: cmp(x.GetId(), y.GetId()))
+        if sort_wires:
+            wires.sort(lambda x, y: cmp(self.Wires[x], self.Wires[y]))
+        if sort_comments:
+            comments.sort(lambda x, y: cmp(x.GetId(), y.GetId()))
+        return blocks + wires + comments
+
+    # Returns the distance around bounding box where an element can be hit
+    def GetHitTestMargin(self):
+        return (int(HANDLE_SIZE / min(self.ViewScale)) +
+                CONNECTOR_SIZE + ANCHOR_DISTANCE + 4)
+
+    # Returns the elements that can be hit at position, in the order of GetElements
+    def GetElementsAtPosition(self, pos, sort_blocks=False, sort_wires=False, sort_comments=False):
+        return self.SortElements(
+            self.ElementsGrid.GetElementsAtPoint(pos.x, pos.y,
+                                                 self.GetHitTestMargin()),
+            sort_blocks, sort_wires, sort_comments)
+
+    # Returns the elements whose bounding box can intersect rect, in the order of GetElements
+    def GetElementsInRect(self, rect, sort_blocks=False, sort_wires=False, sort_comments=False):
+        return self.SortElements(
+            self.ElementsGrid.GetElementsInRect(rect.x, rect.y,
+                                                rect.width, rect.height),
+            sort_blocks, sort_wires, sort_comments)
 
     def GetElements(self, sort_blocks=False, sort_wires=False, sort_comments=False):
         blocks = self.Blocks.values()
@@ -904,21 +990,65 @@ class Viewer(EditorPanel, DebugViewer):
                 return block
         return None
 
-    def RefreshVisibleElements(self, xp = None, yp = None):
+    # Returns visible part of view, for given scroll position if any
+    def GetVisibleRect(self, xp = None, yp = None):
         x, y = self.Editor.CalcUnscrolledPosition(0, 0)
         if xp is not None:
             x = xp * self.Editor.GetScrollPixelsPerUnit()[0]
         if yp is not None:
             y = yp * self.Editor.GetScrollPixelsPerUnit()[1]
         width, height = self.Editor.GetClientSize()
-        screen = wx.Rect(int(x / self.ViewScale[0]), int(y / self.ViewScale[1]),
-                         int(width / self.ViewScale[0]), int(height / self.ViewScale[1]))
-        for comment in self.Comments.itervalues():
-            comment.TestVisible(screen)
-        for wire in self.Wires.iterkeys():
-            wire.TestVisible(screen)
-        for block in self.Blocks.itervalues():
-            block.TestVisible(screen)
+        return wx.Rect(int(x / self.ViewScale[0]), int(y / self.ViewScale[1]),
+                       int(width / self.ViewScale[0]), int(height / self.ViewScale[1]))
+
+    def RefreshVisibleElements(self, xp = None, yp = None):
+        screen = self.GetVisibleRect(xp, yp)
+        # Only elements whose redraw rect can intersect screen and elements
+        # previously visible need to be tested
+        margin = int(HANDLE_SIZE / min(self.ViewScale)) + 4
+        elements = self.ElementsGrid.GetElementsInRect(
+            screen.x - margin, screen.y - margin,
+            screen.width + 2 * margin, screen.height + 2 * margin)
+        elements.update(self.VisibleElements)
+        if self.SelectedElement is not None:
+            if isinstance(self.SelectedElement, Graphic_Group):
+                elements.update(filter(self.ElementsGrid.IsElement,
+                                       self.SelectedElement.GetElements()))
+            elif self.ElementsGrid.IsElement(self.SelectedElement):
+                elements.add(self.SelectedElement)
+        self.VisibleElements = set()
+        for element in elements:
+            element.TestVisible(screen)
+            if element.IsVisible():
+                self.VisibleElements.add(element)
+        if self.Debug:
+            self.RefreshDataConsumers(screen)
+
+    # Subscribe values of elements in visible part of view or near it, and
+    # unsubscribe the others. No value is subscribed while view is hidden
+    def RefreshDataConsumers(self, screen = None):
+        consumers = {}
+        if self.IsShown():
+            if screen is None:
+                screen = self.GetVisibleRect()
+            margin_x = int(screen.width * DEBUG_SUBSCRIPTION_MARGIN)
+            margin_y = int(screen.height * DEBUG_SUBSCRIPTION_MARGIN)
+            for element in self.ElementsGrid.GetElementsInRect(
+                    screen.x - margin_x, screen.y - margin_y,
+                    screen.width + 2 * margin_x, screen.height + 2 * margin_y):
+                consumers.update(self.ElementsDataConsumers.get(element, []))
+        for consumer in self.ActiveDataConsumers.iterkeys():
+            if not consumers.has_key(consumer):
+                self.RemoveDataConsumer(consumer)
+        for consumer, iec_path in consumers.iteritems():
+            if not self.ActiveDataConsumers.has_key(consumer):
+                result = self.AddDataConsumer(iec_path, consumer)
+                if isinstance(consumer, Wire):
+                    if result is None:
+                        consumer.SetValue("undefined")
+                    else:
+                        consumer.SetModifier(self.GetWireModifier(consumer))
+        self.ActiveDataConsumers = consumers
 
     def GetElementIECPath(self, element):
         iec_path = None
@@ -991,7 +1121,15 @@ class Viewer(EditorPanel, DebugViewer):
         self.Blocks = {}
         self.Wires = {}
         self.Comments = {}
-        self.Subscribed = {}
+        # Spatial index of blocks, wires and comments
+        self.ElementsGrid = GraphicElementsGrid()
+        self.VisibleElements = set()
+        # Instances infos elements were loaded from
+        self.InstancesState = None
+        # Values subscribed in debug mode by element, and values currently
+        # subscribed
+        self.ElementsDataConsumers = {}
+        self.ActiveDataConsumers = {}
         self.SelectedElement = None
         self.HighlightedElement = None
         self.ToolTipElement = None
@@ -1137,7 +1275,10 @@ class Viewer(EditorPanel, DebugViewer):
         self.ElementRefreshList.append(element)
         self.ElementRefreshList_lock.release()
 
-    def NewDataAvailable(self, ticks):
+    # Elements that changed are redrawn at most once every refresh period,
+    # values received while refreshing being applied before redraw
+    def RefreshNewData(self):
+        DebugViewer.RefreshNewData(self)
         if self.IsShown():
             refresh_rect = None
             self.ElementRefreshList_lock.acquire()
@@ -1168,17 +1309,29 @@ class Viewer(EditorPanel, DebugViewer):
             self.ToolTipElement = None
 
         self.Inhibit(True)
-        self.current_id = 0
-        # Start by reseting Viewer
-        self.Flush()
-        self.ResetView()
         self.ResetBuffer()
-        instance = {}
-        # List of ids of already loaded blocks
-        instances = self.Controler.GetEditedElementInstancesInfos(self.TagName, debug = self.Debug)
-        # Load Blocks until they are all loaded
-        while len(instances) > 0:
-            self.loadInstance(instances.popitem(0)[1], instances, selection)
+        # Only elements of instances that changed since last refresh are
+        # refreshed, unless elements have to be selected
+        if selection is None and self.CanRefreshElements():
+            state = self.InstancesState
+        else:
+            state = None
+        new_state, changed, removed = self.Controler.GetEditedElementInstancesChanges(
+            self.TagName, state, debug = self.Debug)
+        if (state is not None and len(changed) + len(removed) <=
+            len(new_state.instances) * INCREMENTAL_REFRESH_MAX_RATIO):
+            self.RefreshElements(new_state.instances, changed, removed)
+        else:
+            self.current_id = 0
+            # Start by reseting Viewer
+            self.Flush()
+            self.ResetView()
+            # List of instances not loaded yet
+            instances = new_state.instances.copy()
+            # Load Blocks until they are all loaded
+            while len(instances) > 0:
+                self.loadInstance(instances.popitem(0)[1], instances, selection)
+        self.InstancesState = new_state
 
         if (selection is not None and
             isinstance(self.SelectedElement, Graphic_Group)):
@@ -1187,6 +1340,10 @@ class Viewer(EditorPanel, DebugViewer):
 
         self.RefreshScrollBars()
 
+        # Values are only subscribed for elements near visible part of view,
+        # when refreshing visible elements
+        self.ElementsDataConsumers = {}
+        self.ActiveDataConsumers = {}
         for wire in self.Wires:
             if not wire.IsConnectedCompatible():
                 wire.SetValid(False)
@@ -1196,30 +1353,91 @@ class Viewer(EditorPanel, DebugViewer):
                     block = wire.EndConnected.GetParentBlock()
                     if isinstance(block, LD_PowerRail):
                         wire.SetValue(True)
-                elif self.AddDataConsumer(iec_path.upper(), wire) is None:
-                    wire.SetValue("undefined")
                 else:
-                    wire.SetModifier(self.GetWireModifier(wire))
+                    self.ElementsDataConsumers[wire] = [(wire, iec_path.upper())]
 
         if self.Debug:
             for block in self.Blocks.itervalues():
                 block.SpreadCurrent()
                 if isinstance(block, FBD_Block):
+                    consumers = []
                     for output_connector in block.GetConnectors()["outputs"]:
                         if len(output_connector.GetWires()) == 0:
                             iec_path = self.GetElementIECPath(output_connector)
                             if iec_path is not None:
-                                self.AddDataConsumer(iec_path.upper(), output_connector)
+                                consumers.append((output_connector, iec_path.upper()))
+                    if len(consumers) > 0:
+                        self.ElementsDataConsumers[block] = consumers
                 else:
                     iec_path = self.GetElementIECPath(block)
                     if iec_path is not None:
-                        self.AddDataConsumer(iec_path.upper(), block)
+                        self.ElementsDataConsumers[block] = [(block, iec_path.upper())]
 
         self.Inhibit(False)
         self.RefreshVisibleElements()
         self.ShowHighlights()
         self.Editor.Refresh(False)
 
+    # Return if view can be refreshed by updating only elements that changed
+    def CanRefreshElements(self):
+        return self.InstancesState is not None
+
+    # Refresh elements of instances changed or removed since last refresh,
+    # keeping other elements and wires between them
+    def RefreshElements(self, instances, changed, removed):
+        self.UnsubscribeAllDataConsumers(tick=False)
+        if self.SelectedElement is not None:
+            self.SelectedElement.SetSelected(False)
+            self.SelectedElement = None
+        if self.HighlightedElement is not None:
+            self.HighlightedElement.SetHighlighted(False)
+            self.HighlightedElement = None
+        refreshed = set(changed)
+        refreshed.update(removed)
+        for id in refreshed:
+            element = self.FindElementById(id)
+            if element is not None:
+                self.RemoveElementFromView(element)
+        # Highlights are shown again on every element
+        for element in self.Blocks.values() + self.Comments.values():
+            element.ClearHighlight()
+        instances_changed = OrderedDict([(id, instances[id]) for id in changed])
+        while len(instances_changed) > 0:
+            self.loadInstance(instances_changed.popitem(0)[1], instances_changed, None)
+        # Wires from unchanged instances to refreshed ones are created again
+        for id, instance in instances.iteritems():
+            if id not in refreshed:
+                self.CreateInstanceWires(instance, refreshed)
+
+    # Create wires of loaded instance linked to instances with given ids
+    def CreateInstanceWires(self, instance, ids):
+        element = self.Blocks.get(instance.id)
+        if element is None:
+            return
+        connectors = element.GetConnectors()
+        links_connected = True
+        created = False
+        for i, input_connector in enumerate(instance.inputs):
+            links = [link for link in input_connector.links
+                     if link.refLocalId in ids]
+            if len(links) > 0:
+                connector = self.GetInstanceConnector(element,
+                    connectors["inputs"], i, input_connector, True)
+                if connector is not None:
+                    links_connected &= self.CreateWires(connector, instance.id, links, {})
+                    created = True
+        if (isinstance(element, SFC_Transition) and
+            instance.specific_values.condition_type == "connection"):
+            links = [link for link in instance.specific_values.connection.links
+                     if link.refLocalId in ids]
+            if len(links) > 0:
+                self.CreateWires(element.GetConditionConnector(), instance.id, links, {})
+                created = True
+        if not links_connected:
+            element.RefreshModel()
+        if created:
+            element.RefreshConnectors()
+
     def GetPreviousSteps(self, connectors):
         steps = []
         for connector in connectors:
@@ -1247,12 +1465,7 @@ class Viewer(EditorPanel, DebugViewer):
         return steps
 
     def GetMaxSize(self):
-        maxx = maxy = 0
-        for element in self.GetElements():
-            bbox = element.GetBoundingBox()
-            maxx = max(maxx, bbox.x + bbox.width)
-            maxy = max(maxy, bbox.y + bbox.height)
-        return maxx, maxy
+        return self.ElementsGrid.GetMaxSize()
 
     def RefreshScrollBars(self, width_incr=0, height_incr=0):
         xstart, ystart = self.GetViewStart()
@@ -1361,13 +1574,8 @@ class Viewer(EditorPanel, DebugViewer):
         element.SetSize(instance.width, instance.height)
         for i, output_connector in enumerate(instance.outputs):
             connector_pos = wx.Point(*output_connector.position)
-            if isinstance(element, FBD_Block):
-                connector = element.GetConnector(connector_pos,
-                    output_name = output_connector.name)
-            elif i < len(connectors["outputs"]):
-                connector = connectors["outputs"][i]
-            else:
-                connector = None
+            connector = self.GetInstanceConnector(element,
+                connectors["outputs"], i, output_connector, False)
             if connector is not None:
                 if output_connector.negated:
                     connector.SetNegated(True)
@@ -1377,13 +1585,8 @@ class Viewer(EditorPanel, DebugViewer):
                     connector.SetPosition(connector_pos)
         for i, input_connector in enumerate(instance.inputs):
             connector_pos = wx.Point(*input_connector.position)
-            if isinstance(element, FBD_Block):
-                connector = element.GetConnector(connector_pos,
-                    input_name = input_connector.name)
-            elif i < len(connectors["inputs"]):
-                connector = connectors["inputs"][i]
-            else:
-                connector = None
+            connector = self.GetInstanceConnector(element,
+                connectors["inputs"], i, input_connector, True)
             if connector is not None:
                 if connectors["inputs"].index(connector) == i:
                     connector.SetPosition(connector_pos)
@@ -1398,6 +1601,20 @@ class Viewer(EditorPanel, DebugViewer):
         if selection is not None and selection[0].get(instance.id, False):
             self.SelectInGroup(element)
 
+    # Returns the connector of element corresponding to the i-th input or
+    # output connection of its instance
+    def GetInstanceConnector(self, element, connectors, i, connection, input):
+        if isinstance(element, FBD_Block):
+            connector_pos = wx.Point(*connection.position)
+            if input:
+                return element.GetConnector(connector_pos,
+                    input_name = connection.name)
+            return element.GetConnector(connector_pos,
+                output_name = connection.name)
+        elif i < len(connectors):
+            return connectors[i]
+        return None
+
     def CreateWires(self, start_connector, id, links, remaining_instances, selection=None):
         links_connected = True
         for link in links:
@@ -1461,16 +1678,16 @@ class Viewer(EditorPanel, DebugViewer):
     def FindBlock(self, event):
         dc = self.GetLogicalDC()
         pos = event.GetLogicalPosition(dc)
-        for block in self.Blocks.itervalues():
-            if block.HitTest(pos) or block.TestHandle(event) != (0, 0):
+        for block in self.GetElementsAtPosition(pos):
+            if self.IsBlock(block) and (block.HitTest(pos) or block.TestHandle(event) != (0, 0)):
                 return block
         return None
 
     def FindWire(self, event):
         dc = self.GetLogicalDC()
         pos = event.GetLogicalPosition(dc)
-        for wire in self.Wires:
-            if wire.HitTest(pos) or wire.TestHandle(event) != (0, 0):
+        for wire in self.GetElementsAtPosition(pos):
+            if self.IsWire(wire) and (wire.HitTest(pos) or wire.TestHandle(event) != (0, 0)):
                 return wire
         return None
 
@@ -1480,7 +1697,7 @@ class Viewer(EditorPanel, DebugViewer):
         if self.SelectedElement and not (exclude_group and isinstance(self.SelectedElement, Graphic_Group)):
             if self.SelectedElement.HitTest(pos, connectors) or self.SelectedElement.TestHandle(event) != (0, 0):
                 return self.SelectedElement
-        for element in self.GetElements():
+        for element in self.GetElementsAtPosition(pos):
             if element.HitTest(pos, connectors) or element.TestHandle(event) != (0, 0):
                 return element
         return None
@@ -1492,7 +1709,9 @@ class Viewer(EditorPanel, DebugViewer):
     def FindBlockConnectorWithError(self, pos, direction = None, exclude = None):
         error = False        
         startblock = None
-        for block in self.Blocks.itervalues():
+        for block in self.GetElementsAtPosition(pos):
+            if not self.IsBlock(block):
+                continue
             connector = block.TestConnector(pos, direction, exclude)
             if connector:
                 if self.IsWire(self.SelectedElement):
@@ -1515,7 +1734,7 @@ class Viewer(EditorPanel, DebugViewer):
 
     def SearchElements(self, bbox):
         elements = []
-        for element in self.GetElements():
+        for element in self.GetElementsInRect(bbox):
             if element.IsInSelection(bbox):
                 elements.append(element)
         return elements
@@ -3636,19 +3855,25 @@ class Viewer(EditorPanel, DebugViewer):
                 dc.DrawLine(int(xstart * SCROLLBAR_UNIT / self.ViewScale[0]), ystart * SCROLLBAR_UNIT + y + 1,
                             int((xstart * SCROLLBAR_UNIT + window_size[0]) / self.ViewScale[1]), ystart * SCROLLBAR_UNIT + y + 1)
 
-        # Draw all elements
-        for comment in self.Comments.itervalues():
+        # Draw all elements, only visible ones if not printing
+        if printing:
+            comments = self.Comments.values()
+            wires = self.Wires.keys()
+            blocks = self.Blocks.values()
+        else:
+            blocks, wires, comments = self.SplitElements(self.VisibleElements)
+        for comment in comments:
             if comment != self.SelectedElement and (comment.IsVisible() or printing):
                 comment.Draw(dc)
-        for wire in self.Wires.iterkeys():
+        for wire in wires:
             if wire != self.SelectedElement and (wire.IsVisible() or printing):
                  if not self.Debug or wire.GetValue() != True:
                     wire.Draw(dc)
         if self.Debug:
-            for wire in self.Wires.iterkeys():
+            for wire in wires:
                 if wire != self.SelectedElement and (wire.IsVisible() or printing) and wire.GetValue() == True:
                     wire.Draw(dc)
-        for block in self.Blocks.itervalues():
+        for block in blocks:
             if block != self.SelectedElement and (block.IsVisible() or printing):
                 block.Draw(dc)
 
@@ -149,6 +149,7 @@ class FBD_Block(Graphic_Element):
         self.BoundingBox = self.GetBlockBoundingBox()
         if self.Name != "":
             self.BoundingBox.Union(self.GetTextBoundingBox())
+        self.BoundingBoxChanged()
     
     # Refresh the positions of the block connectors
     def RefreshConnectors(self):
@@ -594,6 +595,7 @@ class FBD_Variable(Graphic_Element):
             bbx_width = max(bbx_width, bbx_width + self.Pos.x + self.ExecutionOrderSize[0] - bbx_x - self.Size[0])
             bbx_height = bbx_height + (self.ExecutionOrderSize[1] + 2)
         self.BoundingBox = wx.Rect(bbx_x, self.Pos.y, bbx_width + 1, bbx_height + 1)
+        self.BoundingBoxChanged()
     
     # Refresh the position of the variable connector
     def RefreshConnectors(self):
@@ -865,6 +867,7 @@ class FBD_Connector(Graphic_Element):
             bbx_x = self.Pos.x
         bbx_width = self.Size[0] + CONNECTOR_SIZE
         self.BoundingBox = wx.Rect(bbx_x, self.Pos.y, bbx_width, self.Size[1])
+        self.BoundingBoxChanged()
     
     # Refresh the position of the connection connector
     def RefreshConnectors(self):
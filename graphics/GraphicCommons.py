@@ -224,7 +224,107 @@ def DrawHighlightedText(dc, text, highlights, x, y):
         dc.DrawText(part, x + offset_width, y)
     dc.SetPen(current_pen)
     dc.SetTextForeground(wx.BLACK)
-    
+
+#-------------------------------------------------------------------------------
+#                       Spatial index of graphic elements
+#-------------------------------------------------------------------------------
+
+# Size of the square cells of the grid indexing graphic elements
+ELEMENTS_GRID_CELL_SIZE = 64
+
+"""
+Class that indexes graphic elements by the grid cells their bounding box
+overlaps, so that elements near a point or in a rectangle are found without
+testing every element
+"""
+
+class GraphicElementsGrid:
+
+    def __init__(self, cell_size=ELEMENTS_GRID_CELL_SIZE):
+        self.CellSize = cell_size
+        self.Cells = {}
+        # Bounding box and cells range of each element, when last indexed
+        self.Elements = {}
+        # Maximum coordinates of elements bounding box, None if unknown
+        self.MaxSize = (0, 0)
+
+    def GetCellsRange(self, x, y, width, height):
+        return (x // self.CellSize, y // self.CellSize,
+                (x + width) // self.CellSize, (y + height) // self.CellSize)
+
+    def AddElement(self, element):
+        bbox = element.GetBoundingBox()
+        bbox = (bbox.x, bbox.y, bbox.width, bbox.height)
+        cells_range = self.GetCellsRange(*bbox)
+        xmin, ymin, xmax, ymax = cells_range
+        for cell in [(cell_x, cell_y) for cell_x in xrange(xmin, xmax + 1)
+                                      for cell_y in xrange(ymin, ymax + 1)]:
+            self.Cells.setdefault(cell, set()).add(element)
+        self.Elements[element] = (bbox, cells_range)
+        if self.MaxSize is not None:
+            self.MaxSize = (max(self.MaxSize[0], bbox[0] + bbox[2]),
+                            max(self.MaxSize[1], bbox[1] + bbox[3]))
+
+    def RemoveElement(self, element):
+        infos = self.Elements.pop(element, None)
+        if infos is not None:
+            (x, y, width, height), (xmin, ymin, xmax, ymax) = infos
+            for cell in [(cell_x, cell_y) for cell_x in xrange(xmin, xmax + 1)
+                                          for cell_y in xrange(ymin, ymax + 1)]:
+                elements = self.Cells[cell]
+                elements.discard(element)
+                if len(elements) == 0:
+                    self.Cells.pop(cell)
+            # Maximum size is computed again if element was defining it
+            if (self.MaxSize is not None and
+                (x + width >= self.MaxSize[0] or
+                 y + height >= self.MaxSize[1])):
+                self.MaxSize = None
+
+    # Update index after element bounding box changed
+    def RefreshElement(self, element):
+        infos = self.Elements.get(element)
+        if infos is not None:
+            bbox = element.GetBoundingBox()
+            if infos[0] != (bbox.x, bbox.y, bbox.width, bbox.height):
+                self.RemoveElement(element)
+                self.AddElement(element)
+
+    def IsElement(self, element):
+        return element in self.Elements
+
+    # Returns the elements whose bounding box can intersect the rectangle
+    def GetElementsInRect(self, x, y, width, height):
+        xmin, ymin, xmax, ymax = self.GetCellsRange(x, y, width, height)
+        if (xmax - xmin + 1) * (ymax - ymin + 1) > len(self.Cells):
+            cells = [elements for (cell_x, cell_y), elements
+                     in self.Cells.iteritems()
+                     if xmin <= cell_x <= xmax and ymin <= cell_y <= ymax]
+        else:
+            cells = [self.Cells.get((cell_x, cell_y))
+                     for cell_x in xrange(xmin, xmax + 1)
+                     for cell_y in xrange(ymin, ymax + 1)]
+        result = set()
+        for elements in cells:
+            if elements is not None:
+                result.update(elements)
+        return result
+
+    # Returns the elements whose bounding box, extended by margin, contains point
+    def GetElementsAtPoint(self, x, y, margin=0):
+        return self.GetElementsInRect(x - margin, y - margin,
+                                      2 * margin, 2 * margin)
+
+    # Returns the maximum coordinates of elements bounding box
+    def GetMaxSize(self):
+        if self.MaxSize is None:
+            maxx = maxy = 0
+            for (x, y, width, height), cells_range in self.Elements.itervalues():
+                maxx = max(maxx, x + width)
+                maxy = max(maxy, y + height)
+            self.MaxSize = (maxx, maxy)
+        return self.MaxSize
+
 #-------------------------------------------------------------------------------
 #                           Graphic element base class
 #-------------------------------------------------------------------------------
@@ -376,7 +476,13 @@ class Graphic_Element(ToolTipProducer):
     # Override this method for refreshing the bounding box
     def RefreshBoundingBox(self):
         pass
-    
+
+    # Informs parent that the bounding box changed, for updating its index of elements
+    def BoundingBoxChanged(self):
+        refresh = getattr(self.Parent, "RefreshElementBoundingBox", None)
+        if refresh is not None:
+            refresh(self)
+
     # Returns the bounding box
     def GetBoundingBox(self):
         return self.BoundingBox
@@ -1862,6 +1968,7 @@ class Wire(Graphic_Element, DebugDataConsumer):
             self.Pos.x, self.Pos.y = minx, miny
             self.Size = wx.Size(maxx - minx, maxy - miny)
             self.BoundingBox = wx.Rect(minbbxx, minbbxy, maxbbxx - minbbxx + 1, maxbbxy - minbbxy + 1)
+        self.BoundingBoxChanged()
     
     # Refresh the realpoints that permits to keep the proportionality in wire during resizing
     def RefreshRealPoints(self):
@@ -2770,6 +2877,7 @@ class Comment(Graphic_Element):
     # Refresh the comment bounding box
     def RefreshBoundingBox(self):
         self.BoundingBox = wx.Rect(self.Pos.x, self.Pos.y, self.Size[0] + 1, self.Size[1] + 1)
+        self.BoundingBoxChanged()
     
     # Changes the comment size
     def SetSize(self, width, height):
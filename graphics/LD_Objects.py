@@ -113,6 +113,7 @@ class LD_PowerRail(Graphic_Element):
     # Refresh the power rail bounding box
     def RefreshBoundingBox(self):
         self.BoundingBox = wx.Rect(self.Pos.x, self.Pos.y, self.Size[0] + 1, self.Size[1] + 1)
+        self.BoundingBoxChanged()
     
     # Refresh the power rail size
     def RefreshSize(self):
@@ -499,6 +500,7 @@ class LD_Contact(Graphic_Element, DebugDataConsumer):
             bbx_y = self.Pos.y
             bbx_height = self.Size[1]
         self.BoundingBox = wx.Rect(bbx_x, bbx_y, bbx_width + 1, bbx_height + 1)
+        self.BoundingBoxChanged()
     
     # Returns the block minimum size
     def GetMinSize(self):
@@ -818,6 +820,7 @@ class LD_Coil(Graphic_Element):
             bbx_y = self.Pos.y
             bbx_height = self.Size[1]
         self.BoundingBox = wx.Rect(bbx_x, bbx_y, bbx_width + 1, bbx_height + 1)
+        self.BoundingBoxChanged()
         
     # Returns the block minimum size
     def GetMinSize(self):
@@ -222,6 +222,7 @@ class SFC_Step(Graphic_Element, DebugDataConsumer):
                 bbx_height += CONNECTOR_SIZE
         #self.BoundingBox = wx.Rect(self.Pos.x, bbx_y, bbx_width + 1, bbx_height + 1)
         self.BoundingBox = wx.Rect(self.Pos.x, self.Pos.y, self.Size[0] + 1, self.Size[1] + 1)
+        self.BoundingBoxChanged()
         
     # Refresh the positions of the step connectors
     def RefreshConnectors(self):
@@ -731,6 +732,7 @@ class SFC_Transition(Graphic_Element, DebugDataConsumer):
             bbx_y = min(bbx_y, self.Pos.y - max(0, (text_height - self.Size[1]) / 2))
             bbx_height = max(bbx_height, self.Pos.y - bbx_y + (self.Size[1] + text_height) / 2)
         self.BoundingBox = wx.Rect(bbx_x, bbx_y, bbx_width + 1, bbx_height + 1)
+        self.BoundingBoxChanged()
         
     # Returns the connector connected to input
     def GetPreviousConnector(self):
@@ -1204,6 +1206,7 @@ class SFC_Divergence(Graphic_Element):
         elif self.Type in [SIMULTANEOUS_DIVERGENCE, SIMULTANEOUS_CONVERGENCE]:
             self.BoundingBox = wx.Rect(self.Pos.x - SFC_SIMULTANEOUS_SEQUENCE_EXTRA, self.Pos.y, 
                 self.Size[0] + 2 * SFC_SIMULTANEOUS_SEQUENCE_EXTRA + 1, self.Size[1] + 1)
+        self.BoundingBoxChanged()
     
     # Refresh the position of wires connected to divergence
     def RefreshConnected(self, exclude = []):
@@ -1592,6 +1595,7 @@ class SFC_Jump(Graphic_Element):
         bbx_width = self.Size[0] + 2 + text_width
         self.BoundingBox = wx.Rect(self.Pos.x, self.Pos.y - CONNECTOR_SIZE, 
                 bbx_width + 1, self.Size[1] + CONNECTOR_SIZE + 1)
+        self.BoundingBoxChanged()
     
     # Returns the connector connected to input
     def GetPreviousConnector(self):
@@ -1859,6 +1863,7 @@ class SFC_ActionBlock(Graphic_Element):
     # Refresh the action block bounding box
     def RefreshBoundingBox(self):
         self.BoundingBox = wx.Rect(self.Pos.x, self.Pos.y, self.Size[0] + 1, self.Size[1] + 1)
+        self.BoundingBoxChanged()
     
     # Refresh the position of wires connected to action block
     def RefreshConnected(self, exclude = []):
@@ -48,6 +48,8 @@ StdTC6Libs = [(_("Standard function blocks"),  join(sd, "Standard_Function_Block
 
 StdFuncsCSV = join(sd,"iec_std.csv")
 
+StdBlckCache = join(sd, "std_blocks.cache")
+
 def GetBlockInfos(pou):
     infos = pou.getblockInfos()
     infos["inputs"] = [
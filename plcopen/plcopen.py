@@ -25,6 +25,7 @@
 from xmlclass import *
 from types import *
 import os, re
+from threading import Thread
 from lxml import etree
 from collections import OrderedDict
 
@@ -118,7 +119,13 @@ def CompilePattern(criteria):
         find_pattern = re.escape(find_pattern)
     criteria["pattern"] = re.compile(find_pattern, flag)
 
+# Criteria making Search methods return each text they test, whole, in place of
+# the matches of a pattern
+SEARCH_TEXTS_CRITERIA = {"filter": "all", "collect_texts": True}
+
 def TestTextElement(text, criteria):
+    if criteria.get("collect_texts", False):
+        return [((0, 0), (0, 0), text)]
     lines = text.splitlines()
     test_result = []
     result = criteria["pattern"].search(text)
@@ -129,6 +136,13 @@ def TestTextElement(text, criteria):
         result = criteria["pattern"].search(text, result.end())
     return test_result
 
+"""
+Return the texts tested when searching in element, with the infos locating them
+"""
+def GetSearchTexts(element):
+    return [(infos, text) for infos, start, end, text
+            in element.Search(SEARCH_TEXTS_CRITERIA)]
+
 def TextMatched(str1, str2):
     return str1 and str2 and (str1.upper() == str2.upper())
 
@@ -167,13 +181,19 @@ def LOAD_POU_INSTANCES_PROJECT_TEMPLATE(body_type):
   </body>
 </pou>""" % locals()
 
-PLCOpen_v1_file = open(os.path.join(os.path.split(__file__)[0], "TC6_XML_V10_B.xsd"))
-PLCOpen_v1_xml = PLCOpen_v1_file.read()
-PLCOpen_v1_file.close()
-PLCOpen_v1_xml = PLCOpen_v1_xml.replace(
-        "http://www.plcopen.org/xml/tc6.xsd", 
-        "http://www.plcopen.org/xml/tc6_0201") 
-PLCOpen_v1_xsd = etree.XMLSchema(etree.fromstring(PLCOpen_v1_xml))
+# PLCOpen v1 schema, only compiled when loading a file not valid in v2
+PLCOpen_v1_xsd = None
+def GetPLCOpen_v1_xsd():
+    global PLCOpen_v1_xsd
+    if PLCOpen_v1_xsd is None:
+        PLCOpen_v1_file = open(os.path.join(os.path.split(__file__)[0], "TC6_XML_V10_B.xsd"))
+        PLCOpen_v1_xml = PLCOpen_v1_file.read()
+        PLCOpen_v1_file.close()
+        PLCOpen_v1_xml = PLCOpen_v1_xml.replace(
+                "http://www.plcopen.org/xml/tc6.xsd", 
+                "http://www.plcopen.org/xml/tc6_0201") 
+        PLCOpen_v1_xsd = etree.XMLSchema(etree.fromstring(PLCOpen_v1_xml))
+    return PLCOpen_v1_xsd
 
 # XPath for file compatibility process
 ProjectResourcesXPath = PLCOpen_XPath("ppx:instances/ppx:configurations/ppx:configuration/ppx:resource")
@@ -183,21 +203,46 @@ ConditionConnectionsXPath = PLCOpen_XPath("ppx:connection")
 ActionBlocksXPath = PLCOpen_XPath("ppx:types/ppx:pous/ppx:pou/ppx:body/*/ppx:actionBlock")
 ActionBlocksConnectionPointOutXPath = PLCOpen_XPath("ppx:connectionPointOut")
 
-def LoadProjectXML(project_xml):
-    project_xml = project_xml.replace(
-        "http://www.plcopen.org/xml/tc6.xsd", 
-        "http://www.plcopen.org/xml/tc6_0201")
-    for cre, repl in [
-        (re.compile("(?<!<xhtml:p>)(?:<!\[CDATA\[)"), "<xhtml:p><![CDATA["),
-        (re.compile("(?:]]>)(?!</xhtml:p>)"), "]]></xhtml:p>")]:
-        project_xml = cre.sub(repl, project_xml)
+def ValidateProjectXML(project_xml, callback):
+    callback(PLCOpenParser.ValidateXMLString(project_xml))
+
+def LoadProjectXML(project_xml, validation_callback=None):
+    """
+    Load project from XML string. If validation callback is given, XSD
+    validation is made in a background thread and its result is given to
+    callback, project is then returned without waiting for it
+    """
+    if project_xml.find("http://www.plcopen.org/xml/tc6.xsd") != -1:
+        project_xml = project_xml.replace(
+            "http://www.plcopen.org/xml/tc6.xsd", 
+            "http://www.plcopen.org/xml/tc6_0201")
+        # PLCOpen v1 files are recognized by validation before being converted
+        validation_callback = None
+    
+    # Scanning big files with regular expressions is slow, so it is only done
+    # when some CDATA are not already enclosed in xhtml paragraphs
+    if (project_xml.count("<![CDATA[") !=
+            project_xml.count("<xhtml:p><![CDATA[") or
+        project_xml.count("]]>") != project_xml.count("]]></xhtml:p>")):
+        for cre, repl in [
+            (re.compile("(?<!<xhtml:p>)(?:<!\[CDATA\[)"), "<xhtml:p><![CDATA["),
+            (re.compile("(?:]]>)(?!</xhtml:p>)"), "]]></xhtml:p>")]:
+            project_xml = cre.sub(repl, project_xml)
     
     try:
-        tree, error = PLCOpenParser.LoadXMLString(project_xml)
+        tree, error = PLCOpenParser.LoadXMLString(
+            project_xml, validation_callback is None)
+        if validation_callback is not None:
+            validation = Thread(target=ValidateProjectXML,
+                                args=(project_xml, validation_callback))
+            validation.setDaemon(True)
+            validation.start()
+            return tree, None
+        
         if error is None:
             return tree, None
         
-        if PLCOpen_v1_xsd.validate(tree):
+        if GetPLCOpen_v1_xsd().validate(tree):
             # Make file compatible with PLCOpen v2
             
             # Update resource interval value
@@ -260,11 +305,11 @@ def LoadProjectXML(project_xml):
     except Exception, e:
         return None, e.message
 
-def LoadProject(filepath):
+def LoadProject(filepath, validation_callback=None):
     project_file = open(filepath)
     project_xml = project_file.read()
     project_file.close()
-    return LoadProjectXML(project_xml)
+    return LoadProjectXML(project_xml, validation_callback)
 
 project_pou_xpath = PLCOpen_XPath("/ppx:project/ppx:types/ppx:pous/ppx:pou")
 def LoadPou(xml_string):
@@ -281,13 +326,29 @@ def LoadPouInstances(xml_string, body_type):
     return project_pou_instances_xpath[body_type](root), error
 
 def SaveProject(project, filepath):
-    project_file = open(filepath, 'w')
-    project_file.write(etree.tostring(
-        project, 
-        pretty_print=True, 
-        xml_declaration=True, 
-        encoding='utf-8'))
-    project_file.close()
+    """
+    Write project into a temporary file that replaces the file at filepath
+    once complete, so that an interrupted save never leaves it truncated
+    """
+    tmp_filepath = filepath + ".tmp"
+    project_file = open(tmp_filepath, 'w')
+    try:
+        project_file.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        etree.ElementTree(project).write(
+            project_file, 
+            pretty_print=True, 
+            encoding='utf-8')
+        project_file.flush()
+        os.fsync(project_file.fileno())
+        project_file.close()
+    except:
+        project_file.close()
+        os.remove(tmp_filepath)
+        raise
+    # Windows can't rename a file over an existing one
+    if os.name == 'nt' and os.path.exists(filepath):
+        os.remove(filepath)
+    os.rename(tmp_filepath, filepath)
 
 cls = PLCOpenParser.GetElementClass("formattedText")
 if cls:
@@ -1664,6 +1725,17 @@ if cls:
             raise TypeError, _("%s body don't have instances!")%self.content.getLocalTag()
     setattr(cls, "getcontentInstance", getcontentInstance)
     
+    def getcontentInstancesById(self):
+        if self.content.getLocalTag() in ["LD","FBD","SFC"]:
+            instances = {}
+            for instance in self.content:
+                # First instance found is kept, as in getcontentInstance
+                instances.setdefault(instance.getlocalId(), instance)
+            return instances
+        else:
+            raise TypeError, _("%s body don't have instances!")%self.content.getLocalTag()
+    setattr(cls, "getcontentInstancesById", getcontentInstancesById)
+    
     def getcontentInstancesIds(self):
         if self.content.getLocalTag() in ["LD","FBD","SFC"]:
             return OrderedDict([(instance.getlocalId(), True)
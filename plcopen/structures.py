@@ -22,13 +22,26 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
-import string, re
+import os, string, re
+import hashlib, cPickle
 from plcopen import LoadProject
 from collections import OrderedDict
 from definitions import *
 
 TypeHierarchy = dict(TypeHierarchy_list)
 
+"""
+Set of the types and meta-types each type is one of, itself included
+"""
+TypeAncestors = {}
+for typename in TypeHierarchy.iterkeys():
+    ancestors = set()
+    ancestor = typename
+    while ancestor is not None:
+        ancestors.add(ancestor)
+        ancestor = TypeHierarchy.get(ancestor)
+    TypeAncestors[typename] = frozenset(ancestors)
+
 """
 returns true if the given data type is the same that "reference" meta-type or one of its types.
 """
@@ -37,17 +50,17 @@ def IsOfType(type, reference):
         return True
     elif type == reference:
         return True
-    else:
-        parent_type = TypeHierarchy[type]
-        if parent_type is not None:
-            return IsOfType(parent_type, reference)
-    return False
+    return reference in TypeAncestors[type]
 
 """
 returns list of all types that correspont to the ANY* meta type
 """
+SubTypes = {}
 def GetSubTypes(type):
-    return [typename for typename, parenttype in TypeHierarchy.items() if not typename.startswith("ANY") and IsOfType(typename, type)]
+    subtypes = SubTypes.get(type)
+    if subtypes is None:
+        subtypes = SubTypes[type] = [typename for typename, parenttype in TypeHierarchy.items() if not typename.startswith("ANY") and IsOfType(typename, type)]
+    return subtypes[:]
 
 DataTypeRange = dict(DataTypeRange_list)
 
@@ -67,11 +80,16 @@ Inputs and outputs are a tuple of characteristics that are in order:
     - The default modifier which can be "none", "negated", "rising" or "falling"
 """
 
-StdBlckLibs = {libname : LoadProject(tc6fname)[0]
-             for libname, tc6fname in StdTC6Libs}
-StdBlckLst = [{"name" : libname, "list":
-               [GetBlockInfos(pous) for pous in lib.getpous()]}
-             for libname, lib in StdBlckLibs.iteritems()]
+StdBlckLibs = None
+def GetStdBlckLibs():
+    """
+    Return projects of standard libraries, only parsed when first needed
+    """
+    global StdBlckLibs
+    if StdBlckLibs is None:
+        StdBlckLibs = {libname : LoadProject(tc6fname)[0]
+                       for libname, tc6fname in StdTC6Libs}
+    return StdBlckLibs
 
 #-------------------------------------------------------------------------------
 #                             Test identifier
@@ -256,7 +274,76 @@ def get_standard_funtions(table):
     
     return Standard_Functions_Decl
 
-StdBlckLst.extend(get_standard_funtions(csv_file_to_table(open(StdFuncsCSV))))
+def GenerateStdBlckLst():
+    blocks = [{"name" : libname, "list":
+               [GetBlockInfos(pous) for pous in lib.getpous()]}
+              for libname, lib in GetStdBlckLibs().iteritems()]
+    blocks.extend(get_standard_funtions(csv_file_to_table(open(StdFuncsCSV))))
+    return blocks
+
+#-------------------------------------------------------------------------------
+#                         Standard blocks list cache
+#-------------------------------------------------------------------------------
+
+# Version of cache content, to increase when blocks description changes
+STD_BLOCKS_CACHE_VERSION = 1
+
+# Files standard blocks list is generated from, including the ones of the
+# parser giving block informations of libraries
+StdBlckSources = [tc6fname for libname, tc6fname in StdTC6Libs] + [
+    StdFuncsCSV, join(sd, "definitions.py"), join(sd, "structures.py"),
+    join(sd, "plcopen.py"), join(sd, "tc6_xml_v201.xsd"),
+    join(sd, "..", "xmlclass", "xmlclass.py"),
+    join(sd, "..", "xmlclass", "xsdschema.py")]
+
+def GetStdBlckSourcesDigest():
+    digest = hashlib.md5()
+    for filepath in StdBlckSources:
+        # Python sources may be missing in frozen distributions
+        if os.path.isfile(filepath):
+            source_file = open(filepath, "rb")
+            digest.update(source_file.read())
+            source_file.close()
+    return digest.hexdigest()
+
+"""
+Return standard blocks list stored in cache if it was generated from current
+source files, generate it and update cache otherwise
+"""
+def LoadStdBlckLst():
+    digest = GetStdBlckSourcesDigest()
+    try:
+        cache_file = open(StdBlckCache, "rb")
+        version, cache_digest, blocks = cPickle.load(cache_file)
+        cache_file.close()
+        if version == STD_BLOCKS_CACHE_VERSION and cache_digest == digest:
+            return blocks
+    except Exception:
+        # Cache is missing or unreadable
+        pass
+    
+    blocks = GenerateStdBlckLst()
+    tmp_filepath = StdBlckCache + ".tmp"
+    try:
+        cache_file = open(tmp_filepath, "wb")
+        try:
+            cPickle.dump((STD_BLOCKS_CACHE_VERSION, digest, blocks),
+                         cache_file, cPickle.HIGHEST_PROTOCOL)
+        finally:
+            cache_file.close()
+        if os.name == 'nt' and os.path.exists(StdBlckCache):
+            os.remove(StdBlckCache)
+        os.rename(tmp_filepath, StdBlckCache)
+    except (IOError, OSError, cPickle.PicklingError, TypeError):
+        # Installation folder can be read only, or blocks description can
+        # contain values that can't be pickled
+        try:
+            os.remove(tmp_filepath)
+        except OSError:
+            pass
+    return blocks
+
+StdBlckLst = LoadStdBlckLst()
 
 # Dictionary to speedup block type fetching by name
 StdBlckDct = OrderedDict()
@@ -274,6 +361,41 @@ for section in StdBlckLst:
         BlkLst = StdBlckDct.setdefault(desc["name"],[])
         BlkLst.append((section["name"], desc))
 
+"""
+Returns the definition of block type given, searched in blocktypes, a dictionary
+of (section name, block definition) lists by block type name, then in project
+POU definitions returned by get_pou_blockinfos. Input types are tested with
+is_of_type
+"""
+def FindBlockType(typename, inputs, blocktypes, get_pou_blockinfos, is_of_type):
+    result_blocktype = None
+    for sectioname, blocktype in blocktypes.get(typename, []):
+        if inputs is not None and inputs != "undefined":
+            block_inputs = tuple([var_type for name, var_type, modifier in blocktype["inputs"]])
+            if reduce(lambda x, y: x and y, map(lambda x: x[0] == "ANY" or is_of_type(*x), zip(inputs, block_inputs)), True):
+                return blocktype
+        else:
+            if result_blocktype is not None:
+                if inputs == "undefined":
+                    return None
+                else:
+                    result_blocktype["inputs"] = [(i[0], "ANY", i[2]) for i in result_blocktype["inputs"]]
+                    result_blocktype["outputs"] = [(o[0], "ANY", o[2]) for o in result_blocktype["outputs"]]
+                    return result_blocktype
+            result_blocktype = blocktype.copy()
+    if result_blocktype is not None:
+        return result_blocktype
+    blocktype_infos = get_pou_blockinfos(typename)
+    if blocktype_infos is not None:
+        if inputs in [None, "undefined"]:
+            return blocktype_infos
+
+        if inputs == tuple([var_type
+            for name, var_type, modifier in blocktype_infos["inputs"]]):
+            return blocktype_infos
+
+    return None
+
 #-------------------------------------------------------------------------------
 #                            Languages Keywords
 #-------------------------------------------------------------------------------
@@ -1,202 +1,476 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-
-# This file is part of Beremiz, a Integrated Development Environment for
-# programming IEC 61131-3 automates supporting plcopen standard and CanFestival.
-#
-# Copyright (C) 2007: Edouard TISSERANT and Laurent BESSARD
-#
-# See COPYING file for copyrights details.
-#
-# This program is free software; you can redistribute it and/or
-# modify it under the terms of the GNU General Public License
-# as published by the Free Software Foundation; either version 2
-# of the License, or (at your option) any later version.
-#
-# This program is distributed in the hope that it will be useful,
-# but WITHOUT ANY WARRANTY; without even the implied warranty of
-# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
-# GNU General Public License for more details.
-#
-# You should have received a copy of the GNU General Public License
-# along with this program; if not, write to the Free Software
-# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
-
-import os, re, operator
-from util.ProcessLogger import ProcessLogger
-import hashlib
-
-includes_re =  re.compile('\s*#include\s*["<]([^">]*)[">].*')
-
-class toolchain_gcc():
-    """
-    This abstract class contains GCC specific code.
-    It cannot be used as this and should be inherited in a target specific
-    class such as target_linux or target_win32
-    """
-    def __init__(self, CTRInstance):
-        self.CTRInstance = CTRInstance
-        self.buildpath = None
-        self.SetBuildPath(self.CTRInstance._getBuildPath())
-    
-    def getBuilderCFLAGS(self):
-        """
-        Returns list of builder specific CFLAGS
-        """
-        return [self.CTRInstance.GetTarget().getcontent().getCFLAGS()]
-
-    def getBuilderLDFLAGS(self):
-        """
-        Returns list of builder specific LDFLAGS
-        """
-        return self.CTRInstance.LDFLAGS + \
-               [self.CTRInstance.GetTarget().getcontent().getLDFLAGS()]
-
-    def GetBinaryCode(self):
-        try:
-            return open(self.exe_path, "rb").read()
-        except Exception, e:
-            return None
-        
-    def _GetMD5FileName(self):
-        return os.path.join(self.buildpath, "lastbuildPLC.md5")
-
-    def ResetBinaryCodeMD5(self):
-        self.md5key = None
-        try:
-            os.remove(self._GetMD5FileName())
-        except Exception, e:
-            pass
-    
-    def GetBinaryCodeMD5(self):
-        if self.md5key is not None:
-            return self.md5key
-        else:
-            try:
-                return open(self._GetMD5FileName(), "r").read()
-            except Exception, e:
-                return None
-    
-    def SetBuildPath(self, buildpath):
-        if self.buildpath != buildpath:
-            self.buildpath = buildpath
-            self.exe = self.CTRInstance.GetProjectName() + self.extension
-            self.exe_path = os.path.join(self.buildpath, self.exe)
-            self.md5key = None
-            self.srcmd5 = {}
-    
-    def check_and_update_hash_and_deps(self, bn):
-        # Get latest computed hash and deps
-        oldhash, deps = self.srcmd5.get(bn,(None,[]))
-        # read source
-        src = open(os.path.join(self.buildpath, bn)).read()
-        # compute new hash
-        newhash = hashlib.md5(src).hexdigest()
-        # compare
-        match = (oldhash == newhash)
-        if not match:
-            # file have changed
-            # update direct dependencies
-            deps = []
-            for l in src.splitlines():
-                res = includes_re.match(l)
-                if res is not None:
-                    depfn = res.groups()[0]
-                    if os.path.exists(os.path.join(self.buildpath, depfn)):
-                        #print bn + " depends on "+depfn
-                        deps.append(depfn)
-            # store that hashand deps
-            self.srcmd5[bn] = (newhash, deps)
-        # recurse through deps
-        # TODO detect cicular deps.
-        return reduce(operator.and_, map(self.check_and_update_hash_and_deps, deps), match)
-                
-    def build(self):
-        # Retrieve toolchain user parameters
-        toolchain_params = self.CTRInstance.GetTarget().getcontent()
-        self.compiler = toolchain_params.getCompiler()
-        self.linker = toolchain_params.getLinker()
-
-        Builder_CFLAGS = ' '.join(self.getBuilderCFLAGS())
-
-        ######### GENERATE OBJECT FILES ########################################
-        obns = []
-        objs = []
-        relink = self.GetBinaryCode() is None
-        for Location, CFilesAndCFLAGS, DoCalls in self.CTRInstance.LocationCFilesAndCFLAGS:
-            if CFilesAndCFLAGS:
-                if Location :
-                    self.CTRInstance.logger.write(".".join(map(str,Location))+" :\n")
-                else:
-                    self.CTRInstance.logger.write(_("PLC :\n"))
-                
-            for CFile, CFLAGS in CFilesAndCFLAGS:
-                if CFile.endswith(".c"):
-                    bn = os.path.basename(CFile)
-                    obn = os.path.splitext(bn)[0]+".o"
-                    objectfilename = os.path.splitext(CFile)[0]+".o"
-
-                    match = self.check_and_update_hash_and_deps(bn)
-                    
-                    if match:
-                        self.CTRInstance.logger.write("   [pass]  "+bn+" -> "+obn+"\n")
-                    else:
-                        relink = True
-
-                        self.CTRInstance.logger.write("   [CC]  "+bn+" -> "+obn+"\n")
-                        
-                        status, result, err_result = ProcessLogger(
-                               self.CTRInstance.logger,
-                               "\"%s\" -c \"%s\" -o \"%s\" %s %s"%
-                                   (self.compiler, CFile, objectfilename, Builder_CFLAGS, CFLAGS)
-                               ).spin()
-
-                        if status :
-                            self.srcmd5.pop(bn)
-                            self.CTRInstance.logger.write_error(_("C compilation of %s failed.\n")%bn)
-                            return False
-                    obns.append(obn)
-                    objs.append(objectfilename)
-                elif CFile.endswith(".o"):
-                    obns.append(os.path.basename(CFile))
-                    objs.append(CFile)
-
-        ######### GENERATE library FILE ########################################
-        # Link all the object files into one binary file
-        self.CTRInstance.logger.write(_("Linking :\n"))
-        if relink:
-            objstring = []
-    
-            # Generate list .o files
-            listobjstring = '"' + '"  "'.join(objs) + '"'
-    
-            ALLldflags = ' '.join(self.getBuilderLDFLAGS())
-    
-            self.CTRInstance.logger.write("   [CC]  " + ' '.join(obns)+" -> " + self.exe + "\n")
-    
-            status, result, err_result = ProcessLogger(
-                   self.CTRInstance.logger,
-                   "\"%s\" %s -o \"%s\" %s"%
-                       (self.linker,
-                        listobjstring,
-                        self.exe_path,
-                        ALLldflags)
-                   ).spin()
-            
-            if status :
-                return False
-                
-        else:
-            self.CTRInstance.logger.write("   [pass]  " + ' '.join(obns)+" -> " + self.exe + "\n")
-        
-        # Calculate md5 key and get data for the new created PLC
-        data=self.GetBinaryCode()
-        self.md5key = hashlib.md5(data).hexdigest()
-
-        # Store new PLC filename based on md5 key
-        f = open(self._GetMD5FileName(), "w")
-        f.write(self.md5key)
-        f.close()
-        
-        return True
-
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of Beremiz, a Integrated Development Environment for
+# programming IEC 61131-3 automates supporting plcopen standard and CanFestival.
+#
+# Copyright (C) 2007: Edouard TISSERANT and Laurent BESSARD
+#
+# See COPYING file for copyrights details.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os, re, operator, shutil
+from util.ProcessLogger import ProcessLogger
+import hashlib
+
+includes_re =  re.compile('\s*#include\s*["<]([^">]*)[">].*')
+includedirs_re = re.compile('"-I([^"]*)"|-I\s*"([^"]*)"|-I\s*([^\s"]+)')
+# Debug flags and source macros making object files embed source file paths
+debugflags_re = re.compile('(?:^|\s)"?-g')
+pathmacros_re = re.compile(r'\b(?:__FILE__|__BASE_FILE__|assert)\b')
+
+# Files generated in build directory for unity build and precompiled header
+UNITY_BUILD_FILENAME = "plc_unity.c"
+PRECOMPILED_HEADER_FILENAME = "plc_pch.h"
+# Headers included by all PLC C files generated by iec2c
+PRECOMPILED_HEADERS = ["iec_std_lib.h", "accessor.h"]
+
+class toolchain_gcc():
+    """
+    This abstract class contains GCC specific code.
+    It cannot be used as this and should be inherited in a target specific
+    class such as target_linux or target_win32
+    """
+    def __init__(self, CTRInstance):
+        self.CTRInstance = CTRInstance
+        self.buildpath = None
+        self.SetBuildPath(self.CTRInstance._getBuildPath())
+    
+    def getBuilderCFLAGS(self):
+        """
+        Returns list of builder specific CFLAGS
+        """
+        return [self.CTRInstance.GetTarget().getcontent().getCFLAGS()]
+
+    def getBuilderLDFLAGS(self):
+        """
+        Returns list of builder specific LDFLAGS
+        """
+        return self.CTRInstance.LDFLAGS + \
+               [self.CTRInstance.GetTarget().getcontent().getLDFLAGS()]
+
+    def GetBinaryCode(self):
+        try:
+            return open(self.exe_path, "rb").read()
+        except Exception, e:
+            return None
+        
+    def _GetMD5FileName(self):
+        return os.path.join(self.buildpath, "lastbuildPLC.md5")
+
+    def ResetBinaryCodeMD5(self):
+        self.md5key = None
+        try:
+            os.remove(self._GetMD5FileName())
+        except Exception, e:
+            pass
+    
+    def GetBinaryCodeMD5(self):
+        if self.md5key is not None:
+            return self.md5key
+        else:
+            try:
+                return open(self._GetMD5FileName(), "r").read()
+            except Exception, e:
+                return None
+    
+    def SetBuildPath(self, buildpath):
+        if self.buildpath != buildpath:
+            self.buildpath = buildpath
+            self.exe = self.CTRInstance.GetProjectName() + self.extension
+            self.exe_path = os.path.join(self.buildpath, self.exe)
+            self.md5key = None
+            self.srcmd5 = {}
+            # source -> included files that are not in build directory
+            self.srcincludes = {}
+            # source -> True if source expands to its own path
+            self.srcpathrefs = {}
+            # object file -> signature of sources and flags it was built from
+            self.objmd5 = {}
+            self.pch_signature = None
+            self.linkedobjs = None
+    
+    def check_and_update_hash_and_deps(self, bn):
+        # Get latest computed hash and deps
+        oldhash, deps = self.srcmd5.get(bn,(None,[]))
+        # read source
+        src = open(os.path.join(self.buildpath, bn)).read()
+        # compute new hash
+        newhash = hashlib.md5(src).hexdigest()
+        # compare
+        match = (oldhash == newhash)
+        if not match:
+            # file have changed
+            # update direct dependencies
+            deps = []
+            includes = []
+            for l in src.splitlines():
+                res = includes_re.match(l)
+                if res is not None:
+                    depfn = res.groups()[0]
+                    if os.path.exists(os.path.join(self.buildpath, depfn)):
+                        #print bn + " depends on "+depfn
+                        deps.append(depfn)
+                    else:
+                        includes.append(depfn)
+            # store that hashand deps
+            self.srcmd5[bn] = (newhash, deps)
+            self.srcincludes[bn] = includes
+            self.srcpathrefs[bn] = pathmacros_re.search(src) is not None
+        # recurse through deps
+        # TODO detect cicular deps.
+        return reduce(operator.and_, map(self.check_and_update_hash_and_deps, deps), match)
+
+    def get_source_hashes(self, bn, hashes=None):
+        """
+        Returns list of (filename, hash) for source and all its dependencies
+        as computed by check_and_update_hash_and_deps
+        """
+        if hashes is None:
+            hashes = {}
+        if bn not in hashes and bn in self.srcmd5:
+            srchash, deps = self.srcmd5[bn]
+            hashes[bn] = srchash
+            for dep in deps:
+                self.get_source_hashes(dep, hashes)
+        return sorted(hashes.items())
+
+    def get_include_dirs(self, CFLAGS):
+        """
+        Returns list of include directories given to compiler
+        """
+        return ["".join(groups) for groups in
+                includedirs_re.findall(" ".join([self.Builder_CFLAGS, CFLAGS]))]
+
+    def get_included_file_hashes(self, fn, dirs, hashes):
+        """
+        Add hash of included file and of all the files it includes, resolved
+        in given include directories, to hashes
+        """
+        for d in dirs:
+            path = os.path.join(d, fn)
+            if os.path.isfile(path):
+                break
+        else:
+            # system headers are identified by compiler command
+            return
+        if path in hashes:
+            return
+        src = open(path).read()
+        hashes[path] = hashlib.md5(src).hexdigest()
+        # quoted includes are first searched in directory of including file
+        dirs = [os.path.dirname(path)] + [d for d in dirs
+                                          if d != os.path.dirname(path)]
+        for l in src.splitlines():
+            res = includes_re.match(l)
+            if res is not None:
+                self.get_included_file_hashes(res.groups()[0], dirs, hashes)
+
+    def get_object_signature(self, bn, CFLAGS, extra_key=""):
+        """
+        Returns hash of compilation command, source file and its dependencies,
+        including files out of build directory such as IEC library headers,
+        and of build path if object file embeds it
+        """
+        # build path is replaced, so that builds of different projects
+        # compiling the same source get the same signature
+        flags = " ".join([self.compiler, self.Builder_CFLAGS, CFLAGS, extra_key])
+        key = hashlib.md5(flags.replace(self.buildpath, "@BUILDPATH@"))
+        source_hashes = self.get_source_hashes(bn)
+        # unless object file embeds path of sources in build directory, in
+        # debug informations or through __FILE__ (used by assert)
+        if debugflags_re.search(flags) is not None or \
+           any([self.srcpathrefs.get(filename, False)
+                for filename, srchash in source_hashes]):
+            key.update("\n@BUILDPATH@:%s" % self.buildpath)
+        dirs = self.get_include_dirs(CFLAGS)
+        included_hashes = {}
+        for filename, srchash in source_hashes:
+            key.update("\n%s:%s" % (filename, srchash))
+            for fn in self.srcincludes.get(filename, []):
+                self.get_included_file_hashes(fn, dirs, included_hashes)
+        for path, srchash in sorted(included_hashes.items()):
+            key.update("\n%s:%s" % (path.replace(self.buildpath, "@BUILDPATH@"), srchash))
+        return key.hexdigest()
+
+    def get_object_cache_filename(self, signature):
+        """
+        Returns path of cached object file matching signature, or None if
+        cache is disabled
+        """
+        cachepath = self.CTRInstance.GetObjectCachePath()
+        if cachepath is None:
+            return None
+        return os.path.join(cachepath, signature + ".o")
+
+    def store_object_in_cache(self, objectfilename, cachedfilename):
+        # copy to a temporary file first and rename it, so that concurrent
+        # builds never see a partially written object file
+        try:
+            cachepath = os.path.dirname(cachedfilename)
+            if not os.path.isdir(cachepath):
+                os.makedirs(cachepath)
+            tmpfilename = "%s.%d.tmp" % (cachedfilename, os.getpid())
+            shutil.copyfile(objectfilename, tmpfilename)
+            os.rename(tmpfilename, cachedfilename)
+        except Exception, e:
+            self.CTRInstance.logger.write_warning(
+                _("Cannot store %s in object cache: %s\n") % (objectfilename, str(e)))
+
+
+    def compile_file(self, CFile, CFLAGS, extra_key=""):
+        """
+        Compile C file into object file, unless its sources and flags didn't
+        change since last compilation.
+        Returns (object file name, object file path, compiled), or None if
+        compilation failed
+        """
+        bn = os.path.basename(CFile)
+        obn = os.path.splitext(bn)[0]+".o"
+        objectfilename = os.path.splitext(CFile)[0]+".o"
+
+        self.check_and_update_hash_and_deps(bn)
+        signature = self.get_object_signature(bn, CFLAGS, extra_key)
+
+        if self.objmd5.get(objectfilename) == signature and \
+           os.path.isfile(objectfilename):
+            self.CTRInstance.logger.write("   [pass]  "+bn+" -> "+obn+"\n")
+            return obn, objectfilename, False
+        self.objmd5.pop(objectfilename, None)
+
+        cachedfilename = self.get_object_cache_filename(signature)
+        if cachedfilename is not None and os.path.isfile(cachedfilename):
+            self.CTRInstance.logger.write("   [cache]  "+bn+" -> "+obn+"\n")
+            shutil.copyfile(cachedfilename, objectfilename)
+        else:
+            self.CTRInstance.logger.write("   [CC]  "+bn+" -> "+obn+"\n")
+
+            status, result, err_result = ProcessLogger(
+                   self.CTRInstance.logger,
+                   "\"%s\" -c \"%s\" -o \"%s\" %s %s"%
+                       (self.compiler, CFile, objectfilename, self.Builder_CFLAGS, CFLAGS)
+                   ).spin()
+
+            if status :
+                self.srcmd5.pop(bn, None)
+                return None
+
+            if cachedfilename is not None:
+                self.store_object_in_cache(objectfilename, cachedfilename)
+
+        self.objmd5[objectfilename] = signature
+        return obn, objectfilename, True
+
+    def get_unity_build_files(self, CFilesAndCFLAGS):
+        """
+        Replace C files generated by iec2c by a single C file including them
+        all, so that common headers are parsed only once.
+        Returns new list of C files and CFLAGS, and list of replaced files,
+        None if files can't be merged
+        """
+        PLCCFiles = getattr(self.CTRInstance, "PLCGeneratedCFiles", [])
+        unity_files = [(CFile, CFLAGS) for CFile, CFLAGS in CFilesAndCFLAGS
+                       if CFile in PLCCFiles]
+        if len(unity_files) < 2 or \
+           len(set([CFLAGS for CFile, CFLAGS in unity_files])) > 1:
+            return CFilesAndCFLAGS, None
+
+        # files including the same C file (POUS.c is included by each
+        # resource) would define its content twice in unity build
+        included = []
+        for CFile, CFLAGS in unity_files:
+            bn = os.path.basename(CFile)
+            self.check_and_update_hash_and_deps(bn)
+            for dep in self.srcmd5[bn][1]:
+                if dep.endswith(".c"):
+                    if dep in included:
+                        return CFilesAndCFLAGS, None
+                    included.append(dep)
+
+        unity_code = "".join(['#include "%s"\n' % os.path.basename(CFile)
+                              for CFile, CFLAGS in unity_files])
+        unity_path = os.path.join(self.buildpath, UNITY_BUILD_FILENAME)
+        if not os.path.isfile(unity_path) or \
+           open(unity_path).read() != unity_code:
+            open(unity_path, "w").write(unity_code)
+
+        files = []
+        for CFile, CFLAGS in CFilesAndCFLAGS:
+            if CFile == unity_files[0][0]:
+                files.append((unity_path, CFLAGS))
+            elif (CFile, CFLAGS) not in unity_files:
+                files.append((CFile, CFLAGS))
+        return files, unity_files
+
+    def build_precompiled_header(self, CFLAGS):
+        """
+        Precompile headers included by all C files generated by iec2c.
+        Returns CFLAGS making compiler use precompiled header, empty if
+        precompilation failed
+        """
+        headerfilename = os.path.join(self.buildpath, PRECOMPILED_HEADER_FILENAME)
+        pchfilename = headerfilename + ".gch"
+        pch_CFLAGS = "-include \"%s\" -Winvalid-pch" % headerfilename
+
+        # library headers are not in build directory, they are not followed
+        # by check_and_update_hash_and_deps
+        key = hashlib.md5(" ".join([self.compiler, self.Builder_CFLAGS, CFLAGS]))
+        libpath = self.CTRInstance.GetIECLibPath()
+        for fname in sorted(os.listdir(libpath)):
+            if fname.endswith(".h"):
+                key.update("\n%s:%s" % (fname, hashlib.md5(
+                    open(os.path.join(libpath, fname)).read()).hexdigest()))
+        signature = key.hexdigest()
+
+        if self.pch_signature == signature and os.path.isfile(pchfilename):
+            self.CTRInstance.logger.write("   [pass]  "+PRECOMPILED_HEADER_FILENAME+" -> "+PRECOMPILED_HEADER_FILENAME+".gch\n")
+            return pch_CFLAGS
+        self.pch_signature = None
+
+        open(headerfilename, "w").write("".join(
+            ['#include "%s"\n' % header for header in PRECOMPILED_HEADERS]))
+
+        self.CTRInstance.logger.write("   [CC]  "+PRECOMPILED_HEADER_FILENAME+" -> "+PRECOMPILED_HEADER_FILENAME+".gch\n")
+        status, result, err_result = ProcessLogger(
+               self.CTRInstance.logger,
+               "\"%s\" -x c-header \"%s\" -o \"%s\" %s %s"%
+                   (self.compiler, headerfilename, pchfilename, self.Builder_CFLAGS, CFLAGS)
+               ).spin()
+        if status :
+            self.CTRInstance.logger.write_warning(_("Headers precompilation failed, headers will be parsed by each C file.\n"))
+            if os.path.isfile(pchfilename):
+                os.remove(pchfilename)
+            return ""
+
+        self.pch_signature = signature
+        return pch_CFLAGS
+
+    def build(self):
+        # Retrieve toolchain user parameters
+        toolchain_params = self.CTRInstance.GetTarget().getcontent()
+        self.compiler = toolchain_params.getCompiler()
+        self.linker = toolchain_params.getLinker()
+
+        Builder_CFLAGS = ' '.join(self.getBuilderCFLAGS())
+        self.Builder_CFLAGS = Builder_CFLAGS
+
+        PLCCFiles = getattr(self.CTRInstance, "PLCGeneratedCFiles", [])
+        # headers are precompiled once for all PLC C files, compiler ignoring
+        # precompiled header for files compiled with other CFLAGS
+        pch_CFLAGS = None
+        if toolchain_params.getPrecompiledHeaders():
+            PLCCFLAGS = set([CFLAGS
+                for Location, CFilesAndCFLAGS, DoCalls in self.CTRInstance.LocationCFilesAndCFLAGS
+                for CFile, CFLAGS in CFilesAndCFLAGS
+                if CFile in PLCCFiles])
+            if len(PLCCFLAGS) == 1:
+                pch_CFLAGS = self.build_precompiled_header(PLCCFLAGS.pop())
+            elif len(PLCCFLAGS) > 1:
+                self.CTRInstance.logger.write_warning(_("Headers not precompiled, since PLC C files are compiled with different CFLAGS.\n"))
+
+        ######### GENERATE OBJECT FILES ########################################
+        obns = []
+        objs = []
+        relink = not os.path.isfile(self.exe_path)
+        for Location, CFilesAndCFLAGS, DoCalls in self.CTRInstance.LocationCFilesAndCFLAGS:
+            if CFilesAndCFLAGS:
+                if Location :
+                    self.CTRInstance.logger.write(".".join(map(str,Location))+" :\n")
+                else:
+                    self.CTRInstance.logger.write(_("PLC :\n"))
+
+            unity_files = None
+            if toolchain_params.getUnityBuild():
+                CFilesAndCFLAGS, unity_files = self.get_unity_build_files(CFilesAndCFLAGS)
+
+            for CFile, CFLAGS in CFilesAndCFLAGS:
+                if CFile.endswith(".c"):
+                    if unity_files is not None and \
+                       os.path.basename(CFile) == UNITY_BUILD_FILENAME:
+                        sources = [UnityCFile for UnityCFile, UnityCFLAGS in unity_files]
+                    else:
+                        sources = [CFile]
+
+                    extra_key = ""
+                    if pch_CFLAGS and sources[0] in PLCCFiles:
+                        CFLAGS = CFLAGS + " " + pch_CFLAGS
+                        extra_key = self.pch_signature
+
+                    res = self.compile_file(CFile, CFLAGS, extra_key)
+                    results = [res]
+                    if res is None and len(sources) > 1:
+                        self.CTRInstance.logger.write_warning(_("Unity build of PLC code failed, compiling files separately.\n"))
+                        results = []
+                        for CFile in sources:
+                            res = self.compile_file(CFile, CFLAGS, extra_key)
+                            if res is None:
+                                break
+                            results.append(res)
+
+                    if res is None:
+                        self.CTRInstance.logger.write_error(_("C compilation of %s failed.\n")%os.path.basename(CFile))
+                        return False
+                    for obn, objectfilename, compiled in results:
+                        relink = relink or compiled
+                        obns.append(obn)
+                        objs.append(objectfilename)
+                elif CFile.endswith(".o"):
+                    obns.append(os.path.basename(CFile))
+                    objs.append(CFile)
+
+        ######### GENERATE library FILE ########################################
+        # Link all the object files into one binary file
+        self.CTRInstance.logger.write(_("Linking :\n"))
+        # object files list changes when unity build is switched
+        if relink or objs != self.linkedobjs:
+            objstring = []
+    
+            # Generate list .o files
+            listobjstring = '"' + '"  "'.join(objs) + '"'
+    
+            ALLldflags = ' '.join(self.getBuilderLDFLAGS())
+    
+            self.CTRInstance.logger.write("   [CC]  " + ' '.join(obns)+" -> " + self.exe + "\n")
+    
+            status, result, err_result = ProcessLogger(
+                   self.CTRInstance.logger,
+                   "\"%s\" %s -o \"%s\" %s"%
+                       (self.linker,
+                        listobjstring,
+                        self.exe_path,
+                        ALLldflags)
+                   ).spin()
+            
+            if status :
+                self.linkedobjs = None
+                return False
+
+            self.linkedobjs = objs
+
+        else:
+            self.CTRInstance.logger.write("   [pass]  " + ' '.join(obns)+" -> " + self.exe + "\n")
+        
+        # Calculate md5 key and get data for the new created PLC
+        data=self.GetBinaryCode()
+        self.md5key = hashlib.md5(data).hexdigest()
+
+        # Store new PLC filename based on md5 key
+        f = open(self._GetMD5FileName(), "w")
+        f.write(self.md5key)
+        f.close()
+        
+        return True
+
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of Beremiz, a Integrated Development Environment for
+# programming IEC 61131-3 automates supporting plcopen standard and CanFestival.
+#
+# Copyright (C) 2007: Edouard TISSERANT and Laurent BESSARD
+#
+# See COPYING file for copyrights details.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""
+Build regression benchmark
+
+Build the test projects without GUI, collect the timing report of each build
+and compare phase durations against a stored baseline.
+
+Like Beremiz_cli.py, it requires wxPython to be installed, and matiec to build
+the projects.
+"""
+
+import os, sys, getopt
+import json
+import shutil
+import tempfile
+import __builtin__
+
+tests_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+beremiz_dir = os.path.dirname(tests_dir)
+sys.path.insert(0, beremiz_dir)
+
+__builtin__.__dict__["_"] = lambda x: x
+__builtin__.__dict__["BMZ_DBG"] = False
+
+from ProjectController import ProjectController
+from util.BuildReport import LoadBuildReport
+from util.ConsoleLogger import ConsoleLogger
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                "build_benchmark_baseline.json")
+
+# Relative slowdown of a phase reported as a regression
+DEFAULT_TOLERANCE = 0.2
+# Phases shorter than this duration in seconds are too noisy to be compared
+MIN_COMPARED_DURATION = 0.05
+
+# Optional gcc toolchain build modes, with the target attribute enabling them
+BUILD_MODES = {"unity": "UnityBuild",
+               "pch": "PrecompiledHeaders"}
+
+def GetTestProjects():
+    return sorted([
+        os.path.join(tests_dir, name) for name in os.listdir(tests_dir)
+        if os.path.isfile(os.path.join(tests_dir, name, "plc.xml"))])
+
+def SetBuildModes(controller, modes):
+    """
+    Enable given build modes in project target, if its toolchain supports them
+    """
+    target = controller.GetTarget()
+    controller.BeremizRoot.setTargetType(target)
+    for mode in modes:
+        setter = getattr(target.getcontent(), "set" + BUILD_MODES[mode], None)
+        if setter is not None:
+            setter(True)
+
+def BuildProject(project_path, verbose, modes=[]):
+    """
+    Build project in a temporary build directory and return its build report
+    """
+    buildpath = tempfile.mkdtemp(prefix="beremiz_bench_")
+    try:
+        controller = ProjectController(None, ConsoleLogger(verbose=verbose))
+        result, error = controller.LoadProject(project_path, buildpath)
+        if result:
+            sys.stderr.write("%s: %s\n" % (project_path, result))
+            return None
+        SetBuildModes(controller, modes)
+        controller.Build()
+        return LoadBuildReport(buildpath)
+    finally:
+        shutil.rmtree(buildpath, ignore_errors=True)
+
+def GetTimings(report):
+    timings = {"total": report["duration"]}
+    for phase in report["phases"] + report["extensions"]:
+        timings[phase["name"]] = phase["duration"]
+    return timings
+
+def BenchmarkProject(project_path, repeat, verbose, modes=[]):
+    """
+    Return the lowest duration of each phase over several builds of project
+    """
+    timings = None
+    for i in xrange(repeat):
+        report = BuildProject(project_path, verbose, modes)
+        if report is None or not report["success"]:
+            return None
+        if timings is None:
+            timings = GetTimings(report)
+        else:
+            for name, duration in GetTimings(report).iteritems():
+                timings[name] = min(timings.get(name, duration), duration)
+    return timings
+
+def CompareTimings(project_name, timings, baseline, tolerance):
+    regressions = []
+    for name in sorted(timings.keys()):
+        duration = timings[name]
+        reference = baseline.get(name)
+        if reference is None:
+            print "  %-28s %8.3fs" % (name, duration)
+            continue
+        ratio = (duration - reference) / reference if reference > 0 else 0.
+        regression = (ratio > tolerance and
+                      max(duration, reference) >= MIN_COMPARED_DURATION)
+        print "  %-28s %8.3fs %8.3fs %+7.1f%%%s" % (
+            name, duration, reference, ratio * 100,
+            " REGRESSION" if regression else "")
+        if regression:
+            regressions.append((project_name, name))
+    return regressions
+
+def usage():
+    print "\nUsage of BuildBenchmark.py :"
+    print "\n   %s [options] [Projectpath...]\n" % sys.argv[0]
+    print "   -b, --baseline=FILE     baseline file (default %s)" % DEFAULT_BASELINE
+    print "   -u, --update-baseline   store measured timings as new baseline"
+    print "   -r, --repeat=N          keep best of N builds (default 1)"
+    print "   -t, --tolerance=RATIO   accepted slowdown (default %.2f)" % DEFAULT_TOLERANCE
+    print "   -m, --modes=LIST        comma separated gcc build modes to enable (%s)" % ",".join(sorted(BUILD_MODES.keys()))
+    print "                           timings are stored in baseline by project and modes"
+    print "   -c, --compare-default   compare timings of build modes with timings of"
+    print "                           default builds made in the same run, not baseline"
+    print "   -v, --verbose           show build log\n"
+
+if __name__ == '__main__':
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hb:ur:t:m:cv",
+            ["help", "baseline=", "update-baseline", "repeat=",
+             "tolerance=", "modes=", "compare-default", "verbose"])
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+
+    baseline_path = DEFAULT_BASELINE
+    update_baseline = False
+    repeat = 1
+    tolerance = DEFAULT_TOLERANCE
+    verbose = False
+    modes = []
+    compare_default = False
+    for o, a in opts:
+        if o in ("-h", "--help"):
+            usage()
+            sys.exit()
+        elif o in ("-b", "--baseline"):
+            baseline_path = a
+        elif o in ("-u", "--update-baseline"):
+            update_baseline = True
+        elif o in ("-r", "--repeat"):
+            repeat = max(1, int(a))
+        elif o in ("-t", "--tolerance"):
+            tolerance = float(a)
+        elif o in ("-m", "--modes"):
+            modes = [mode for mode in a.split(",") if mode]
+            for mode in modes:
+                if mode not in BUILD_MODES:
+                    print "Unknown build mode %s" % mode
+                    usage()
+                    sys.exit(2)
+        elif o in ("-c", "--compare-default"):
+            compare_default = True
+        elif o in ("-v", "--verbose"):
+            verbose = True
+
+    projects = [os.path.realpath(path) for path in args] or GetTestProjects()
+
+    baseline = {}
+    if os.path.isfile(baseline_path):
+        baseline_file = open(baseline_path)
+        baseline = json.load(baseline_file)
+        baseline_file.close()
+
+    results = {}
+    failed = []
+    regressions = []
+    for project_path in projects:
+        project_name = os.path.basename(project_path)
+        if modes:
+            project_name += "[%s]" % ",".join(sorted(modes))
+        print "%s:" % project_name
+        reference = baseline.get(project_name, {})
+        # Default builds are made just before mode builds, so that both are
+        # measured in the same conditions
+        if compare_default and modes:
+            reference = BenchmarkProject(project_path, repeat, verbose)
+            if reference is None:
+                print "  default build failed"
+                failed.append(os.path.basename(project_path))
+                continue
+        timings = BenchmarkProject(project_path, repeat, verbose, modes)
+        if timings is None:
+            print "  build failed"
+            failed.append(project_name)
+            continue
+        results[project_name] = timings
+        regressions.extend(CompareTimings(
+            project_name, timings, reference, tolerance))
+
+    if update_baseline:
+        baseline.update(results)
+        baseline_file = open(baseline_path, "w")
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        baseline_file.close()
+        print "\nBaseline written to %s" % baseline_path
+
+    if failed:
+        print "\nFailed builds: %s" % ", ".join(failed)
+    if regressions:
+        print "\nRegressions:"
+        for project_name, name in regressions:
+            print "  %s: %s" % (project_name, name)
+    sys.exit(1 if regressions or failed else 0)
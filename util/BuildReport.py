@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of Beremiz, a Integrated Development Environment for
+# programming IEC 61131-3 automates supporting plcopen standard and CanFestival.
+#
+# Copyright (C) 2007: Edouard TISSERANT and Laurent BESSARD
+#
+# See COPYING file for copyrights details.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""
+Timing report of the phases of a project build
+"""
+
+import os
+import json
+import time
+from contextlib import contextmanager
+
+# Name of the report file written in build directory
+BUILD_REPORT_FILENAME = "build_report.json"
+
+class BuildReport:
+    """
+    Record the duration of each build phase and of C code generation of
+    each extension
+    """
+
+    def __init__(self, project_name):
+        self.ProjectName = project_name
+        self.StartTime = time.time()
+        self.Duration = None
+        self.Success = False
+        self.Phases = []
+        self.Extensions = []
+
+    @contextmanager
+    def Phase(self, name):
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.Phases.append((name, time.time() - start_time))
+
+    def AddExtensionTiming(self, name, duration):
+        self.Extensions.append((name, duration))
+
+    def Finish(self, success):
+        self.Success = success
+        self.Duration = time.time() - self.StartTime
+
+    def GetSummary(self):
+        lines = [_("Build timing (%.3fs):\n") % self.Duration]
+        for name, duration in self.Phases:
+            lines.append("  %-24s %8.3fs\n" % (name, duration))
+        for name, duration in self.Extensions:
+            lines.append("    %-22s %8.3fs\n" % (name, duration))
+        return "".join(lines)
+
+    def Save(self, buildpath):
+        report_file = open(os.path.join(buildpath, BUILD_REPORT_FILENAME), "w")
+        json.dump({
+            "project": self.ProjectName,
+            "date": time.strftime("%Y-%m-%d %H:%M:%S",
+                                  time.localtime(self.StartTime)),
+            "success": self.Success,
+            "duration": self.Duration,
+            "phases": [{"name": name, "duration": duration}
+                       for name, duration in self.Phases],
+            "extensions": [{"name": name, "duration": duration}
+                           for name, duration in self.Extensions]},
+            report_file, indent=2)
+        report_file.close()
+
+def LoadBuildReport(buildpath):
+    """
+    Return the report of the last build made in build directory, or None
+    """
+    report_path = os.path.join(buildpath, BUILD_REPORT_FILENAME)
+    if not os.path.isfile(report_path):
+        return None
+    report_file = open(report_path)
+    report = json.load(report_file)
+    report_file.close()
+    return report
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of Beremiz, a Integrated Development Environment for
+# programming IEC 61131-3 automates supporting plcopen standard and CanFestival.
+#
+# Copyright (C) 2007: Edouard TISSERANT and Laurent BESSARD
+#
+# See COPYING file for copyrights details.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import sys
+from threading import Lock
+
+class ConsoleLogger:
+    """
+    Logger writing to console, used when building projects without GUI.
+    Messages are written by whole lines, optionally prefixed, so that logs
+    of several processes sharing the same console stay readable
+    """
+
+    def __init__(self, prefix="", verbose=True):
+        self.Prefix = prefix
+        self.Verbose = verbose
+        self.Lock = Lock()
+        self.Pending = {}
+
+    def _write(self, output, s):
+        if isinstance(s, unicode):
+            s = s.encode("utf-8")
+        self.Lock.acquire()
+        lines = (self.Pending.pop(output, "") + s).split("\n")
+        if lines[-1] != "":
+            self.Pending[output] = lines[-1]
+        output.write("".join(["%s%s\n" % (self.Prefix, line)
+                              for line in lines[:-1]]))
+        output.flush()
+        self.Lock.release()
+
+    def write(self, s):
+        if self.Verbose:
+            self._write(sys.stdout, s)
+
+    def write_warning(self, s):
+        if self.Verbose:
+            self._write(sys.stderr, s)
+
+    def write_error(self, s):
+        self._write(sys.stderr, s)
+
+    def flush(self):
+        self.Lock.acquire()
+        for output, line in self.Pending.items():
+            output.write("%s%s\n" % (self.Prefix, line))
+            output.flush()
+        self.Pending = {}
+        self.Lock.release()
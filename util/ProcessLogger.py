@@ -23,17 +23,24 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 import time
-import wx
 import subprocess, ctypes
-from threading import Timer, Lock, Thread, Semaphore
+from threading import Timer, Lock, Thread, Semaphore, Event, currentThread
 import os, sys
+import traceback
 if os.name == 'posix':
+    import select
     from signal import SIGTERM, SIGKILL
 
+# Period in seconds at which output collected from processes is written to
+# logger, so that a process flooding its output is written in few big chunks
+LOG_FLUSH_PERIOD = 0.1
+# Period in seconds at which exit of processes whose output is closed is polled
+EXIT_POLL_PERIOD = 0.01
 
 class outputThread(Thread):
     """
     Thread is used to print the output of a command to the stdout
+    Only used on Windows, where pipes can't be multiplexed with select
     """
     def __init__(self, Proc, fd, callback=None, endcallback=None):
         Thread.__init__(self)
@@ -67,6 +74,162 @@ class outputThread(Thread):
             self.finished = True
             self.endcallback(self.Proc.pid, err)
 
+class outputPoller(Thread):
+    """
+    Thread multiplexing stdout and stderr of all running processes with
+    select. Output is split in lines passed to the ProcessLogger callbacks,
+    and logger writes are flushed once per LOG_FLUSH_PERIOD. Also handles
+    processes timeout. Thread ends once all processes are finished.
+    """
+    # pipe used to wake up select when a process is added or killed, shared
+    # by successive pollers since a ProcessLogger can write to it after the
+    # poller that read its output ended
+    wakeup_pipe = None
+
+    def __init__(self):
+        Thread.__init__(self)
+        self.setDaemon(True)
+        self.lock = Lock()
+        self.new_loggers = []
+        if outputPoller.wakeup_pipe is None:
+            outputPoller.wakeup_pipe = os.pipe()
+        self.wakeup_r, self.wakeup_w = outputPoller.wakeup_pipe
+        # fd -> [ProcessLogger, callback, incomplete line]
+        self.streams = {}
+        self.loggers = []
+        self.start()
+
+    def register(self, processlogger):
+        self.lock.acquire()
+        self.new_loggers.append(processlogger)
+        self.lock.release()
+        os.write(self.wakeup_w, "x")
+
+    def add_new_loggers(self):
+        self.lock.acquire()
+        new_loggers, self.new_loggers = self.new_loggers, []
+        self.lock.release()
+        for processlogger in new_loggers:
+            processlogger.openstreams = 0
+            for pipe, callback in [
+                    (processlogger.Proc.stdout, processlogger.output),
+                    (processlogger.Proc.stderr, processlogger.errors)]:
+                self.streams[pipe.fileno()] = [processlogger, callback, ""]
+                processlogger.openstreams += 1
+            self.loggers.append(processlogger)
+
+    def close_stream(self, fd):
+        processlogger, callback, line = self.streams.pop(fd)
+        if line != "" and not processlogger.killed:
+            callback(line)
+        processlogger.openstreams -= 1
+
+    def read_stream(self, fd):
+        try:
+            data = os.read(fd, 65536)
+        except OSError:
+            data = ""
+        if data == "":
+            self.close_stream(fd)
+            return
+        stream = self.streams[fd]
+        processlogger, callback, line = stream
+        lines = (line + data).split("\n")
+        stream[2] = lines.pop()
+        for line in lines:
+            if processlogger.killed:
+                break
+            callback(line + "\n")
+
+    def get_timeout(self, now, next_flush):
+        timeout = None
+        for processlogger in self.loggers:
+            if processlogger.openstreams == 0:
+                return EXIT_POLL_PERIOD
+            if processlogger.logbuffer:
+                timeout = next_flush - now
+            if processlogger.deadline is not None:
+                remaining = processlogger.deadline - now
+                if timeout is None or remaining < timeout:
+                    timeout = remaining
+        if timeout is not None:
+            return max(0, timeout)
+        return None
+
+    def run(self):
+        next_flush = time.time() + LOG_FLUSH_PERIOD
+        while not self.stop_if_idle():
+            try:
+                next_flush = self.poll(next_flush)
+            except Exception:
+                # never let a failing callback stop output of other processes
+                traceback.print_exc()
+
+    def stop_if_idle(self):
+        # no thread is left running between builds, so that PLC program
+        # generation can fork worker processes
+        global _poller
+        _poller_lock.acquire()
+        self.lock.acquire()
+        idle = len(self.loggers) == 0 and len(self.new_loggers) == 0
+        if idle:
+            _poller = None
+        self.lock.release()
+        _poller_lock.release()
+        return idle
+
+    def poll(self, next_flush):
+        self.add_new_loggers()
+
+        # stop reading output of killed processes
+        for fd, (processlogger, callback, line) in self.streams.items():
+            if processlogger.killed:
+                self.close_stream(fd)
+
+        now = time.time()
+        ready, _w, _x = select.select(
+            self.streams.keys() + [self.wakeup_r], [], [],
+            self.get_timeout(now, next_flush))
+        for fd in ready:
+            if fd == self.wakeup_r:
+                os.read(self.wakeup_r, 4096)
+            else:
+                self.read_stream(fd)
+
+        now = time.time()
+        flush = now >= next_flush
+        if flush:
+            next_flush = now + LOG_FLUSH_PERIOD
+        for processlogger in self.loggers[:]:
+            if flush:
+                processlogger.flushlog()
+            if processlogger.deadline is not None and \
+               now >= processlogger.deadline:
+                processlogger.deadline = None
+                processlogger.endlog()
+            if processlogger.openstreams == 0:
+                ecode = processlogger.Proc.poll()
+                if ecode is not None:
+                    self.loggers.remove(processlogger)
+                    processlogger.flushlog()
+                    processlogger.finish(processlogger.Proc.pid, ecode)
+        return next_flush
+
+# Single poller shared by all running ProcessLogger, created when a process is
+# started while no poller is running
+_poller = None
+_poller_lock = Lock()
+
+def RegisterProcessLogger(processlogger):
+    global _poller
+    _poller_lock.acquire()
+    if _poller is None:
+        _poller = outputPoller()
+    _poller.register(processlogger)
+    poller = _poller
+    _poller_lock.release()
+    return poller
+
 class ProcessLogger:
     def __init__(self, logger, Command, finish_callback = None,
                  no_stdout = False, no_stderr = False, no_gui = True,
@@ -108,8 +271,17 @@ class ProcessLogger:
         self.errdata = []
         self.keyword = keyword
         self.kill_it = kill_it
+        self.killed = False
+        self.outt = None
+        self.errt = None
+        self.timeout = None
+        self.deadline = None
+        # pending logger writes, as list of [logger method, list of strings]
+        self.logbuffer = []
+        self.loglock = Lock()
         self.startsem = Semaphore(0)        
         self.finishsem = Semaphore(0)
+        self.finished = Event()
         self.endlock = Lock()
 
         popenargs= {
@@ -118,50 +290,77 @@ class ProcessLogger:
                "stdout":subprocess.PIPE,
                "stderr":subprocess.PIPE}
 
-        if no_gui == True and wx.Platform == '__WXMSW__':
+        if no_gui == True and os.name == 'nt':
             self.startupinfo = subprocess.STARTUPINFO()
             self.startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
             popenargs["startupinfo"] = self.startupinfo
-        elif wx.Platform == '__WXGTK__':
+        elif os.name == 'posix':
             popenargs["shell"] = False
 
-        if timeout:
-            self.timeout = Timer(timeout,self.endlog)
-            self.timeout.start()
+        if os.name == 'posix':
+            if timeout:
+                self.deadline = time.time() + timeout
+
+            self.Proc = subprocess.Popen( self.Command, **popenargs )
+
+            self.poller = RegisterProcessLogger(self)
+            self.startsem.release()
         else:
-            self.timeout = None
-            
-        self.Proc = subprocess.Popen( self.Command, **popenargs )
-
-        self.outt = outputThread(
-                      self.Proc,
-                      self.Proc.stdout,
-                      self.output,
-                      self.finish)
-        self.outt.start()
-
-        self.errt = outputThread(
-                      self.Proc,
-                      self.Proc.stderr,
-                      self.errors)
-        self.errt.start()
-        self.startsem.release()
+            if timeout:
+                self.timeout = Timer(timeout,self.endlog)
+                self.timeout.start()
+
+            self.Proc = subprocess.Popen( self.Command, **popenargs )
+
+            self.poller = None
+            self.outt = outputThread(
+                          self.Proc,
+                          self.Proc.stdout,
+                          self.output,
+                          self.finish)
+            self.outt.start()
+
+            self.errt = outputThread(
+                          self.Proc,
+                          self.Proc.stderr,
+                          self.errors)
+            self.errt.start()
+            self.startsem.release()
 
+    def log(self, method, v):
+        self.loglock.acquire()
+        if self.logbuffer and self.logbuffer[-1][0] == method:
+            self.logbuffer[-1][1].append(v)
+        else:
+            self.logbuffer.append([method, [v]])
+        self.loglock.release()
+        # output threads write each line immediately
+        if self.poller is None:
+            self.flushlog()
+
+    def flushlog(self):
+        self.loglock.acquire()
+        logbuffer, self.logbuffer = self.logbuffer, []
+        self.loglock.release()
+        for method, data in logbuffer:
+            method("".join(data))
 
     def output(self,v):
         self.outdata.append(v)
         self.outlen += 1
         if not self.no_stdout:
-            self.logger.write(v)
+            self.log(self.logger.write, v)
         if (self.keyword and v.find(self.keyword)!=-1) or (self.outlimit and self.outlen > self.outlimit):
+            self.flushlog()
             self.endlog()
 
     def errors(self,v):
         self.errdata.append(v)
         self.errlen += 1
         if not self.no_stderr:
-            self.logger.write_warning(v)
+            self.log(self.logger.write_warning, v)
         if self.errlimit and self.errlen > self.errlimit:
+            self.flushlog()
             self.endlog()
 
     def log_the_end(self,ecode,pid):
@@ -171,14 +370,18 @@ class ProcessLogger:
     def finish(self, pid,ecode):
         # avoid running function before start is finished        
         self.startsem.acquire()
+        self.startsem.release()
         if self.timeout:
             self.timeout.cancel()
+        self.deadline = None
         self.exitcode = ecode
         if self.exitcode != 0:
             self.log_the_end(ecode,pid)
         if self.finish_callback is not None:
             self.finish_callback(self,ecode,pid)
-        self.errt.join()
+        if self.errt is not None:
+            self.errt.join()
+        self.finished.set()
         self.finishsem.release()
 
     def kill(self,gently=True):
@@ -186,9 +389,11 @@ class ProcessLogger:
         self.startsem.acquire()
         self.startsem.release()
         
-        self.outt.killed = True
-        self.errt.killed = True
-        if wx.Platform == '__WXMSW__':
+        self.killed = True
+        if self.poller is None:
+            self.outt.killed = True
+            self.errt.killed = True
+        if os.name == 'nt':
             PROCESS_TERMINATE = 1
             handle = ctypes.windll.kernel32.OpenProcess(PROCESS_TERMINATE, False, self.Proc.pid)
             ctypes.windll.kernel32.TerminateProcess(handle, -1)
@@ -202,12 +407,19 @@ class ProcessLogger:
                 os.kill(self.Proc.pid, sig)
             except:
                 pass
-        self.outt.join()
-        self.errt.join()
+        if self.poller is None:
+            self.outt.join()
+            self.errt.join()
+        elif currentThread() is not self.poller:
+            # wake up poller so that it stops reading output, and wait
+            # for process end. Can't be waited from poller itself, that
+            # calls kill when keyword is found or timeout is reached
+            os.write(self.poller.wakeup_w, "x")
+            self.finished.wait()
 
     def endlog(self):
         if self.endlock.acquire(False):
-            if not self.outt.finished and self.kill_it:
+            if not self.finished.isSet() and self.kill_it:
                self.kill()
             self.finishsem.release()
 
@@ -215,4 +427,3 @@ class ProcessLogger:
     def spin(self):
         self.finishsem.acquire()
         return [self.exitcode, "".join(self.outdata), "".join(self.errdata)]
-
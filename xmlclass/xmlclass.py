@@ -31,6 +31,7 @@ from xml.sax.saxutils import escape, unescape, quoteattr
 from lxml import etree
 from new import classobj
 from collections import OrderedDict
+from threading import Lock
 
 def CreateNode(name):
     node = minidom.Node()
@@ -1151,6 +1152,13 @@ class ClassFactory:
         class_definition = classobj(str(name), bases, classmembers)
         setattr(class_definition, "__getattr__", generateGetattrMethod(self, class_definition, classinfos))
         setattr(class_definition, "__setattr__", generateSetattrMethod(self, class_definition, classinfos))
+        # Attributes and elements values are given by properties, so that
+        # reading them doesn't need to go through __getattr__
+        for attrname in [attr["name"] for attr in classinfos["attributes"] 
+                         if attr["use"] != "prohibited"] + \
+                        [element["name"] for element in classinfos["elements"]]:
+            if not hasattr(class_definition, attrname):
+                setattr(class_definition, attrname, generateAttributeProperty(self, class_definition, classinfos, attrname))
         class_infos = {"type": COMPILEDCOMPLEXTYPE,
                        "name": classname,
                        "initial": generateClassCreateFunction(class_definition),
@@ -1252,125 +1260,185 @@ def generateClassCreateFunction(class_definition):
         return class_definition()
     return classCreatefunction
 
-def generateGetattrMethod(factory, class_definition, classinfos):
-    attributes = dict([(attr["name"], attr) for attr in classinfos["attributes"] if attr["use"] != "prohibited"])
-    optional_attributes = dict([(attr["name"], True) for attr in classinfos["attributes"] if attr["use"] == "optional"])
-    elements = dict([(element["name"], element) for element in classinfos["elements"]])
-    
-    def getattrMethod(self, name):
-        if attributes.has_key(name):
-            attribute_infos = attributes[name]
+def generateAttributeGetter(factory, classinfos, name):
+    """
+    Generate the function returning value of the attribute or element given
+    by name, with types infos resolved once
+    """
+    for attribute_infos in classinfos["attributes"]:
+        if attribute_infos["name"] == name and attribute_infos["use"] != "prohibited":
             attribute_infos["attr_type"] = FindTypeInfos(factory, attribute_infos["attr_type"])
-            value = self.get(name)
-            if value is not None:
-                return attribute_infos["attr_type"]["extract"](value, extract=False)
-            elif attribute_infos.has_key("fixed"):
-                return attribute_infos["attr_type"]["extract"](attribute_infos["fixed"], extract=False)
-            elif attribute_infos.has_key("default"):
-                return attribute_infos["attr_type"]["extract"](attribute_infos["default"], extract=False)
-            return None
-        
-        elif elements.has_key(name):
-            element_infos = elements[name]
+            extract = attribute_infos["attr_type"]["extract"]
+            if attribute_infos.has_key("fixed"):
+                default = attribute_infos["fixed"]
+            else:
+                default = attribute_infos.get("default", None)
+            
+            def getAttribute(self):
+                value = self.get(name)
+                if value is not None:
+                    return extract(value, extract=False)
+                elif default is not None:
+                    return extract(default, extract=False)
+                return None
+            return getAttribute
+    
+    for element_infos in classinfos["elements"]:
+        if element_infos["name"] == name:
             element_infos["elmt_type"] = FindTypeInfos(factory, element_infos["elmt_type"])
+            elmt_type = element_infos["elmt_type"]
+            multiple = (element_infos["maxOccurs"] == "unbounded" or 
+                        element_infos["maxOccurs"] > 1)
             if element_infos["type"] == CHOICE:
-                content = element_infos["elmt_type"]["choices_xpath"](self)
-                if element_infos["maxOccurs"] == "unbounded" or element_infos["maxOccurs"] > 1:
-                    return content
-                elif len(content) > 0:
-                    return content[0]
-                return None 
+                choices_xpath = elmt_type["choices_xpath"]
+                if multiple:
+                    return choices_xpath
+                def getChoice(self):
+                    content = choices_xpath(self)
+                    if len(content) > 0:
+                        return content[0]
+                    return None
+                return getChoice
+            
             elif element_infos["type"] == ANY:
-                return element_infos["elmt_type"]["extract"](self)
-            elif name == "content" and element_infos["elmt_type"]["type"] == SIMPLETYPE:
-                return element_infos["elmt_type"]["extract"](self.text, extract=False)
-            else:
-                element_name = factory.etreeNamespaceFormat % name
-                if element_infos["maxOccurs"] == "unbounded" or element_infos["maxOccurs"] > 1:
-                    values = self.findall(element_name)
-                    if element_infos["elmt_type"]["type"] == SIMPLETYPE:
-                        return map(lambda value:
-                            element_infos["elmt_type"]["extract"](value.text, extract=False), 
-                            values)
-                    return values
-                else:
-                    value = self.find(element_name)
-                    if element_infos["elmt_type"]["type"] == SIMPLETYPE:
-                        return element_infos["elmt_type"]["extract"](value.text, extract=False)
-                    return value
+                return elmt_type["extract"]
             
-        elif classinfos.has_key("base"):
-            return classinfos["base"].__getattr__(self, name)
-        
-        return DefaultElementClass.__getattribute__(self, name)
+            extract = elmt_type.get("extract")
+            if name == "content" and elmt_type["type"] == SIMPLETYPE:
+                return lambda self: extract(self.text, extract=False)
+            
+            element_name = factory.etreeNamespaceFormat % name
+            if multiple:
+                if elmt_type["type"] == SIMPLETYPE:
+                    return lambda self: [extract(value.text, extract=False) 
+                                         for value in self.findall(element_name)]
+                return lambda self: self.findall(element_name)
+            elif elmt_type["type"] == SIMPLETYPE:
+                return lambda self: extract(self.find(element_name).text, extract=False)
+            return lambda self: self.find(element_name)
     
-    return getattrMethod
+    if classinfos.has_key("base"):
+        base_getattr = classinfos["base"].__getattr__
+        return lambda self: base_getattr(self, name)
+    
+    return lambda self: DefaultElementClass.__getattribute__(self, name)
 
-def generateSetattrMethod(factory, class_definition, classinfos):
-    attributes = dict([(attr["name"], attr) for attr in classinfos["attributes"] if attr["use"] != "prohibited"])
-    optional_attributes = dict([(attr["name"], True) for attr in classinfos["attributes"] if attr["use"] == "optional"])
-    elements = OrderedDict([(element["name"], element) for element in classinfos["elements"]])
+def generateAttributeProperty(factory, class_definition, classinfos, name):
+    """
+    Generate the property giving value of the attribute or element given by
+    name, replaced on first access by the one using resolved types infos
+    """
+    def getAttribute(self):
+        getter = generateAttributeGetter(factory, classinfos, name)
+        setattr(class_definition, name, property(getter))
+        return getter(self)
+    return property(getAttribute)
+
+def generateGetattrMethod(factory, class_definition, classinfos):
+    # Functions returning value of each attribute or element, generated on
+    # first access since types infos can't all be resolved when class is created
+    getters = {}
     
-    def setattrMethod(self, name, value):
-        if attributes.has_key(name):
-            attribute_infos = attributes[name]
+    def getattrMethod(self, name):
+        getter = getters.get(name)
+        if getter is None:
+            getter = getters[name] = generateAttributeGetter(factory, classinfos, name)
+        return getter(self)
+    
+    return getattrMethod
+
+def generateAttributeSetter(factory, classinfos, name):
+    """
+    Generate the function setting value of the attribute or element given
+    by name, with types infos resolved once
+    """
+    for attribute_infos in classinfos["attributes"]:
+        if attribute_infos["name"] == name and attribute_infos["use"] != "prohibited":
             attribute_infos["attr_type"] = FindTypeInfos(factory, attribute_infos["attr_type"])
-            if optional_attributes.get(name, False):
+            generate = attribute_infos["attr_type"]["generate"]
+            if attribute_infos["use"] == "optional":
                 default = attribute_infos.get("default", None)
-                if value is None or value == default:
-                    self.attrib.pop(name, None)
-                    return
+                def setOptionalAttribute(self, value):
+                    if value is None or value == default:
+                        self.attrib.pop(name, None)
+                    else:
+                        self.set(name, generate(value))
+                return setOptionalAttribute
             elif attribute_infos.has_key("fixed"):
-                return
-            return self.set(name, attribute_infos["attr_type"]["generate"](value))
+                return lambda self, value: None
+            return lambda self, value: self.set(name, generate(value))
+    
+    elements = OrderedDict([(element["name"], element) for element in classinfos["elements"]])
+    if elements.has_key(name):
+        element_infos = elements[name]
+        element_infos["elmt_type"] = FindTypeInfos(factory, element_infos["elmt_type"])
+        elmt_type = element_infos["elmt_type"]
+        generate = elmt_type.get("generate")
+        if element_infos["type"] == ANY:
+            return generate
         
-        elif elements.has_key(name):
-            element_infos = elements[name]
-            element_infos["elmt_type"] = FindTypeInfos(factory, element_infos["elmt_type"])
-            if element_infos["type"] == ANY:
-                element_infos["elmt_type"]["generate"](self, value)
-            
-            elif name == "content" and element_infos["elmt_type"]["type"] == SIMPLETYPE:
-                self.text = element_infos["elmt_type"]["generate"](value)
-            
-            else:
-                prefix = ("%s:" % factory.TargetNamespace
-                          if factory.TargetNamespace is not None else "")
-                element_xpath = (prefix + name
-                                 if name != "content"
-                                 else elements["content"]["elmt_type"]["choices_xpath"].path)
-                
-                for element in self.xpath(element_xpath, namespaces=factory.NSMAP):
-                    self.remove(element)
-                
-                if value is not None:
-                    element_idx = elements.keys().index(name)
-                    if element_idx > 0:
-                        previous_elements_xpath = "|".join(map(
-                            lambda x: prefix + x
-                                      if x != "content"
-                                      else elements["content"]["elmt_type"]["choices_xpath"].path,
-                            elements.keys()[:element_idx]))
-                        
-                        insertion_point = len(self.xpath(previous_elements_xpath, namespaces=factory.NSMAP))
-                    else:
-                        insertion_point = 0
-                    
-                    if not isinstance(value, ListType):
-                        value = [value]
-                    
-                    for element in reversed(value):
-                        if element_infos["elmt_type"]["type"] == SIMPLETYPE:
-                            tmp_element = etree.Element(factory.etreeNamespaceFormat % name)
-                            tmp_element.text = element_infos["elmt_type"]["generate"](element)
-                            element = tmp_element
-                        self.insert(insertion_point, element)
+        elif name == "content" and elmt_type["type"] == SIMPLETYPE:
+            return lambda self, value: DefaultElementClass.__setattr__(self, "text", generate(value))
         
-        elif classinfos.has_key("base"):
-            return classinfos["base"].__setattr__(self, name, value)
+        prefix = ("%s:" % factory.TargetNamespace
+                  if factory.TargetNamespace is not None else "")
+        def GetElementXPath(element_name):
+            if element_name == "content":
+                elements["content"]["elmt_type"] = FindTypeInfos(
+                    factory, elements["content"]["elmt_type"])
+                return elements["content"]["elmt_type"]["choices_xpath"].path
+            return prefix + element_name
         
+        element_xpath = etree.XPath(GetElementXPath(name), namespaces=factory.NSMAP)
+        element_idx = elements.keys().index(name)
+        if element_idx > 0:
+            previous_elements_xpath = etree.XPath("|".join(map(
+                GetElementXPath, elements.keys()[:element_idx])), 
+                namespaces=factory.NSMAP)
         else:
-            raise AttributeError("'%s' can't have an attribute '%s'." % (self.__class__.__name__, name))
+            previous_elements_xpath = None
+        simple_type = elmt_type["type"] == SIMPLETYPE
+        element_name = factory.etreeNamespaceFormat % name
+        
+        def setElement(self, value):
+            for element in element_xpath(self):
+                self.remove(element)
+            
+            if value is not None:
+                if previous_elements_xpath is not None:
+                    insertion_point = len(previous_elements_xpath(self))
+                else:
+                    insertion_point = 0
+                
+                if not isinstance(value, ListType):
+                    value = [value]
+                
+                for element in reversed(value):
+                    if simple_type:
+                        tmp_element = etree.Element(element_name)
+                        tmp_element.text = generate(element)
+                        element = tmp_element
+                    self.insert(insertion_point, element)
+        return setElement
+    
+    if classinfos.has_key("base"):
+        base_setattr = classinfos["base"].__setattr__
+        return lambda self, value: base_setattr(self, name, value)
+    
+    def setUnknownAttribute(self, value):
+        raise AttributeError("'%s' can't have an attribute '%s'." % (self.__class__.__name__, name))
+    return setUnknownAttribute
+
+def generateSetattrMethod(factory, class_definition, classinfos):
+    # Functions setting value of each attribute or element, generated on
+    # first access for the same reason than getters
+    setters = {}
+    
+    def setattrMethod(self, name, value):
+        setter = setters.get(name)
+        if setter is None:
+            setter = setters[name] = generateAttributeSetter(factory, classinfos, name)
+        setter(self, value)
         
     return setattrMethod
 
@@ -1692,11 +1760,18 @@ class DefaultElementClass(etree.ElementBase):
     def tostring(self):
         return NAMESPACE_PATTERN.sub("", etree.tostring(self, pretty_print=True, encoding='utf-8')).decode('utf-8')
 
+# Maximum number of children structures for which element class is kept
+MAX_STRUCTURE_CLASSES = 10000
+
 class XMLElementClassLookUp(etree.PythonElementClassLookup):
     
     def __init__(self, classes, *args, **kwargs):
         etree.PythonElementClassLookup.__init__(self, *args, **kwargs)
         self.LookUpClasses = classes
+        # Classes already found by element and parent tags, and for tags
+        # having several possible classes, by children tags too
+        self.ElementClasses = {}
+        self.StructureClasses = {}
     
     def GetElementClass(self, element_tag, parent_tag=None, default=DefaultElementClass):
         element_class = self.LookUpClasses.get(element_tag, (default, None))
@@ -1710,20 +1785,34 @@ class XMLElementClassLookUp(etree.PythonElementClassLookup):
             return self.GetElementClass(element_with_parent_class, default=default)
         return element_with_parent_class
         
+    def GetStructureClass(self, element_class, children_tags):
+        children = "".join([
+            "%s " % etree.QName(child_tag).localname
+            for child_tag in children_tags])
+        for possible_class in element_class:
+            if isinstance(possible_class, (StringType, UnicodeType)):
+                possible_class = self.GetElementClass(possible_class)
+            if possible_class.StructurePattern.match(children) is not None:
+                return possible_class
+        return element_class[0]
+    
     def lookup(self, document, element):
         parent = element.getparent()
-        element_class = self.GetElementClass(element.tag, 
-            parent.tag if parent is not None else None)
+        key = (element.tag, parent.tag if parent is not None else None)
+        element_class = self.ElementClasses.get(key)
+        if element_class is None:
+            element_class = self.ElementClasses[key] = self.GetElementClass(*key)
         if isinstance(element_class, ListType):
-            children = "".join([
-                "%s " % etree.QName(child.tag).localname
-                for child in element])
-            for possible_class in element_class:
-                if isinstance(possible_class, (StringType, UnicodeType)):
-                    possible_class = self.GetElementClass(possible_class)
-                if possible_class.StructurePattern.match(children) is not None:
-                    return possible_class
-            return element_class[0]
+            # Class depends on element children, so it is found again each
+            # time children change
+            key += tuple([child.tag for child in element])
+            structure_class = self.StructureClasses.get(key)
+            if structure_class is None:
+                if len(self.StructureClasses) >= MAX_STRUCTURE_CLASSES:
+                    self.StructureClasses.clear()
+                structure_class = self.StructureClasses[key] = \
+                    self.GetStructureClass(element_class, key[2:])
+            return structure_class
         return element_class
 
 class XMLClassParser(etree.XMLParser):
@@ -1741,18 +1830,37 @@ class XMLClassParser(etree.XMLParser):
             self.RootNSMAP = namespaces
         self.BaseClass = base_class
         self.XSDSchema = xsd_schema
+        # XSD schema error log is shared by validations made in any thread
+        self.XSDSchemaLock = Lock()
     
     def set_element_class_lookup(self, class_lookup):
         etree.XMLParser.set_element_class_lookup(self, class_lookup)
         self.ClassLookup = class_lookup
     
-    def LoadXMLString(self, xml_string):
+    def LoadXMLString(self, xml_string, validate=True):
         tree = etree.fromstring(xml_string, self)
-        if not self.XSDSchema.validate(tree):
-            error = self.XSDSchema.error_log.last_error
-            return tree, (error.line, error.message)
+        if validate:
+            return tree, self.ValidateTree(tree)
         return tree, None 
     
+    def ValidateTree(self, tree):
+        self.XSDSchemaLock.acquire()
+        try:
+            if not self.XSDSchema.validate(tree):
+                error = self.XSDSchema.error_log.last_error
+                return (error.line, error.message)
+            return None
+        finally:
+            self.XSDSchemaLock.release()
+    
+    def ValidateXMLString(self, xml_string):
+        """
+        Validate XML string parsed in a separate document, so that it can be
+        done in a thread while the elements loaded from it are modified
+        """
+        return self.ValidateTree(etree.fromstring(xml_string, 
+            etree.XMLParser(strip_cdata=False, remove_blank_text=True)))
+    
     def Dumps(self, xml_obj):
         return etree.tostring(xml_obj, encoding='utf-8')
     
@@ -23,6 +23,7 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 import os, re
+import hashlib
 import datetime
 from xml.dom import minidom
 from types import *
@@ -1090,6 +1091,17 @@ class XSDClassFactory(ClassFactory):
                     return element_infos
         return None
 
+# Parsers already generated, by xsd file path and content digest. Generating
+# classes for a xsd is long, and confnodes of the same type share the same xsd
+GeneratedParsers = {}
+
+def GetGeneratedParser(filepath, xsdstring, generate):
+    key = (filepath, hashlib.md5(xsdstring).digest())
+    parser = GeneratedParsers.get(key)
+    if parser is None:
+        parser = GeneratedParsers[key] = generate()
+    return parser
+
 """
 This function opens the xsd file and generate a xml parser with class lookup from 
 the xml tree
@@ -1098,17 +1110,21 @@ def GenerateParserFromXSD(filepath):
     xsdfile = open(filepath, 'r')
     xsdstring = xsdfile.read()
     xsdfile.close()
-    cwd = os.getcwd()
-    os.chdir(os.path.dirname(filepath))
-    parser = GenerateParser(XSDClassFactory(minidom.parseString(xsdstring), filepath), xsdstring)
-    os.chdir(cwd)
-    return parser
+    def generate():
+        cwd = os.getcwd()
+        os.chdir(os.path.dirname(filepath))
+        try:
+            return GenerateParser(XSDClassFactory(minidom.parseString(xsdstring), filepath), xsdstring)
+        finally:
+            os.chdir(cwd)
+    return GetGeneratedParser(os.path.realpath(filepath), xsdstring, generate)
 
 """
 This function generate a xml from the xsd given as a string
 """
 def GenerateParserFromXSDstring(xsdstring):
-    return GenerateParser(XSDClassFactory(minidom.parseString(xsdstring)), xsdstring)
+    return GetGeneratedParser(None, xsdstring,
+        lambda: GenerateParser(XSDClassFactory(minidom.parseString(xsdstring)), xsdstring))
 
 
 #-------------------------------------------------------------------------------